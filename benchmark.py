@@ -0,0 +1,821 @@
+#!/usr/bin/env python
+
+"""
+Timings for the NameSpace machinery.
+
+    python benchmark.py            # run everything
+    python benchmark.py write      # run benchmarks whose name contains 'write'
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+from   path                import  path as Path
+from   namespace           import  NameSpace
+
+
+def makeNameSpace(nKeys,sections=100,cls=NameSpace):
+    "A two level namespace with nKeys float leaves spread over 'sections' sections"
+    ns = cls()
+    perSection = max(1,nKeys // sections)
+    for i in range(nKeys):
+        ns.set("section%03d.param%06d" % (i // perSection, i), float(i))
+    return ns
+
+def timed(func,*args,**kw):
+    t0 = time.time()
+    result = func(*args,**kw)
+    return time.time() - t0, result
+
+def report(label,seconds,extra=''):
+    print "  %-40s %9.3f ms %s" % (label,seconds*1000.0,extra)
+
+
+# --- write -------------------------------------------------------------------
+
+def legacyWrite(ns,file,prefix='',append=False):
+    "NameSpace.write as it was: one open/close of the file per leaf"
+    p = Path(file)
+    if not append:
+        p.write_text('')
+    for k,v in ns._data.items():
+        name = "%s.%s" % (prefix,k) if prefix else k
+        if isinstance(v,ns.__class__):
+            legacyWrite(v,file,name,append=True)
+        else:
+            p.write_lines(["%s = %s" % (name, repr(v))],append=True)
+
+def benchWrite(nKeys=100000):
+    print "write %d keys" % nKeys
+    ns = makeNameSpace(nKeys)
+    tmpDir = Path(tempfile.mkdtemp())
+    try:
+        t, _ = timed(legacyWrite,ns,tmpDir/"legacy.ns")
+        report("per-leaf append (legacy)",t)
+        t, (nBytes,nKeys) = timed(ns.write,tmpDir/"stream.ns")
+        report("single handle + rename",t,"(%d bytes, %d keys)" % (nBytes,nKeys))
+        assert sorted((tmpDir/"legacy.ns").lines()) == sorted((tmpDir/"stream.ns").lines())
+    finally:
+        tmpDir.rmtree()
+
+
+# --- read --------------------------------------------------------------------
+
+def legacyRead(ns,file,localFuncDict={}):
+    "NameSpace.read as it was: eval() every right hand side"
+    # a copy, eval() puts __builtins__ in the globals it is given
+    globs = dict(localFuncDict)
+    for line in Path(file).lines(retain=False):
+        if line.strip() == '' or line.strip().startswith('#'):  continue
+        lhs, rhs = line.split('=',1)
+        ns.set(lhs.strip(),eval(rhs,globs,{}))
+
+def makeLines(nLines,ui=False):
+    "nLines of .ns text, or .uins text when 'ui' is set"
+    lines = []
+    for i in range(nLines):
+        kind = i % 5
+        if ui:
+            rhs = ( "Float(value=%r, min=0.0, max=1.0, hint='gain of light %d')" % (i*0.001,i),
+                    "Int(value=%d, default=50, choices=[10, 25, 50, 99])" % i,
+                    "String(value='shader', choices=['shader', 'primitive'])",
+                    "Boolean(value=%r)" % (i % 2 == 0),
+                    "Vector(value=(0,0,-%d), rubber=True)" % i )[kind]
+        else:
+            rhs = ( repr(i*0.001), repr(i), repr('/some/path/file%d.tex' % i), repr(i % 2 == 0),
+                    repr([1, 0, 0, i, 0, 1, 0, 0]) )[kind]
+        lines.append("section%03d.param%06d = %s" % (i // 500, i, rhs))
+    return lines
+
+def benchRead(nLines=50000):
+    from uinamespace import UiNameSpace
+    tmpDir = Path(tempfile.mkdtemp())
+    try:
+        for ui in (False,True):
+            print "read %d lines of %s" % (nLines,".uins" if ui else ".ns")
+            p = tmpDir/"bench.ns"
+            p.write_lines(makeLines(nLines,ui))
+            cls = UiNameSpace if ui else NameSpace
+            funcs = UiNameSpace.LocalFuncTable if ui else {}
+            tEval, _ = timed(legacyRead,cls(),p,funcs)
+            report("eval() per line (legacy)",tEval)
+            tParse, _ = timed(cls().read,p,funcs)
+            report("nsparse",tParse,"(%.1fx)" % (tEval/tParse))
+    finally:
+        tmpDir.rmtree()
+
+
+# --- get / set ---------------------------------------------------------------
+
+def legacyGet(ns,key):
+    "NameSpace.get as it was: split the key and recurse a level at a time"
+    if isinstance(key,(tuple,list)):
+        if len(key) == 1:
+            return ns._data[key[0]]
+        sub = ns._data[key[0]]
+        if not isinstance(sub,NameSpace):
+            raise ValueError, sub
+        return legacyGet(sub,key[1:])
+    return legacyGet(ns,str(key).split('.'))
+
+def legacySet(ns,key,value):
+    "NameSpace.set as it was"
+    if isinstance(key,(tuple,list)):
+        if len(key) == 1:
+            ns._data[key[0]] = value
+            return
+        if key[0] in ns._data:
+            sub = ns._data[key[0]]
+            if not isinstance(sub,NameSpace):
+                raise ValueError, sub
+        else:
+            sub = ns._data[key[0]] = ns.__class__()
+        return legacySet(sub,key[1:],value)
+    legacySet(ns,str(key).split('.'),value)
+
+def legacyContains(ns,key):
+    try:
+        legacyGet(ns,key)
+    except:
+        return False
+    return True
+
+def benchGetSet(nKeys=20000,nRounds=5):
+    print "get/set/in on %d five level keys, %d rounds" % (nKeys,nRounds)
+    ns = NameSpace()
+    keys = ["light%02d.shadow%d.map%03d.param%06d" % (i % 50,i % 7,i % 300,i) for i in range(nKeys)]
+    for i,k in enumerate(keys):
+        ns.set(k,float(i))
+    missing = [k + "x" for k in keys]
+    def loop(func,keys):
+        for r in range(nRounds):
+            for k in keys:
+                func(k)
+    for label,legacy,func,ks in (
+            ("get",          lambda k: legacyGet(ns,k),      ns.get,          keys),
+            ("in (present)", lambda k: legacyContains(ns,k), ns.__contains__, keys),
+            ("in (missing)", lambda k: legacyContains(ns,k), ns.__contains__, missing)):
+        tOld, _ = timed(loop,legacy,ks)
+        report("%s, split and recurse (legacy)" % label,tOld)
+        tNew, _ = timed(loop,func,ks)
+        report("%s, flat index" % label,tNew,"(%.1fx)" % (tOld/tNew))
+    tOld, _ = timed(loop,lambda k: legacySet(ns,k,1.0),keys)
+    report("set, split and recurse (legacy)",tOld)
+    tNew, _ = timed(loop,lambda k: ns.set(k,1.0),keys)
+    report("set, flat index",tNew,"(%.1fx)" % (tOld/tNew))
+
+
+# --- dict / hdict ------------------------------------------------------------
+
+def legacyHdict(ns):
+    "NameSpace.hdict as it was: rebuilt on every access"
+    d = dict()
+    for k,v in ns._data.items():
+        d[k] = legacyHdict(v) if isinstance(v,NameSpace) else v
+    return d
+
+def legacyDict(ns):
+    "NameSpace.dict as it was: rebuilt with string formatting at every level"
+    d = dict()
+    for k,v in ns._data.items():
+        if isinstance(v,NameSpace):
+            for kk,vv in legacyDict(v).items():
+                d["%s.%s" % (k,kk)] = vv
+        else:
+            d[k] = v
+    return d
+
+def benchViews(nKeys=100000,nRounds=20):
+    print "dict/hdict of %d keys, one set between %d accesses" % (nKeys,nRounds)
+    ns = makeNameSpace(nKeys)
+    def loop(func):
+        for r in range(nRounds):
+            ns.set("section%03d.param%06d" % (r,r*1000),float(r))
+            func(ns)
+    for label,legacy,func in (
+            ("hdict", legacyHdict, lambda ns: ns.hdict),
+            ("dict",  legacyDict,  lambda ns: ns.dict),
+            ("view lookup", legacyDict, lambda ns: ns.view['section000.param000001']),
+            ("hview lookup", legacyHdict, lambda ns: ns.hview['section000']['param000001'])):
+        tOld, _ = timed(loop,legacy)
+        report("%s, rebuilt (legacy)" % label,tOld)
+        tNew, _ = timed(loop,func)
+        report("%s, maintained" % label,tNew,"(%.1fx)" % (tOld/tNew))
+
+
+# --- dupe --------------------------------------------------------------------
+
+def maxRss():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def benchDupe(nKeys=50000,nCopies=20):
+    from copy import deepcopy
+    print "dupe a %d key template %d times, then set one key in each" % (nKeys,nCopies)
+    ns = makeNameSpace(nKeys)
+    def copies(func):
+        out = [func(ns) for i in range(nCopies)]
+        for i,c in enumerate(out):
+            c.set("section%03d.param%06d" % (i,i*(nKeys//100)),-1.0)
+        return out
+    # copy on write first, maxrss only ever grows
+    t, _ = timed(lambda: [ns.dupe() for i in range(nCopies)])
+    report("copy on write dupe() alone",t)
+    rss = maxRss()
+    t, keep = timed(copies,lambda ns: ns.dupe())
+    report("copy on write dupe()",t,"(+%d kB)" % (maxRss()-rss))
+    assert keep[1]["section001.param000500"] == -1.0 and ns["section001.param000500"] == 500.0
+    rss = maxRss()
+    tOld, keep = timed(copies,deepcopy)
+    report("deepcopy (legacy)",tOld,"(+%d kB)" % (maxRss()-rss))
+    print "  %.1fx faster" % (tOld/t)
+
+
+# --- snapshot ----------------------------------------------------------------
+
+def benchSnapshot(nLines=50000):
+    from uinamespace import UiNameSpace
+    tmpDir = Path(tempfile.mkdtemp())
+    try:
+        for ui in (False,True):
+            print "load %d keys of %s, text vs snapshot" % (nLines,".uins" if ui else ".ns")
+            text, snap = tmpDir/"bench.ns", tmpDir/"bench.nsnap"
+            text.write_lines(makeLines(nLines,ui))
+            cls = UiNameSpace if ui else NameSpace
+            funcs = UiNameSpace.LocalFuncTable if ui else {}
+            def load():
+                ns = cls()
+                ns.read(text,funcs)
+                return ns
+            tText, a = timed(load)
+            a.writeSnapshot(snap)
+            report("text, nsparse",tText,"(%d bytes)" % text.size)
+            tSnap, b = timed(cls.fromSnapshot,snap)
+            report("snapshot",tSnap,"(%d bytes, %.1fx)" % (snap.size,tText/tSnap))
+            assert len(a.dict) == len(b.dict) == nLines
+    finally:
+        tmpDir.rmtree()
+
+
+# --- lazy read ---------------------------------------------------------------
+
+def benchLazy(nLines=50000):
+    from uinamespace import UiNameSpace
+    tmpDir = Path(tempfile.mkdtemp())
+    try:
+        for ui in (False,True):
+            print "read %d lines of %s, then get one key" % (nLines,".uins" if ui else ".ns")
+            p = tmpDir/"bench.ns"
+            p.write_lines(makeLines(nLines,ui))
+            cls = UiNameSpace if ui else NameSpace
+            funcs = UiNameSpace.LocalFuncTable if ui else {}
+            def first(lazy):
+                ns = cls()
+                ns.read(p,funcs,lazy)
+                return ns["section050.param025000"]
+            tEager, a = timed(first,False)
+            report("read everything",tEager)
+            tLazy, b = timed(first,True)
+            report("lazy, one section parsed",tLazy,"(%.1fx)" % (tEager/tLazy))
+            assert repr(a) == repr(b)
+    finally:
+        tmpDir.rmtree()
+
+
+# --- notify ------------------------------------------------------------------
+
+def benchNotify(nKeys=100000,nChanges=20):
+    print "push %d changes of a %d key namespace to per-key consumers" % (nChanges,nKeys)
+    ns = makeNameSpace(nKeys)
+    shown = dict()
+    def show(key,value):
+        shown[key] = value
+    keys = ["section%03d.param%06d" % (i % 100,(i % 100)*1000+i) for i in range(nChanges)]
+    def rescan():
+        for k in keys:
+            ns.set(k,-1.0)
+        for k,v in ns.dict.iteritems():
+            show(k,v)
+    t, _ = timed(rescan)
+    report("set, then rescan everything (legacy)",t,"(%d shown)" % len(shown))
+    shown.clear()
+    ns.subscribe('',lambda changed: [show(k,ns[k]) for k in changed],prefix=True)
+    def batched():
+        with ns.batch():
+            for k in keys:
+                ns.set(k,-2.0)
+    tNew, _ = timed(batched)
+    report("set in a batch, subscribed",tNew,"(%d shown, %.1fx)" % (len(shown),t/tNew))
+    assert sorted(shown) == sorted(keys)
+
+
+# --- diff --------------------------------------------------------------------
+
+def legacyDiff(a,b):
+    "Compare by flattening both with .dict"
+    da, db = a.dict, b.dict
+    changed = dict([(k,v) for k,v in db.iteritems() if k not in da or da[k] != v])
+    removed = [k for k in da if k not in db]
+    return changed, removed
+
+def benchDiff(nKeys=100000,nChanges=20):
+    print "diff a %d key namespace against a copy with %d changes" % (nKeys,nChanges)
+    template = makeNameSpace(nKeys)
+    working = template.dupe()
+    for i in range(nChanges):
+        working.set("section%03d.param%06d" % (i,i*(nKeys//100)),-1.0)
+    tOld, (changed,removed) = timed(legacyDiff,template,working)
+    report("flatten both with .dict (legacy)",tOld)
+    tNew, delta = timed(template.diff,working)
+    report("diff()",tNew,"(%.1fx)" % (tOld/tNew))
+    assert sorted(delta.changed) == sorted(changed) and len(delta) == nChanges
+    copy = template.dupe()
+    t, _ = timed(copy.apply,delta)
+    report("apply()",t)
+    assert not copy.diff(working)
+
+
+# --- bulk --------------------------------------------------------------------
+
+def benchMany(nKeys=10000,nRounds=10):
+    print "bulk update/get of %d keys in a 100k key namespace, %d rounds" % (nKeys,nRounds)
+    ns = makeNameSpace(100000)
+    keys = ["section%03d.param%06d" % (i // 1000,i) for i in range(0,100000,100000 // nKeys)]
+    values = dict([(k,1.0) for k in keys])
+    def loop(func):
+        for r in range(nRounds):
+            func()
+    def setEach():
+        for k,v in values.items():
+            ns.set(k,v)
+    tOld, _ = timed(loop,setEach)
+    report("set() per key (legacy update)",tOld)
+    tNew, _ = timed(loop,lambda: ns.update(values))
+    report("update(), one batch of set()s",tNew,"(%.1fx)" % (tOld/tNew))
+    tOld, _ = timed(loop,lambda: [ns.get(k) for k in keys])
+    report("get() per key",tOld)
+    tNew, _ = timed(loop,lambda: ns.getMany(keys))
+    report("getMany()",tNew,"(%.1fx)" % (tOld/tNew))
+    tOld, _ = timed(loop,lambda: [k in ns for k in keys])
+    report("'in' per key",tOld)
+    tNew, _ = timed(loop,lambda: ns.containsMany(keys))
+    report("containsMany()",tNew,"(%.1fx)" % (tOld/tNew))
+
+
+# --- UiItem memory -----------------------------------------------------------
+
+class LegacyUiItem(object):
+    "UiItem as it was: an instance __dict__ holding an '_args' dict"
+    def __init__(self,kv={},**kw):
+        self._args = dict(kv.items()+kw.items())
+
+def uiItemArgs(n):
+    "(NAME, arguments) for n UiItems, mixed like the .uins benchmark files"
+    choices = [10, 25, 50, 99]
+    out = []
+    for i in range(n):
+        out.append(( ('Float',   dict(value=i*0.001,min=0.0,max=1.0,hint='gain of light %d' % i)),
+                     ('Int',     dict(value=i,default=50,choices=choices)),
+                     ('String',  dict(value='shader',choices=['shader','primitive'])),
+                     ('Boolean', dict(value=i % 2 == 0)),
+                     ('Vector',  dict(value=(0,0,-i),rubber=True)) )[i % 5])
+    return out
+
+def uiItemBytes(item):
+    "Bytes held by a UiItem itself, not counting the argument values"
+    n = sys.getsizeof(item)
+    if hasattr(item,'__dict__'):
+        n += sys.getsizeof(item.__dict__) + sys.getsizeof(item._args)
+    elif item._more is not None:
+        n += sys.getsizeof(item._more)
+    return n
+
+def benchUiItems(nItems=100000):
+    from uinamespace import UiNameSpace
+    print "memory of %d UiItems, leaving out the argument values" % nItems
+    args = uiItemArgs(nItems)
+    funcs = UiNameSpace.LocalFuncTable
+    tOld, old = timed(lambda: [LegacyUiItem(kw) for name,kw in args])
+    bOld = sum(map(uiItemBytes,old))
+    report("dict per item (legacy)",tOld,"(%.1f MB, %d bytes each)" % (bOld/1e6,bOld//nItems))
+    tNew, new = timed(lambda: [funcs[name](kw) for name,kw in args])
+    bNew = sum(map(uiItemBytes,new))
+    report("slots",tNew,"(%.1f MB, %d bytes each)" % (bNew/1e6,bNew//nItems))
+    assert [o._args for o in old] == [n._args for n in new]
+    print "  %.1fx less memory" % (float(bOld)/bNew)
+
+
+# --- batch coercion ----------------------------------------------------------
+
+def legacyCoerce(values,items):
+    "coerce() and a min/max/choices check one value at a time"
+    coerced, errors = [], []
+    for v,item in zip(values,items):
+        try:
+            c = item.coerce(v)
+        except ValueError:
+            coerced.append(item.coerce(v,True))
+            errors.append(True)
+            continue
+        coerced.append(c)
+        errors.append(('min' in item and c < item['min']) or ('max' in item and c > item['max'])
+                      or ('choices' in item and c not in item['choices']))
+    return coerced, errors
+
+def benchCoerce(nValues=200000):
+    import uinamespace
+    from uinamespace import UiFloat, UiInt
+    print "coerce and range check %d values per column (numpy %s)" % (nValues,"on" if uinamespace.numpy else "not installed")
+    for cls,items,values in (
+            (UiFloat, [UiFloat(value=0.0,min=0.0,max=1.0) for i in range(nValues)], [i*1e-5 for i in range(nValues)]),
+            (UiInt,   [UiInt(value=0,min=0,max=1000) for i in range(nValues)],        range(nValues)),
+            (UiFloat, [UiFloat(value=0.0,min=0.0) for i in range(nValues)],           [str(i) for i in range(nValues)])):
+        label = "%s from %s" % (cls.NAME,type(values[0]).__name__)
+        tOld, old = timed(legacyCoerce,values,items)
+        report("%s, per value (legacy)" % label,tOld)
+        tNew, new = timed(cls.coerceColumn,values,items)
+        report("%s, coerceColumn()" % label,tNew,"(%.1fx)" % (tOld/tNew))
+        assert old == new
+
+
+# --- columns -----------------------------------------------------------------
+
+def benchColumns(nItems=100000,nRounds=10):
+    import uinamespace
+    from uinamespace import UiNameSpace, UiFloat, UiColumns
+    print "%d Float items, %d rounds of reset/clamp/export (numpy %s)" % (nItems,nRounds,"on" if uinamespace.numpy else "not installed")
+    uns = UiNameSpace()
+    uns.setMany([("section%03d.param%06d" % (i // 1000,i),UiFloat(value=i*0.1,min=0.0,max=100.0,default=1.0))
+                 for i in range(nItems)])
+    items = [item for key,item in uns.walk()]
+    def legacyReset():
+        for item in items:
+            if 'default' in item:
+                item.setValue(item['default'])
+    def legacyClamp():
+        for item in items:
+            v = item.value
+            if 'min' in item and v < item['min']:
+                item.setValue(item['min'])
+            elif 'max' in item and v > item['max']:
+                item.setValue(item['max'])
+    def legacyExport():
+        return dict([(key,item.value) for key,item in uns.walk() if item.NAME == 'Float'])
+    def loop(func):
+        for r in range(nRounds):
+            func()
+    old = [timed(loop,f)[0] for f in (legacyReset,legacyClamp,legacyExport)]
+    t, columns = timed(UiColumns,uns)
+    report("UiColumns() once",t)
+    new = [timed(loop,f)[0] for f in (columns.resetToDefaults,columns.clamp,lambda: columns.export('Float'))]
+    for label,tOld,tNew in zip(("reset to defaults","clamp","export Floats"),old,new):
+        report("%s, per item (legacy)" % label,tOld)
+        report("%s, columns" % label,tNew,"(%.1fx)" % (tOld/tNew))
+    assert legacyExport() == columns.export('Float')
+
+
+# --- schema ------------------------------------------------------------------
+
+def legacyValidate(uns):
+    "valid() and the min/max/choices checks item by item, as a widget would"
+    problems = []
+    for key,item in uns.walk():
+        v = item.value
+        if (not item.valid(v) or ('min' in item and v < item['min']) or ('max' in item and v > item['max'])
+                or ('choices' in item and v not in item['choices'])):
+            problems.append(key)
+    return problems
+
+def benchSchema(nItems=100000):
+    from uinamespace import UiNameSpace, UiFloat, UiInt, UiString
+    print "validate a %d item UiNameSpace" % nItems
+    uns = UiNameSpace()
+    uns.setMany([("section%03d.param%06d" % (i // 1000,i),
+                  ( UiFloat(value=i*0.001,min=0.0,max=50.0),
+                    UiInt(value=i % 50,default=50,choices=range(50)),
+                    UiString(value='shader',choices=['shader','primitive']),
+                    UiFloat(value=1.0) )[i % 4]) for i in range(nItems)])
+    tOld, old = timed(legacyValidate,uns)
+    report("valid() and checks per item (legacy)",tOld,"(%d problems)" % len(old))
+    t, schema = timed(uns.compileSchema)
+    report("compileSchema()",t,"(%d validators)" % len(set(map(id,schema.validators.values()))))
+    tNew, new = timed(schema.validate,uns)
+    report("validate() the namespace",tNew,"(%.1fx, %d problems)" % (tOld/tNew,len(new)))
+    assert sorted(old) == [key for key,problem in new]
+    values = dict([(key,item.value) for key,item in uns.walk()])
+    t, new = timed(schema.validate,values)
+    report("validate() plain values",t,"(%d problems)" % len(new))
+
+
+# --- shared metadata ---------------------------------------------------------
+
+def metadataBytes(items):
+    "Bytes held by UiItems and their arguments other than value, each object counted once"
+    seen = set()
+    def size(v):
+        if id(v) in seen:
+            return 0
+        seen.add(id(v))
+        n = sys.getsizeof(v)
+        if isinstance(v,(list,tuple)):
+            n += sum(map(size,v))
+        elif isinstance(v,dict):
+            n += sum(map(size,v.values()))
+        return n
+    total = 0
+    for item in items:
+        total += sys.getsizeof(item)
+        for slot in ('_default','_min','_max','_choices','_hint','_more'):
+            total += size(getattr(item,slot))
+    return total
+
+def benchShared(nLines=100000):
+    import uinamespace
+    from copy import deepcopy
+    print "%d parsed UiItems with repeated choices and hints, unshared vs shared arguments" % nLines
+    lines = ["section%03d.param%06d = %s" % (i // 500,i,
+             ( "String(value='shader', choices=['shader', 'primitive'], hint='hit mode of the ray')",
+               "Float(value=20.95, choices=[20.95, 28.5, 35.0, 50.0], hint='aperture')",
+               "Int(value=%d, default=50, choices=[10, 25, 50, 99])" % (i % 100),
+               "File(value='/tmp/a.tex', extensions=['tex', 'tx'], dirs=['/usr/tmp/', '/tmp'])" )[i % 4])
+             for i in range(nLines)]
+    tmpDir = Path(tempfile.mkdtemp())
+    share, shareArgs = uinamespace._share, uinamespace._shareArgs
+    try:
+        p = tmpDir/"shared.uins"
+        p.write_lines(lines)
+        results = []
+        for label,shared in (("unshared (legacy)",False),("shared",True)):
+            if not shared:
+                uinamespace._share, uinamespace._shareArgs = (lambda v: v), (lambda a: a)
+            uinamespace._shared.clear()
+            try:
+                t, uns = timed(uinamespace.UiNameSpace.load,p)
+            finally:
+                uinamespace._share, uinamespace._shareArgs = share, shareArgs
+            items = [item for key,item in uns.walk()]
+            nBytes = metadataBytes(items)
+            tCopy, copies = timed(lambda: [deepcopy(item) for item in items])
+            tEq, _ = timed(lambda: [a == b for a,b in zip(items,copies)])
+            report("%s, load" % label,t,"(%.1f MB of items and arguments)" % (nBytes/1e6))
+            report("%s, deepcopy every item" % label,tCopy)
+            report("%s, compare every item" % label,tEq)
+            results.append((nBytes,tCopy,tEq))
+        (bOld,cOld,eOld), (bNew,cNew,eNew) = results
+        print "  %.1fx less memory, deepcopy %.1fx, compare %.1fx" % (float(bOld)/bNew,cOld/cNew,eOld/eNew)
+    finally:
+        tmpDir.rmtree()
+
+
+# --- load cache --------------------------------------------------------------
+
+def benchCache(nLines=50000,nLoads=10):
+    from uinamespace import UiNameSpace
+    from nscache import LoadCache
+    print "load the same %d line .uins %d times" % (nLines,nLoads)
+    tmpDir = Path(tempfile.mkdtemp())
+    cache = UiNameSpace.loadCache
+    try:
+        p = tmpDir/"template.uins"
+        p.write_lines(makeLines(nLines,True))
+        UiNameSpace.loadCache = None
+        tOld, _ = timed(lambda: [UiNameSpace.load(p) for i in range(nLoads)])
+        report("parse every time (legacy)",tOld)
+        UiNameSpace.loadCache = LoadCache()
+        tNew, copies = timed(lambda: [UiNameSpace.load(p) for i in range(nLoads)])
+        report("load cache",tNew,"(%.1fx, %r)" % (tOld/tNew,sorted(UiNameSpace.loadCache.stats().items())))
+        t, _ = timed(lambda: [c['section000.param000001'] for c in copies])
+        report("first get from each copy",t)
+        UiNameSpace.loadCache = LoadCache(onDisk=True)
+        UiNameSpace.load(p)
+        UiNameSpace.loadCache = LoadCache(onDisk=True)
+        t, _ = timed(UiNameSpace.load,p)
+        report("new session, on disk cache",t,"(%.1fx the first parse)" % (tOld/nLoads/t))
+    finally:
+        UiNameSpace.loadCache = cache
+        tmpDir.rmtree()
+
+
+# --- layers ------------------------------------------------------------------
+
+def benchLayers(nKeys=100000,nRounds=5):
+    from nslayers import LayeredNameSpace
+    print "resolve %d keys through local/inherited/default layers, %d rounds" % (nKeys,nRounds)
+    default = makeNameSpace(nKeys)
+    inherited = makeNameSpace(nKeys // 2)
+    local = makeNameSpace(nKeys // 10)
+    keys = default.dict.keys()
+    layerList = (local,inherited,default)
+    def walk():
+        for key in keys:
+            for rank,ns in enumerate(layerList):
+                if key in ns:
+                    break
+            value = ns.get(key)
+    def loop(func):
+        for r in range(nRounds):
+            func()
+    tOld, _ = timed(loop,walk)
+    report("walk the layers per lookup (legacy)",tOld)
+    layers = LayeredNameSpace(local,inherited,default)
+    t, _ = timed(layers.resolveAll)
+    report("resolveAll()",t)
+    tNew, _ = timed(loop,lambda: map(layers.resolve,keys))
+    report("resolve(), cached",tNew,"(%.1fx)" % (tOld/tNew))
+    t, _ = timed(lambda: [inherited.set(k,-1.0) for k in keys[:1000]])
+    report("1000 sets in a layer, invalidating",t)
+    key = [k for k in keys[:1000] if k not in local][0]
+    assert layers.resolve(key) == (-1.0,1)
+    layers.close()
+
+
+# --- load many ---------------------------------------------------------------
+
+def benchLoadMany(nFiles=32,nLines=5000):
+    import multiprocessing
+    from uinamespace import UiNameSpace
+    nCpus = multiprocessing.cpu_count()
+    print "load %d files of %d .uins lines, %d cpus" % (nFiles,nLines,nCpus)
+    tmpDir = Path(tempfile.mkdtemp())
+    cache = UiNameSpace.loadCache
+    try:
+        files = []
+        for i in range(nFiles):
+            files.append(tmpDir/("shot%03d.uins" % i))
+            files[-1].write_lines(makeLines(nLines,True))
+        UiNameSpace.loadCache = None
+        tOld, _ = timed(lambda: [UiNameSpace.load(f) for f in files])
+        report("load() one after another (legacy)",tOld)
+        for workers in sorted(set([1,2,nCpus])):
+            t, _ = timed(lambda: list(UiNameSpace.loadMany(files,workers)))
+            report("loadMany(), %d workers" % workers,t,"(%.1fx)" % (tOld/t))
+    finally:
+        UiNameSpace.loadCache = cache
+        tmpDir.rmtree()
+
+
+# --- undo --------------------------------------------------------------------
+
+def benchUndo(nKeys=100000,nSteps=200,nEdits=10):
+    from nsjournal import UndoJournal
+    print "%d steps of %d edits on %d keys, then undo them all" % (nSteps,nEdits,nKeys)
+    keys = makeNameSpace(nKeys).dict.keys()[:nSteps*nEdits]
+    def legacy(ns):
+        history = []
+        for i in range(nSteps):
+            history.append(ns.dupe())
+            for key in keys[i*nEdits:(i+1)*nEdits]:
+                ns.set(key,-1.0)
+        while history:
+            ns.apply(ns.diff(history.pop()))
+        return ns
+    def journaled(ns):
+        journal = UndoJournal(ns)
+        for i in range(nSteps):
+            journal.endStep()
+            for key in keys[i*nEdits:(i+1)*nEdits]:
+                journal.set(key,-1.0)
+        while journal.undo():
+            pass
+        return ns
+    tOld, ns = timed(legacy,makeNameSpace(nKeys))
+    report("dupe() per step, apply(diff) (legacy)",tOld)
+    assert ns[keys[0]] != -1.0
+    tNew, ns = timed(journaled,makeNameSpace(nKeys))
+    report("UndoJournal",tNew,"(%.1fx)" % (tOld/tNew))
+    assert ns[keys[-1]] != -1.0
+
+
+# --- tool box ----------------------------------------------------------------
+
+def qtApp():
+    "The QApplication the widget benchmarks need, made on first use"
+    from PyQt4.QtGui import QApplication
+    return QApplication.instance() or QApplication(sys.argv)
+
+def benchToolBox(nTabs=4,nSections=50,nParams=50):
+    import utils
+    import pyQtEditWidgets as pqw
+    qtApp()
+    nKeys = nTabs*nSections*nParams
+    print "updateUiNameSpace() on %d keys, against rows that only record what they are given" % nKeys
+
+    class FakeRow(object):
+        def __init__(self,item):
+            self.nameSpaceItem = item
+            self.values = []
+        def setValue(self,v):
+            self.values.append(v)
+        def blockSignals(self,b):
+            return False
+
+    def fakeToolBox():
+        "A WidgetSetToolBox whose _addRows() makes FakeRows, and the paramNames it was given in order"
+        toolBox = pqw.WidgetSetToolBox(None)
+        added = []
+        def addRows(ws,tabName,rows,callbackFunc):
+            for sectionName,pName,item in rows:
+                paramName = ".".join([tabName,sectionName] + ([pName] if pName is not None else []))
+                dict.__setitem__(toolBox.widgetIndex,paramName,FakeRow(item))
+                toolBox._shown[paramName] = pqw._shownValue(item.value)
+                added.append(paramName)
+        toolBox._addRows = addRows
+        return toolBox, added
+
+    noop = lambda paramName,value: None
+    template = utils.UiNameSpace()
+    template.parse("\n".join(["tab%d.section%02d.p%02d = Float(value=%d.0)" % (t,s,p,p)
+                              for t in range(nTabs) for s in range(nSections) for p in range(nParams)]))
+    a = template.dupe()
+    toolBox, added = fakeToolBox()
+    toolBox.addUiNameSpace(a,noop)
+    for t in range(nTabs):
+        toolBox.buildTab("tab%d" % t)
+    assert len(added) == nKeys
+
+    b = template.dupe()
+    b.updateValue('tab1.section03.p04',99.0)
+    newKeys = ['tab2.section%02d.extra' % s for s in (3,7,23,41)] + ['tab2.newSection.q','tab2.newSection.a']
+    for paramName in newKeys:
+        b.set(paramName,utils.UiNameSpace.LocalFuncTable['Float'](value=1.0))
+    del added[:]
+    t, _ = timed(toolBox.updateUiNameSpace,b,noop)
+    report("updateUiNameSpace(), one changed, %d new" % len(newKeys),t)
+    rows = [paramName for paramName,row in dict.items(toolBox.widgetIndex) if row.values]
+    assert rows == ['tab1.section03.p04'], rows
+    # rows are added in the order buildTab() makes them
+    fresh, order = fakeToolBox()
+    fresh.addUiNameSpace(b,noop)
+    fresh.buildTab('tab2')
+    assert added == [paramName for paramName in order if paramName in newKeys] and sorted(added) == sorted(newKeys), added
+    # the rows hold b's own items, changing them leaves a and the template alone
+    for paramName in ('tab0.section00.p00',newKeys[0]):
+        item = dict.__getitem__(toolBox.widgetIndex,paramName).nameSpaceItem
+        assert item is b.get(paramName)
+        item.setValue(42.0)
+    assert a.get('tab0.section00.p00').value == template.get('tab0.section00.p00').value == 0.0
+    toolBox.unfollow()
+    fresh.unfollow()
+
+
+# --- ranks -------------------------------------------------------------------
+
+def benchRanks(nWidgets=500):
+    import pyQtEditWidgets as pqw
+    qtApp()
+    print "set the inheritance rank of %d widgets" % nWidgets
+    # a rank set again applies its enabled state and style, whatever happened in between
+    w = pqw.FloatEditWidget()
+    w.setInheritanceRank(1)
+    w.setEditEnabled(True)
+    w.setInheritanceRank(1)
+    assert not w.groupEnabled
+    assert w.nameL.font() == pqw.rankStyle(1)[1]
+    w.reset()
+    assert w.groupEnabled and w.inheritanceRank() == 0
+    w.setInheritanceRank(1)
+    w.setInheritanceRank(1)
+    assert not w.groupEnabled
+    w.setInheritanceRank(0)
+    assert w.groupEnabled
+
+    widgets = [pqw.FloatEditWidget() for i in range(nWidgets)]
+    t, _ = timed(lambda: [w.setInheritanceRank(i % 3) for i,w in enumerate(widgets)])
+    report("setInheritanceRank() per widget",t)
+    t, _ = timed(pqw.setInheritanceRanks,dict((w,(i+1) % 3) for i,w in enumerate(widgets)))
+    report("setInheritanceRanks()",t)
+    assert [w.inheritanceRank() for w in widgets[:3]] == [1,2,0]
+
+
+
+BENCHMARKS = [
+    ("write", benchWrite),
+    ("read",  benchRead),
+    ("getset", benchGetSet),
+    ("views", benchViews),
+    ("dupe", benchDupe),
+    ("snapshot", benchSnapshot),
+    ("lazy", benchLazy),
+    ("notify", benchNotify),
+    ("diff", benchDiff),
+    ("many", benchMany),
+    ("uiitems", benchUiItems),
+    ("coerce", benchCoerce),
+    ("columns", benchColumns),
+    ("schema", benchSchema),
+    ("shared", benchShared),
+    ("cache", benchCache),
+    ("layers", benchLayers),
+    ("loadmany", benchLoadMany),
+    ("undo", benchUndo),
+    ("toolbox", benchToolBox),
+    ("ranks", benchRanks),
+]
+
+if __name__ == '__main__':
+    patterns = sys.argv[1:]
+    for name, func in BENCHMARKS:
+        if not patterns or [p for p in patterns if p in name]:
+            func()
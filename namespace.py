@@ -1,90 +1,762 @@
 #!/usr/bin/env python
 
+import os
+import stat
+import tempfile
+import nssnapshot
 from   copy                import  deepcopy
+from   collections         import  Mapping
+from   contextlib          import  contextmanager
 from   path                import  path as Path
+from   nsparse             import  parseLines, sectionRuns
 
 
+def _umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+def _replaceFile(file,write):
+    """
+    Call write(f) on a temporary file next to 'file' which then replaces it,
+    so readers never see a half written file.  Returns what write() returns.
+    """
+    p = Path(file)
+    fd, tmp = tempfile.mkstemp(prefix=".%s." % p.basename(), dir=p.dirname() or os.curdir)
+    f = os.fdopen(fd,'wb')
+    try:
+        result = write(f)
+        f.close()
+    except:
+        f.close()
+        os.remove(tmp)
+        raise
+    if p.exists():
+        os.chmod(tmp,stat.S_IMODE(p.stat().st_mode))
+        if os.name == 'nt':
+            p.remove()
+    else:
+        os.chmod(tmp,0666 & ~_umask())
+    os.rename(tmp,p)
+    return result
+
+
+_MISSING = object()
+
+# value types that are never a NameSpace, set() skips the isinstance checks for these
+_LEAFTYPES = frozenset([type(None),bool,int,long,float,complex,str,unicode,tuple,list,dict])
+# leaves copies may share, anything else (lists, UiItems...) is copied
+# along with the namespace holding it, see NameSpace.dupe()
+_IMMUTABLE = frozenset([type(None),bool,int,long,float,complex,str,unicode])
+
+def _hasMutable(ns):
+    "True if any leaf below namespace 'ns' is not one of the _IMMUTABLE types"
+    for v in ns._index.itervalues():
+        if v.__class__ not in _IMMUTABLE:
+            return True
+    return False
+
+def _changes(old,new):
+    "False if storing leaf 'new' where 'old' was makes no difference anyone could see"
+    if old.__class__ in _IMMUTABLE and old.__class__ is new.__class__:
+        return old != new
+    # anything mutable may have been changed in place before being set again
+    return True
+
+# dotted key -> (path, names, head), see splitKey()
+_splitKeys = dict()
+_SPLITKEYS_MAX = 100000
+
+def splitKey(key):
+    """
+    (path, names, head) for a dotted string or a sequence of names,
+    eg. 'light.key.gain' -> ('light.key.gain', ('light','key','gain'), 'light.key')
+    Strings are split once and remembered.
+    """
+    try:
+        return _splitKeys[key]
+    except (KeyError,TypeError):
+        pass
+    if isinstance(key,(str,unicode)):
+        path = str(key)
+        names = tuple(path.split('.'))
+        split = path, names, path.rpartition('.')[0]
+        if len(_splitKeys) >= _SPLITKEYS_MAX:
+            _splitKeys.clear()
+        _splitKeys[key] = split
+        return split
+    if isinstance(key,(tuple,list)):
+        names = tuple([str(n) for n in key])
+        return '.'.join(names), names, '.'.join(names[:-1])
+    raise ValueError, key
+
 
 class NameSpace(object):
+    """
+    Nested name -> value store addressed with dotted keys, eg. ns['light.key.gain'].
+    Besides the nested '_data' every namespace keeps flat indexes of everything
+    below it, '_index' (dotted path -> leaf value) and '_nodes' (dotted path ->
+    sub-namespace), so get and 'in' are a single dictionary probe and set
+    finds its namespace with one probe.
+    '_parents' lists the (namespace, name) pairs this one is stored under so
+    changes made through a sub-namespace reach the indexes above it.
+
+    dupe() copies on write: '_borrowers' lists the (namespace, name) pairs of
+    copies that share this namespace instead of holding one of their own.
+    Before a shared namespace changes each borrower is given a shallow copy,
+    and a copy about to change something it borrows copies just the path
+    down to it.  '_mayShare' marks namespaces that take part in this at all,
+    the others never pay for the checks.
+
+    read(lazy=True) leaves the lines under each top level name unparsed in
+    '_lazy' until something there is first used.
+
+    subscribe() registers callbacks in '_observers'; '_watched' is set on
+    namespaces with observers and on everything below them, those report
+    what each change did to their leaves up through '_parents'.
+    """
 
     def __init__(self,kv={},**kw):
         self._data = dict()
+        self._initIndex()
         self.update(kv)
         self.update(kw)
 
     def set(self,key,value):
-        if isinstance(key,(tuple,list)):
-            if len(key) == 1:
-                self._data[key[0]] = value
-            elif len(key) > 1:
-                if key[0] in self._data:
-                    ns = self._data[key[0]]
-                    if not isinstance(ns,self.__class__):
-                        raise ValueError, ns
-                else:
-                    ns = self._data[key[0]] = self.__class__()
-                ns.set(key[1:],value)
-            else:
+        try:
+            path, names, head = _splitKeys[key]
+        except (KeyError,TypeError):
+            path, names, head = splitKey(key)
+            if not names:
                 raise KeyError, key
-        elif isinstance(key,(str,unicode)):
-            self.set(str(key).split('.'),value)
+        name = names[-1]
+        if self._lazy and names[0] in self._lazy:
+            self._loadLazy(names[0])
+        if self._mayShare:
+            self._resolve(names[:-1],True)._put(name,value)
+            return
+        node = self
+        if head:
+            node = self._nodes.get(head)
+            if node is None:
+                node = self._resolve(names[:-1],True)
+        old = node._data.get(name)
+        if old.__class__ in _LEAFTYPES and value.__class__ in _LEAFTYPES and not node._watched:
+            # the common case, one plain value replacing another
+            node._data[name] = value
+            node._indexSet(name,value)
         else:
-            raise ValueError, key
+            node._put(name,value)
+
+    def delete(self,key):
+        "Remove the leaf or sub-namespace at key"
+        path, names, head = splitKey(key)
+        if not names:
+            raise KeyError, key
+        if self._lazy and names[0] in self._lazy:
+            self._loadLazy(names[0])
+        try:
+            node = self._resolve(names[:-1],False)
+        except KeyError:
+            raise KeyError, key
+        if names[-1] not in node._data:
+            raise KeyError, key
+        node._put(names[-1],_MISSING)
+
+    __delitem__ = delete
 
     def updateValue(self,paramName,value):
         p = self.get(paramName)
         p.setValue(value)
+        if self._watched:
+            self._notify([splitKey(paramName)[0]])
 
     def __contains__(self,key):
         try:
-            self.get(key)
-        except:
-            return False
-        return True
+            if key in self._index or key in self._nodes:
+                return True
+        except TypeError:
+            pass
+        if isinstance(key,(str,unicode)):
+            path = key
+        else:
+            try:
+                path = splitKey(key)[0]
+            except ValueError:
+                return False
+            if path in self._index or path in self._nodes:
+                return True
+        if self._lazy and self._loadLazyKey(path):
+            return path in self._index or path in self._nodes
+        return False
 
     def get(self,key):
-        if isinstance(key,(tuple,list)):
-            if len(key) == 1:
-                #print "Len(1)",self._data, key[0]
-                #print "-->",self._data[key[0]]
-                return self._data[key[0]]
-            elif len(key) > 1:
-                if key[0] in self._data:
-                    ns = self._data[key[0]]
-                    if not isinstance(ns,self.__class__):
-                        raise ValueError, ns
-                else:
-                    raise KeyError, key
-                return ns.get(key[1:])
-            else:
-                raise KeyError, key
-        elif isinstance(key,(str,unicode)):
-            k = str(key).split('.')
-            #print "K",k
-            return self.get(k)
-        else:
-            raise ValueError, key
+        try:
+            value = self._index.get(key,_MISSING)
+            if value is _MISSING:
+                value = self._nodes.get(key,_MISSING)
+        except TypeError:
+            value = _MISSING
+        if value is _MISSING:
+            path = splitKey(key)[0]
+            value = self._index.get(path,_MISSING)
+            if value is _MISSING:
+                value = self._nodes.get(path,_MISSING)
+                if value is _MISSING:
+                    if self._lazy and self._loadLazyKey(path):
+                        return self.get(key)
+                    self._missing(key)
+        if self._mayShare and value.__class__ not in _IMMUTABLE:
+            return self._own(splitKey(key)[1])
+        return value
 
     __getitem__ = get
     __setitem__ = set
     
     def __iter__(self):
-        for k in self._data.keys():
+        "Top level names, including those read(lazy=True) has not parsed yet"
+        names = self._data.keys()
+        if self._lazy:
+            names += self._lazy.keys()
+        for k in names:
             yield k
 
     def items(self):
-        for i in self._data.items():
-            yield i
+        if self._lazy:
+            self._loadLazy()
+        if self._mayShare:
+            for k in self._data.keys():
+                yield k, self._own((k,))
+        else:
+            for i in self._data.items():
+                yield i
 
     def has_key(self,key):
+        if self._lazy:
+            self._loadLazy(key)
         return self._data.has_key(key)
 
     def update(self,kv={},**kw):
-        kv.update(kw)
-        for k,v in kv.items():
-            self.set(k,v)
+        "Set every key in kv, then every keyword.  kv is not changed."
+        self.setMany(kv)
+        if kw:
+            self.setMany(kw)
+
+    def getMany(self,keys,default=_MISSING):
+        """
+        [value for each key], a missing key gives 'default' or raises
+        KeyError like get() when there is none
+        """
+        try:
+            index = self._index
+            values = [index.get(k,_MISSING) for k in keys]
+        except TypeError:
+            # keys given as sequences of names
+            keys = [splitKey(k)[0] for k in keys]
+            index = self._index
+            values = [index.get(k,_MISSING) for k in keys]
+        if self._mayShare:
+            again = [i for i,v in enumerate(values) if v is _MISSING or v.__class__ not in _IMMUTABLE]
+        else:
+            again = [i for i,v in enumerate(values) if v is _MISSING]
+        # sub-namespaces, unread lazy sections, missing keys and copies still sharing
+        for i in again:
+            try:
+                values[i] = self.get(keys[i])
+            except (KeyError,ValueError):
+                if default is _MISSING:
+                    raise
+                values[i] = default
+        return values
+
+    def containsMany(self,keys):
+        "[key in self for each key], without raising anything for keys that are not there"
+        index, nodes = self._index, self._nodes
+        try:
+            found = [k in index or k in nodes for k in keys]
+        except TypeError:
+            return [k in self for k in keys]
+        if self._lazy:
+            found = [f or k in self for f,k in zip(found,keys)]
+        return found
+
+    def setMany(self,items):
+        """
+        Set every (key, value) of items, a mapping or a sequence of pairs,
+        as set() one after the other would, in one batch (see batch()).
+        """
+        if hasattr(items,'items'):
+            items = items.items()
+        self.beginBatch()
+        try:
+            for key,value in items:
+                self.set(key,value)
+        finally:
+            self.endBatch()
+
+    # --- index upkeep --------------------------------------------------------
+
+    # attributes rebuilt from _data, or kept by this object alone, rather than copied or pickled
+    _DERIVED = ('_index','_nodes','_parents','_above','_hdict',
+                '_borrowers','_cowIndex','_mayShare','_lazy',
+                '_observers','_watched','_batchDepth','_pending')
+
+    def _initIndex(self):
+        self._index = dict()
+        self._nodes = dict()
+        self._parents = []
+        self._above = None
+        self._hdict = None
+        self._borrowers = []
+        self._cowIndex = False      # _index and _nodes shared with a copy
+        self._mayShare = False
+        self._lazy = None           # top level name -> [(start, lines, funcs, file)] not parsed yet
+        self._observers = None      # _Observers, see subscribe()
+        self._watched = False
+        self._batchDepth = 0
+        self._pending = None        # changed keys held back by a batch
+
+    def _missing(self,key):
+        "Raise the error get() gives for a key that is not there"
+        path, names, head = splitKey(key)
+        node = self
+        for name in names[:-1]:
+            if name not in node._data:
+                raise KeyError, key
+            node = node._data[name]
+            if not isinstance(node,NameSpace):
+                raise ValueError, node
+        if not names:
+            raise KeyError, key
+        raise KeyError, names[-1]
+
+    def _resolve(self,names,create):
+        """
+        The sub-namespace at 'names', adopting any borrowed on the way and
+        creating missing ones if 'create' is set (KeyError otherwise)
+        """
+        node = self
+        for name in names:
+            child = node._data.get(name,_MISSING)
+            if child is _MISSING:
+                if not create:
+                    raise KeyError, name
+                child = node.__class__()
+                node._put(name,child)
+            elif not isinstance(child,NameSpace):
+                raise ValueError, child
+            elif child._borrowers and node._borrows(name,child):
+                child = node._adopt(name,child)
+            node = child
+        return node
+
+    def _own(self,names):
+        "The value at 'names', after copying anything there still shared with a copy"
+        try:
+            node = self._resolve(names[:-1],False)
+            name = names[-1]
+            value = node._data[name]
+        except (KeyError,IndexError):
+            self._missing(names)
+        if isinstance(value,NameSpace):
+            if value._borrowers and node._borrows(name,value):
+                value = node._adopt(name,value)
+        elif node._mayShare:
+            # it may be changed in place, copies still sharing it get their own first
+            node._unshare()
+        return value
+
+    def _loadLazy(self,name=None):
+        "Parse the lines read(lazy=True) left under top level 'name', or all of them; False if there were none"
+        lazy = self._lazy
+        if name is None:
+            names = lazy.keys()
+        elif name in lazy:
+            names = [name]
+        else:
+            return False
+        runs = []
+        for name in names:
+            runs += lazy.pop(name)
+        if not lazy:
+            self._lazy = None
+        # the lines were there all along, nobody needs telling
+        watched = self._watched
+        self._watched = False
+        try:
+            for start,lines,funcs,p in runs:
+                for key,value in parseLines(lines,funcs,p,start):
+                    self.set(key,value)
+        finally:
+            if watched:
+                self._watch()
+        return True
+
+    def _loadLazyKey(self,key):
+        names = splitKey(key)[1]
+        return bool(names) and names[0] in self._lazy and self._loadLazy(names[0])
+
+    # --- copy on write -------------------------------------------------------
+
+    def _markShared(self):
+        "Set _mayShare here and above, it is always set on everything above a namespace that has it"
+        if not self._mayShare:
+            self._mayShare = True
+            for parent,name in self._parents:
+                parent._markShared()
+
+    def _borrows(self,name,child):
+        for borrower,borrowedName in child._borrowers:
+            if borrower is self and borrowedName == name:
+                return True
+        return False
+
+    def _clone(self):
+        """
+        A namespace with the same contents that borrows every sub-namespace
+        of this one and has its own copy of every mutable leaf
+        """
+        new = self.__class__.__new__(self.__class__)
+        for k,v in self.__dict__.items():
+            if k != '_data' and k not in self._DERIVED:
+                new.__dict__[k] = v
+        new._data = dict(self._data)
+        new._initIndex()
+        new._index = self._index
+        new._nodes = self._nodes
+        new._hdict = self._hdict
+        new._cowIndex = self._cowIndex = True
+        new._mayShare = True
+        for k,v in self._data.iteritems():
+            if isinstance(v,NameSpace):
+                v._borrowers.append((new,k))
+            elif v.__class__ not in _IMMUTABLE:
+                new._data[k] = deepcopy(v)
+                new._indexSet(k,new._data[k])
+        return new
+
+    def _unborrow(self,name,child):
+        for i,(borrower,borrowedName) in enumerate(child._borrowers):
+            if borrower is self and borrowedName == name:
+                del child._borrowers[i]
+                return True
+        return False
+
+    def _adopt(self,name,child):
+        "Replace the borrowed sub-namespace 'child' with a copy of its own"
+        self._unborrow(name,child)
+        return self._relink(name,child._clone())
+
+    def _relink(self,name,new):
+        "Hold 'new', a copy of the sub-namespace under 'name', instead of it"
+        self._data[name] = new
+        new._parents.append((self,name))
+        new._forgetAncestors()
+        if self._watched:
+            new._watch()
+        for ns,prefix in [(self,'')] + self._ancestors():
+            if ns._cowIndex:
+                ns._ownIndex()
+            ns._nodes[prefix+name] = new
+        for k,v in new._data.iteritems():
+            if v.__class__ not in _IMMUTABLE and not isinstance(v,NameSpace):
+                new._indexSet(k,v)
+        return new
+
+    def _unshare(self):
+        "Give every copy sharing this namespace, or one above it, a copy of its own"
+        chain = [self] + [ns for ns,prefix in self._ancestors()]
+        shared = [ns for ns in chain if ns._borrowers]
+        while shared:
+            # top down: evicting a namespace makes its copies borrow the ones below
+            for ns in reversed(shared):
+                while ns._borrowers:
+                    borrower,name = ns._borrowers.pop()
+                    borrower._relink(name,ns._clone())
+            shared = [ns for ns in chain if ns._borrowers]
+
+    def _ownIndex(self,rebuild=False):
+        """
+        Stop sharing _index and _nodes with a copy; with 'rebuild' set they
+        are made again from _data and the indexes of the namespaces in it
+        """
+        if not rebuild:
+            self._index = dict(self._index)
+            self._nodes = dict(self._nodes)
+        else:
+            index, nodes = dict(), dict()
+            for k,v in self._data.iteritems():
+                if isinstance(v,NameSpace):
+                    p = k + '.'
+                    index.update([(p+n,x) for n,x in v._index.iteritems()])
+                    nodes.update([(p+n,x) for n,x in v._nodes.iteritems()])
+                    nodes[k] = v
+                else:
+                    index[k] = v
+            self._index, self._nodes = index, nodes
+        self._cowIndex = False
+
+    def _ownMutable(self):
+        """
+        Copy what is still shared with a copy on the way down to every
+        mutable leaf, so the leaves the indexes and _data hand out are this
+        namespace's alone.  Parts holding only immutable leaves stay shared.
+        """
+        if [v for v in self._data.itervalues() if v.__class__ not in _IMMUTABLE and not isinstance(v,NameSpace)]:
+            if self._borrowers or [ns for ns,prefix in self._ancestors() if ns._borrowers]:
+                self._unshare()
+        for name,child in self._data.items():
+            if isinstance(child,NameSpace) and _hasMutable(child):
+                if child._borrowers and self._borrows(name,child):
+                    child = self._adopt(name,child)
+                child._ownMutable()
+
+    def _put(self,name,value):
+        "Store value under a single name, keeping every index above in step"
+        if not self._watched:
+            self._store(name,value)
+            return
+        before = self._leaves(name)
+        self._store(name,value)
+        after = self._leaves(name)
+        changed = [k for k in set(before) | set(after)
+                   if _changes(before.get(k,_MISSING),after.get(k,_MISSING))]
+        if changed:
+            self._notify(changed)
+
+    def _store(self,name,value):
+        "_put() without the notification, a value of _MISSING removes the name"
+        if self._mayShare:
+            self._unshare()
+        data = self._data
+        old = data.get(name)
+        if value is _MISSING:
+            if isinstance(old,NameSpace):
+                self._detach(name,old)
+            elif name in data:
+                del data[name]
+                self._indexDrop({name:old},{})
+            return
+        if isinstance(old,NameSpace) or isinstance(value,NameSpace):
+            if old is value:
+                if value._borrowers and self._unborrow(name,value):
+                    # storing what was only borrowed, from now on both hold the same one
+                    value._parents.append((self,name))
+                    value._forgetAncestors()
+                return
+            if isinstance(old,NameSpace):
+                self._detach(name,old)
+            elif name in data:
+                self._indexDrop({name:old},{})
+            if isinstance(value,NameSpace):
+                self._attach(name,value)
+                return
+        data[name] = value
+        self._indexSet(name,value)
+
+    def _ancestors(self):
+        "[(namespace, prefix)] for every namespace above this one, kept until the tree changes"
+        above = self._above
+        if above is None:
+            above = []
+            for parent,name in self._parents:
+                above.append((parent,name + '.'))
+                for ancestor,prefix in parent._ancestors():
+                    above.append((ancestor,prefix + name + '.'))
+            self._above = above
+        return above
+
+    def _forgetAncestors(self):
+        self._above = None
+        for node in self._nodes.itervalues():
+            node._above = None
+
+    def _attach(self,name,child):
+        if child._lazy:
+            child._loadLazy()
+        self._data[name] = child
+        child._parents.append((self,name))
+        child._forgetAncestors()
+        if child._mayShare:
+            self._markShared()
+        if self._watched:
+            child._watch()
+        p = name + '.'
+        leaves = dict([(p+k,v) for k,v in child._index.iteritems()])
+        nodes  = dict([(p+k,v) for k,v in child._nodes.iteritems()])
+        nodes[name] = child
+        self._indexAdd(leaves,nodes)
+
+    def _detach(self,name,child):
+        del self._data[name]
+        for links in (child._parents,child._borrowers):
+            for i,(parent,parentName) in enumerate(links):
+                if parent is self and parentName == name:
+                    del links[i]
+                    break
+        child._forgetAncestors()
+        p = name + '.'
+        leaves = dict([(p+k,v) for k,v in child._index.iteritems()])
+        nodes  = dict([(p+k,v) for k,v in child._nodes.iteritems()])
+        nodes[name] = child
+        self._indexDrop(leaves,nodes)
+
+    def _indexSet(self,path,value):
+        "Record one leaf, 'path' is relative to self"
+        if self._cowIndex:
+            self._ownIndex()
+        self._index[path] = value
+        self._hdict = None
+        for ancestor,prefix in self._above or self._ancestors():
+            if ancestor._cowIndex:
+                ancestor._ownIndex()
+            ancestor._index[prefix + path] = value
+            ancestor._hdict = None
+
+    def _indexAdd(self,leaves,nodes):
+        "Record leaves and sub-namespaces, keys are relative to self"
+        for ns,prefix in [(self,'')] + self._ancestors():
+            if ns._cowIndex:
+                ns._ownIndex()
+            ns._hdict = None
+            ns._index.update([(prefix+k,v) for k,v in leaves.iteritems()])
+            ns._nodes.update([(prefix+k,v) for k,v in nodes.iteritems()])
+
+    def _indexDrop(self,leaves,nodes):
+        "Forget leaves and sub-namespaces, keys are relative to self"
+        for ns,prefix in [(self,'')] + self._ancestors():
+            if ns._cowIndex:
+                ns._ownIndex()
+            ns._hdict = None
+            for k in leaves:
+                ns._index.pop(prefix+k,None)
+            for k in nodes:
+                ns._nodes.pop(prefix+k,None)
+
+    # --- change notification -------------------------------------------------
+
+    def subscribe(self,key,callback,prefix=False):
+        """
+        Call callback(keys) after the leaf at dotted 'key' changes, or with
+        'prefix' set any leaf at or below it ('' for everything).  'keys' is
+        the sorted list of changed leaves, relative to this namespace, each
+        callback is called once per set() or once per batch (see batch()).
+        Leaves changed in place (list.append, UiItem.setValue) are only seen
+        through updateValue() or by set()ting them again.
+        """
+        if self._observers is None:
+            self._observers = _Observers()
+        self._observers.add(splitKey(key)[0] if key else '',callback,prefix)
+        self._watch()
+
+    def unsubscribe(self,key,callback,prefix=False):
+        "Undo subscribe() with the same arguments, ValueError if there is no such subscription"
+        if self._observers is None:
+            raise ValueError("not subscribed: %r" % (key,))
+        self._observers.remove(splitKey(key)[0] if key else '',callback,prefix)
+        if not self._observers:
+            self._observers = None
+            self._unwatch()
+
+    def beginBatch(self):
+        "Hold back notifications from this namespace and those below it until endBatch()"
+        self._batchDepth += 1
+
+    def endBatch(self):
+        "Deliver what was held back since the matching beginBatch(), once per callback"
+        if self._batchDepth <= 0:
+            raise ValueError("endBatch() without beginBatch()")
+        self._batchDepth -= 1
+        if self._batchDepth == 0:
+            for ns in [self] + self._nodes.values():
+                if ns._pending and not ns._inBatch():
+                    pending = ns._pending
+                    ns._pending = None
+                    ns._deliver(pending)
+
+    @contextmanager
+    def batch(self):
+        "with ns.batch(): ... calls beginBatch() and endBatch() around the block"
+        self.beginBatch()
+        try:
+            yield self
+        finally:
+            self.endBatch()
+
+    def _watch(self):
+        "Set _watched here and on everything below"
+        self._watched = True
+        for node in self._nodes.itervalues():
+            node._watched = True
+
+    def _unwatch(self):
+        "Clear _watched here and below where neither a namespace nor one above it has observers"
+        for node in [self] + self._nodes.values():
+            if node._watched and node._observers is None \
+                    and not [ns for ns,prefix in node._ancestors() if ns._observers is not None]:
+                node._watched = False
+
+    def _inBatch(self):
+        if self._batchDepth:
+            return True
+        for ancestor,prefix in self._ancestors():
+            if ancestor._batchDepth:
+                return True
+        return False
+
+    def _leaves(self,name):
+        "{dotted path: leaf} for what is stored under 'name'"
+        v = self._data.get(name,_MISSING)
+        if v is _MISSING:
+            return {}
+        if isinstance(v,NameSpace):
+            p = name + '.'
+            return dict([(p+k,x) for k,x in v._index.iteritems()])
+        return {name: v}
+
+    def _notify(self,keys):
+        "Tell the observers here and above that leaves 'keys', relative to self, changed"
+        for ns,prefix in [(self,'')] + self._ancestors():
+            if ns._observers is not None:
+                changed = [prefix+k for k in keys] if prefix else keys
+                if ns._inBatch():
+                    if ns._pending is None:
+                        ns._pending = set()
+                    ns._pending.update(changed)
+                else:
+                    ns._deliver(changed)
+
+    def _deliver(self,keys):
+        if self._observers is not None:
+            for callback,changed in self._observers.calls(keys):
+                callback(changed)
+
+    def __deepcopy__(self,memo):
+        "Copies the data below, the copy is not stored under anything"
+        new = self.__class__.__new__(self.__class__)
+        memo[id(self)] = new
+        new.__setstate__(dict([(k,deepcopy(v,memo)) for k,v in self.__getstate__().items()]))
+        return new
+
+    def __getstate__(self):
+        if self._lazy:
+            self._loadLazy()
+        state = self.__dict__.copy()
+        for k in self._DERIVED:
+            del state[k]
+        return state
+
+    def __setstate__(self,state):
+        data = state.pop('_data')
+        self.__dict__.update(state)
+        self._data = dict()
+        self._initIndex()
+        for k,v in data.items():
+            self._put(k,v)
 
     def dump(self,prefix=''):
+        if self._lazy:
+            self._loadLazy()
         for k,v in self._data.items():
             name = "%s.%s" % (prefix,k) if prefix else k
             if isinstance(v,self.__class__):
@@ -97,94 +769,446 @@ class NameSpace(object):
     
     @property
     def hdict(self):
-        "Hierarchial dictionary"
-        d = dict()
-        for k,v in self._data.items():
-            #name = "%s.%s" % (prefix,k) if prefix else k
-            if isinstance(v,self.__class__):
-                d.update([(k,v.hdict)])
-            else:
-                d.update([(k,v)])
+        """
+        Hierarchial dictionary, a new one on every call.  It is copied from
+        one each namespace keeps until something below it changes, so only
+        the changed part is rebuilt; hview reads without copying anything.
+        """
+        if self._lazy:
+            self._loadLazy()
+        if self._mayShare:
+            self._ownMutable()
+        return _thaw(self._frozenHdict())
+
+    def _frozenHdict(self):
+        "The hdict kept in '_hdict', made again if something below changed"
+        d = self._hdict
+        if d is None:
+            d = self._hdict = _FrozenDict([(k,v._frozenHdict() if isinstance(v,NameSpace) else v) for k,v in self._data.iteritems()])
         return d
 
     @property
     def dict(self):
-        "Flattended dictionary where keys are dot-separated"
-        d = dict()
-        for k,v in self._data.items():
-            #name = "%s.%s" % (prefix,k) if prefix else k
-            if isinstance(v,self.__class__):
-                for kk,vv in v.dict.items():
-                    d.update([("%s.%s" % (k,kk),vv)])
-            else:
-                d.update([(k,v)])
-        return d
+        "Flattended dictionary where keys are dot-separated, a copy of the index"
+        if self._lazy:
+            self._loadLazy()
+        if self._mayShare:
+            self._ownMutable()
+        return dict(self._index)
 
-    def read(self,file,localFuncDict={}):
+    @property
+    def view(self):
+        "Read-only live view of the flat dictionary, nothing is copied"
+        return NameSpaceView(self,True)
+
+    @property
+    def hview(self):
+        "Read-only live view of the hierarchial dictionary, nothing is copied"
+        return NameSpaceView(self,False)
+
+    def read(self,file,localFuncDict={},lazy=False):
+        """
+        Set every 'key = value' line of file, calls in values may use localFuncDict.
+        With 'lazy' set the lines are only grouped by top level name, each group
+        is parsed (and any error in it raised) when something under its name is
+        first used.  A namespace stored in another one reads everything at once.
+        """
         p = Path(file)
-        for line in p.lines(retain=False):
-            if line.strip() == '' or line.strip().startswith('#'):  continue
-            if '=' not in line:
-                raise SyntaxError, line
-            lhs, rhs = line.split('=',1)
-            key = lhs.strip()
-            value = eval(rhs,localFuncDict,globals())
-            self.set(key,value)
+        if not lazy or self._parents or self._borrowers:
+            for key,value in parseLines(p.lines(retain=False),localFuncDict,p):
+                self.set(key,value)
+            return
+        if self._lazy is None:
+            self._lazy = dict()
+        for name,start,lines in sectionRuns(p.text()):
+            self._lazy.setdefault(name,[]).append((start,lines,localFuncDict,p))
+        # names already here are read now, the indexes never hold part of a name
+        for name in [name for name in self._lazy if name in self._data]:
+            self._loadLazy(name)
 
     def parse(self,text,localFuncDict={}):
-        lineNum = 1
-        for line in text.split('\n'):
-            if line.strip() == '' or line.strip().startswith('#'):  continue
-            if '=' not in line:
-                raise SyntaxError, line
-            lhs, rhs = line.split('=',1)
-            key = lhs.strip()
-            try:
-                value = eval(rhs,localFuncDict,globals())
-            except Exception, desc:
-                raise Exception("%s parsing '%s' (at line %d)" % (desc,rhs,lineNum))
+        "Set every 'key = value' line of text, calls in values may use localFuncDict"
+        for key,value in parseLines(text.split('\n'),localFuncDict):
             self.set(key,value)
-            lineNum += 1
 
-    def write(self,file,prefix='',append=False):
-        p = Path(file)
-        if not append:
-            p.write_text('')
+    def walk(self,prefix=''):
+        "Generate (dottedName, value) for every leaf, depth first"
+        if self._lazy:
+            self._loadLazy()
+        if self._mayShare:
+            self._ownMutable()
+        return self._walk(prefix)
+
+    def _walk(self,prefix):
         for k,v in self._data.items():
             name = "%s.%s" % (prefix,k) if prefix else k
             if isinstance(v,self.__class__):
-                v.write(file,name,append=True)
+                if v._lazy:
+                    v._loadLazy()
+                for item in v._walk(name):
+                    yield item
             else:
+                yield name, v
+
+    def write(self,file,prefix='',append=False):
+        """
+        Write a 'name = repr(value)' line for every leaf through one file handle.
+        Unless appending, the lines go to a temporary file next to 'file'
+        which then replaces it, so readers never see a half written file.
+        Returns (bytesWritten, keysWritten)
+        """
+        if self._lazy:
+            self._loadLazy()
+        def writeLines(f):
+            nBytes = 0
+            nKeys  = 0
+            # only read, so nothing still shared with a copy needs copying
+            for name,v in self._walk(prefix):
                 try:
                     r = repr(v)
                 except:
-                    print '***',k
-                p.write_lines(["%s = %s" % (name, repr(v))],append=True)
+                    print '***',name
+                    raise
+                line = "%s = %s%s" % (name,r,os.linesep)
+                f.write(line)
+                nBytes += len(line)
+                nKeys  += 1
+            return nBytes, nKeys
+        if not append:
+            return _replaceFile(file,writeLines)
+        f = Path(file).open('ab')
+        try:
+            return writeLines(f)
+        finally:
+            f.close()
+
+    def writeSnapshot(self,file):
+        """
+        Write everything to the binary snapshot format (see nssnapshot), which
+        fromSnapshot() loads far faster than read() parses text.
+        Returns the number of bytes written.
+        """
+        names, values, children = self._record()
+        return _replaceFile(file,lambda f: nssnapshot.writeRecords(f,names,values,children))
+
+    @classmethod
+    def fromSnapshot(cls,file,localFuncDict=None):
+        """
+        A new namespace holding what writeSnapshot() wrote to 'file'.  UiItems
+        are rebuilt with localFuncDict, by default the class's LocalFuncTable.
+        """
+        if localFuncDict is None:
+            localFuncDict = getattr(cls,'LocalFuncTable',{})
+        return cls._fromRecord(nssnapshot.readRecords(file,localFuncDict))
+
+    def _record(self):
+        "(leafNames, leafValues, [(name, record), ...] for the sub-namespaces)"
+        if self._lazy:
+            self._loadLazy()
+        names, values, children = [], [], []
+        for k,v in self._data.iteritems():
+            if isinstance(v,NameSpace):
+                children.append((k,v._record()))
+            else:
+                names.append(k)
+                values.append(v)
+        return names, values, children
+
+    @classmethod
+    def _fromRecord(cls,record):
+        "Build a namespace and its indexes in one go from a _record()"
+        names, values, children = record
+        ns = cls.__new__(cls)
+        ns._initIndex()
+        ns._data = dict(zip(names,values))
+        ns._index = dict(ns._data)
+        for name,childRecord in children:
+            child = cls._fromRecord(childRecord)
+            ns._data[name] = child
+            child._parents.append((ns,name))
+            p = name + '.'
+            ns._index.update([(p+k,v) for k,v in child._index.iteritems()])
+            ns._nodes.update([(p+k,v) for k,v in child._nodes.iteritems()])
+            ns._nodes[name] = child
+        return ns
+
+    def diff(self,other):
+        """
+        The NameSpaceDelta apply() turns this namespace into 'other' with.
+        Sub-namespaces both hold (eg. still shared since dupe()) are skipped
+        without looking inside, a sub-namespace only one of them has is a
+        single entry.  The delta refers to the values of 'other'.
+        """
+        for ns in (self,other):
+            if ns._lazy:
+                ns._loadLazy()
+        delta = NameSpaceDelta()
+        self._diff(other,'',delta)
+        return delta
+
+    def _diff(self,other,prefix,delta):
+        mine = self._data
+        for k,v in other._data.iteritems():
+            old = mine.get(k,_MISSING)
+            if old is v:
+                continue
+            key = prefix + k
+            if old is _MISSING:
+                delta.added[key] = v
+            elif isinstance(old,NameSpace) and isinstance(v,NameSpace):
+                old._diff(v,key + '.',delta)
+            elif old.__class__ is not v.__class__ or old != v:
+                delta.changed[key] = v
+        for k in mine:
+            if k not in other._data:
+                delta.removed.append(prefix + k)
+
+    def apply(self,delta):
+        """
+        Make the changes in a NameSpaceDelta: remove what it removes, then
+        set copies of what it adds and changes.  Observers hear of it as one batch.
+        """
+        if self._lazy:
+            self._loadLazy()
+        self.beginBatch()
+        try:
+            for key in delta.removed:
+                self.delete(key)
+            for values in (delta.changed,delta.added):
+                for key in sorted(values):
+                    v = values[key]
+                    self.set(key,v if v.__class__ in _IMMUTABLE else deepcopy(v))
+        finally:
+            self.endBatch()
 
     def dupe(self):
-        return deepcopy(self)
+        """
+        A copy that shares sub-namespaces with this one until one of them
+        changes or hands out something that could be changed in place; then
+        only the namespaces on the path to it are copied, each with its own
+        copy of the mutable leaves (lists, UiItems...) it holds.
+        Unlike deepcopy() a mutable leaf stored in more than one namespace
+        (as 'a + b' does) and changed in place through another one is not
+        seen as a change, copies still sharing it see the new contents.
+        Nor is a sub-namespace stored under two names in this one stored
+        twice in the copy: each name gets its own copy once either changes.
+        """
+        if self._lazy:
+            self._loadLazy()
+        new = self._clone()
+        for ns in [self] + self._nodes.values():
+            ns._markShared()
+        return new
 
     def __add__(self,other):
         new = self.dupe()
         if not hasattr(other,"items"):
             raise ValueError("__add__ needs '%s' to have 'items' method" % repr(other))
-        for k,v in other.items():
-            new.set(k,v)
+        new.setMany(other.items())
         return new
     
     def __iadd__(self,other):
         if not hasattr(other,"items"):
             raise ValueError("__iadd__ needs '%s' to have 'items' method" % repr(other))
-        for k,v in other.items():
-            self.set(k,v)
+        self.setMany(other.items())
         return self
 
 
 
+class NameSpaceDelta(object):
+    """
+    The difference between two namespaces, see NameSpace.diff() and apply().
+    'added' and 'changed' map dotted keys to their new value (a leaf or a
+    whole sub-namespace), 'removed' lists the keys to remove.
+
+    In text a delta is a 'del key' line for each removal followed by the
+    usual 'key = repr(value)' lines.  A delta read back from text has
+    everything it sets in 'changed'.
+    """
+
+    def __init__(self):
+        self.added = dict()
+        self.changed = dict()
+        self.removed = []
+
+    def __len__(self):
+        return len(self.added) + len(self.changed) + len(self.removed)
+
+    def __repr__(self):
+        return "NameSpaceDelta(added=%r, changed=%r, removed=%r)" % \
+               (sorted(self.added),sorted(self.changed),sorted(self.removed))
+
+    def lines(self):
+        "Generate the lines of the text form, without line ends"
+        for key in sorted(self.removed):
+            yield "del %s" % key
+        for key in sorted(self.changed):
+            if isinstance(self.changed[key],NameSpace):
+                # a leaf that became a namespace has to go before its leaves are set
+                yield "del %s" % key
+        for values in (self.changed,self.added):
+            for key in sorted(values):
+                v = values[key]
+                if isinstance(v,NameSpace):
+                    for name,leaf in v.walk(key):
+                        yield "%s = %r" % (name,leaf)
+                else:
+                    yield "%s = %r" % (key,v)
+
+    def write(self,file):
+        "Write the text form of the delta to file, returns (bytesWritten, linesWritten)"
+        def writeLines(f):
+            nBytes = 0
+            nLines = 0
+            for line in self.lines():
+                line += os.linesep
+                f.write(line)
+                nBytes += len(line)
+                nLines += 1
+            return nBytes, nLines
+        return _replaceFile(file,writeLines)
+
+    def read(self,file,localFuncDict={}):
+        "Add the removals and settings in the text form in file"
+        p = Path(file)
+        self._readLines(p.lines(retain=False),localFuncDict,p)
+
+    def parse(self,text,localFuncDict={}):
+        "Add the removals and settings in the text form in text"
+        self._readLines(text.split('\n'),localFuncDict)
+
+    def _readLines(self,lines,funcs,filename=None):
+        settings = []
+        for line in lines:
+            s = line.strip()
+            if s.startswith('del ') and '=' not in s:
+                self.removed.append(s[4:].strip())
+                line = ''       # keeps the line numbers of errors right
+            settings.append(line)
+        for key,value in parseLines(settings,funcs,filename):
+            self.changed[key] = value
+
+
+class _FrozenDict(dict):
+    "A dict that refuses changes, the hdict a NameSpace keeps, see _thaw()"
+    def _readOnly(self,*args,**kw):
+        raise TypeError("the hdict a NameSpace keeps is read-only")
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readOnly
+
+def _thaw(d):
+    "A plain dict copy of a _FrozenDict and of those nested in it, other values are not copied"
+    return dict([(k,_thaw(v) if v.__class__ is _FrozenDict else v) for k,v in d.iteritems()])
+
+
+def _callbackKey(callback):
+    "What _Observers tells callbacks apart by, bound methods of eg. a list can't be hashed"
+    try:
+        hash(callback)
+    except TypeError:
+        return id(callback)
+    return callback
+
+
+class _Observers(object):
+    "The subscriptions of one namespace, see NameSpace.subscribe()"
+    __slots__ = ('exact','prefixed','order','serial')
+
+    def __init__(self):
+        self.exact = dict()         # key -> [callback]
+        self.prefixed = []          # [(key, callback)]
+        self.order = dict()         # _callbackKey -> [serial of its first subscription, subscriptions]
+        self.serial = 0
+
+    def __len__(self):
+        return len(self.order)
+
+    def add(self,key,callback,prefix):
+        if prefix:
+            self.prefixed.append((key,callback))
+        else:
+            self.exact.setdefault(key,[]).append(callback)
+        ck = _callbackKey(callback)
+        if ck not in self.order:
+            self.order[ck] = [self.serial,0]
+            self.serial += 1
+        self.order[ck][1] += 1
+
+    def remove(self,key,callback,prefix):
+        # the callback given may only be equal to the one stored, as bound methods are
+        try:
+            if prefix:
+                callback = self.prefixed.pop(self.prefixed.index((key,callback)))[1]
+            else:
+                callbacks = self.exact[key]
+                callback = callbacks.pop(callbacks.index(callback))
+                if not callbacks:
+                    del self.exact[key]
+        except (KeyError,ValueError):
+            raise ValueError("not subscribed: %r" % (key,))
+        ck = _callbackKey(callback)
+        self.order[ck][1] -= 1
+        if not self.order[ck][1]:
+            del self.order[ck]
+
+    def calls(self,keys):
+        "[(callback, sorted keys)] for the callbacks 'keys' concern, in subscription order"
+        found = dict()
+        for k in keys:
+            for callback in self.exact.get(k,()):
+                found.setdefault(_callbackKey(callback),(callback,set()))[1].add(k)
+            for p,callback in self.prefixed:
+                if not p or k == p or k.startswith(p) and k[len(p)] == '.':
+                    found.setdefault(_callbackKey(callback),(callback,set()))[1].add(k)
+        calls = [(self.order[ck][0],callback,sorted(changed)) for ck,(callback,changed) in found.items()]
+        calls.sort(key=lambda call: call[0])
+        return [(callback,changed) for n,callback,changed in calls]
+
+
+class NameSpaceView(Mapping):
+    """
+    Read-only live view of a NameSpace: flat, dotted keys -> leaves like
+    NameSpace.dict, or nested like NameSpace.hdict with sub-namespaces shown
+    as views.  Lookups see later changes, iterating while the namespace
+    changes fails like iterating a changing dict does.
+    """
+    __slots__ = ('_ns','_flat')
+
+    def __init__(self,ns,flat=True):
+        self._ns = ns
+        self._flat = flat
+
+    def _mapping(self):
+        if self._ns._lazy:
+            self._ns._loadLazy()
+        return self._ns._index if self._flat else self._ns._data
+
+    def __getitem__(self,key):
+        v = self._mapping()[key]
+        if self._ns._mayShare and v.__class__ not in _IMMUTABLE:
+            # a leaf or namespace still shared with a copy is copied first, like get() does
+            v = self._ns._own(splitKey(key)[1] if self._flat else (key,))
+        if not self._flat and isinstance(v,NameSpace):
+            return NameSpaceView(v,False)
+        return v
+
+    def __contains__(self,key):
+        return key in self._mapping()
+
+    def __iter__(self):
+        return iter(self._mapping())
+
+    def __len__(self):
+        return len(self._mapping())
+
+    def __repr__(self):
+        return "NameSpaceView(%r)" % (self._ns.dict if self._flat else self._ns.hdict)
+
+
  
 if __name__ == '__main__':
    
     from pprint import  pprint
+    from nsparse import ParseError
 
     builtin = NameSpace(
                    
@@ -230,6 +1254,10 @@ if __name__ == '__main__':
     print "read back"
     new.read("temp.ns")
     new.dump()
+    print "read back lazily, then get one key"
+    new = NameSpace()
+    new.read("temp.ns",lazy=True)
+    print new['lights.radius'], "still unread:", sorted(new._lazy)
 
     print "parse"
     new = NameSpace()
@@ -245,7 +1273,14 @@ if __name__ == '__main__':
     new.parse(text)
     print "parsed:"
     new.dump()
-    
+    new.parse('impedance.z = [1+3j, "ohm"]\nimpedance.table = {"50": (1e5-2.5e-3j)}')
+    print new['impedance.z'], new['impedance.table']
+    for bad in ['ok = 1\npair = Pair(a=1)','ok = 1\nkeys = {[1]: "a"}']:
+        try:
+            new.parse(bad,{'Pair': lambda a,b: (a,b)})
+        except ParseError, e:
+            print "ParseError:", e
+
     print "get sub-namespace 'object':"
     pprint(builtin['object'])
     
@@ -254,6 +1289,99 @@ if __name__ == '__main__':
     
     print "as hierarchial dict"
     pprint(builtin.hdict)
+
+    print "live views"
+    flat, tree = builtin.view, builtin.hview
+    builtin.set('lights.radius',2.0)
+    print flat['lights.radius'], tree['lights']['radius'], builtin.hdict['lights']['radius']
+    mine = builtin.hdict
+    mine['lights']['radius'] = -1.0
+    assert builtin.hdict['lights']['radius'] == 2.0 and type(builtin.hdict['lights']) is dict
+
+    print "change notification"
+    def changed(keys):
+        print "changed:", keys
+    builtin.subscribe('lights',changed,prefix=True)
+    builtin.set('lights.radius',3.0)
+    builtin.set('lights.radius',3.0)
+    with builtin.batch():
+        builtin.set('lights.radius',4.0)
+        builtin.set('lights.rtshad',False)
+        builtin.set('camera.persp','orthographic')
+    builtin.unsubscribe('lights',changed,prefix=True)
+    assert not [ns for ns in [builtin] + builtin._nodes.values() if ns._watched]
+
+    print "diff and apply"
+    working = builtin.dupe()
+    working.set('lights.radius',5.0)
+    working.delete('camera')
+    working.set('render.xres',640)
+    delta = builtin.diff(working)
+    print "\n".join(delta.lines())
+    patched = builtin.dupe()
+    patched.apply(delta)
+    print "patched == working:", patched.dict == working.dict
     
 
 
+
+    print "bulk get and set"
+    builtin.setMany([('lights.radius',6.0),('render.yres',480),('render.xres',720)])
+    print builtin.getMany(['lights.radius','render.xres','render.yres','nope'],None)
+    print builtin.containsMany(['lights','lights.radius','nope'])
+    copied = NameSpace()
+    copied.update(builtin)
+    assert copied.dict == builtin.dict and NameSpace(builtin).dict == builtin.dict
+    print "update from a namespace:", copied['render.xres'], copied['lights.radius']
+    heard = []
+    copied['lights'].subscribe('radius',heard.append)
+    copied.setMany([('lights.radius',8.0)])
+    copied.update({'lights.radius':9.0})
+    copied.set('lights.radius',10.0)
+    assert heard == [['radius']] * 3, heard
+    copied['lights'].unsubscribe('radius',heard.append)
+
+    print "dupes stay apart whichever way a leaf is reached"
+    key = 'render.orderchoices'
+    accessors = [
+        ("get",   lambda ns: ns.get(key)),
+        ("dict",  lambda ns: ns.dict[key]),
+        ("hdict", lambda ns: ns.hdict['render']['orderchoices']),
+        ("walk",  lambda ns: dict(ns.walk())[key]),
+        ("view",  lambda ns: ns.view[key]),
+        ("hview", lambda ns: ns.hview['render']['orderchoices']),
+    ]
+    for name,leaf in accessors:
+        for changed in range(4):
+            source = builtin.dupe()
+            copies = [source.dupe() for i in range(3)]
+            family = [source] + copies
+            before = list(source.get(key))
+            leaf(family[changed]).append('changed')
+            assert [ns.get(key) == before for ns in family] == [i != changed for i in range(4)], (name,changed)
+            assert [ns.dict[key] == ns.view[key] == ns.get(key) for ns in family] == [True] * 4, (name,changed)
+        print name, "ok"
+    chain = [builtin.dupe()]
+    chain[0].set('c.a.a',[1])
+    for i in range(11):
+        chain.append(chain[-1].dupe())
+    chain[2].setMany([('c.a.b',2),('lights.radius',7.0)])
+    chain[2].get('c.a.a').append(9)
+    print "chain:", chain[11].view['c.a.a'], chain[11].dict['c.a.a'], chain[11].get('c.a.a'), chain[2].get('c.a.a')
+
+    # unlike deepcopy(), a sub-namespace under two names is two in the copy once changed
+    aliased = builtin.dupe()
+    aliased.set('c.a',aliased.get('lights'))
+    deep, copy = deepcopy(aliased), aliased.dupe()
+    for ns in (aliased,deep,copy):
+        ns.set('lights.radius',3.0)
+    assert [ns['c.a.radius'] for ns in (aliased,deep,copy)] == [3.0,3.0,builtin['lights.radius']]
+
+    print "reading a dupe leaves what it shares shared"
+    source = builtin.dupe()
+    copy = source.dupe()
+    copy.write("temp.ns")
+    assert [copy._data[k] is source._data[k] for k in ('lights','render')] == [True,True]
+    copy.dict, copy.hdict, list(copy.walk())
+    assert [copy._data[k] is source._data[k] for k in ('lights','render')] == [True,False]
+    print "ok"
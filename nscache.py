@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+"""
+An in-process cache of parsed namespace files, so a template loaded by many
+editors in one session is parsed once and each load gets a copy of it.
+
+    cache = LoadCache()
+    ns = cache.load(UiNameSpace,"render.uins",UiNameSpace.LocalFuncTable)
+    cache.stats()       # {'hits': .., 'misses': .., 'diskHits': .., ...}
+
+UiNameSpace.load() only goes through a cache once one is set, with
+UiNameSpace.loadCache = LoadCache().
+
+Files are known by their content: a path whose modification time and size
+are unchanged since it was last seen keeps its md5, anything else is hashed
+again (path.read_md5), so touching or copying a file does not parse it again.
+A hit returns a dupe() of the cached namespace, see NameSpace.dupe().
+
+With 'onDisk' set the parsed result is also kept as a snapshot (see
+nssnapshot) next to the file, named after the file and its md5,
+eg. '.render.uins.<md5>.nsnap', and read from there by later sessions.
+"""
+
+import os
+from   copy                import  deepcopy
+from   collections         import  OrderedDict
+from   path                import  path as Path
+
+
+class LoadCache(object):
+    """
+    The last 'maxEntries' files loaded, by content.  Copies handed out by
+    dupe() stay listed in the namespace they were made from until they change
+    what they share, so after 'maxCopies' copies the cached namespace is
+    replaced by a deepcopy() of itself and the older copies are left to go.
+    Entries are kept apart by the functions of localFuncDict, leaving out the
+    '__builtins__' eval() adds to it; a dict holding anything else unhashable
+    is read every time and counted as 'bypassed'.
+    """
+
+    def __init__(self,maxEntries=32,maxCopies=32,onDisk=False):
+        self.maxEntries = maxEntries
+        self.maxCopies = maxCopies
+        self.onDisk = onDisk
+        self._entries = OrderedDict()   # (class, frozenset of funcs items, md5) -> [namespace, copies], oldest first
+        self._digests = dict()          # absolute path -> ((mtime, size), md5)
+        self.hits = self.misses = self.diskHits = self.hashed = self.bypassed = 0
+
+    def load(self,cls,file,localFuncDict={}):
+        "A namespace of class 'cls' read from 'file', see NameSpace.read()"
+        p = Path(file).abspath()
+        try:
+            # the functions themselves, an id() could be that of another dict by now
+            funcs = frozenset(item for item in localFuncDict.iteritems() if item[0] != '__builtins__')
+        except TypeError:
+            self.bypassed += 1
+            ns = cls()
+            ns.read(p,localFuncDict)
+            return ns
+        digest = self.digest(p)
+        key = (cls,funcs,digest)
+        entry = self._entries.pop(key,None)
+        if entry is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            ns = self._readDisk(cls,p,digest,localFuncDict) if self.onDisk else None
+            if ns is None:
+                ns = cls()
+                ns.read(p,localFuncDict)
+                if self.onDisk:
+                    self._writeDisk(ns,p,digest)
+            entry = [ns,0]
+            while len(self._entries) >= self.maxEntries:
+                self._entries.popitem(last=False)
+        self._entries[key] = entry
+        if entry[1] >= self.maxCopies:
+            entry[:] = [deepcopy(entry[0]),0]
+        entry[1] += 1
+        return entry[0].dupe()
+
+    def digest(self,file):
+        "The md5 of file, only read again when its modification time or size changed"
+        p = Path(file).abspath()
+        st = p.stat()
+        signature = (st.st_mtime,st.st_size)
+        known = self._digests.get(p)
+        if known is not None and known[0] == signature:
+            return known[1]
+        self.hashed += 1
+        digest = p.read_md5()
+        if len(self._digests) >= 10 * self.maxEntries:
+            self._digests.clear()
+        self._digests[p] = (signature,digest)
+        return digest
+
+    def clear(self):
+        "Forget every file, the statistics are kept"
+        self._entries.clear()
+        self._digests.clear()
+
+    def stats(self):
+        return dict(hits=self.hits,misses=self.misses,diskHits=self.diskHits,
+                    hashed=self.hashed,bypassed=self.bypassed,entries=len(self._entries))
+
+    # --- on disk -------------------------------------------------------------
+
+    @staticmethod
+    def snapshotPath(file,digest):
+        p = Path(file)
+        return p.dirname() / (".%s.%s.nsnap" % (p.basename(),digest.encode('hex')))
+
+    def _readDisk(self,cls,p,digest,localFuncDict):
+        import nssnapshot
+        snap = self.snapshotPath(p,digest)
+        if not snap.exists():
+            return None
+        try:
+            ns = cls.fromSnapshot(snap,localFuncDict)
+        except (nssnapshot.SnapshotError,EnvironmentError):
+            return None
+        self.diskHits += 1
+        return ns
+
+    def _writeDisk(self,ns,p,digest):
+        """
+        Write the snapshot, replacing older ones of the same file; a directory
+        we cannot write to, or a value snapshots do not hold, is no error
+        """
+        import nssnapshot
+        snap = self.snapshotPath(p,digest)
+        try:
+            ns.writeSnapshot(snap)
+            for old in p.dirname().glob(".%s.*.nsnap" % p.basename()):
+                if old != snap:
+                    old.remove()
+        except (nssnapshot.SnapshotError,EnvironmentError):
+            pass
+
+
+# --- TEST ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    import time
+    import tempfile
+    from   uinamespace         import  UiNameSpace, UiColumns
+
+    tmpDir = Path(tempfile.mkdtemp())
+    try:
+        src = tmpDir/"render.uins"
+        src.write_lines(["render.xres = Int(value=640,min=1,max=4096)",
+                         "render.order = String(value='spiral',choices=['horizontal','spiral'])",
+                         "light.key.gain = Float(value=0.75,min=0.0)"])
+        cache = LoadCache(onDisk=True)
+        a = cache.load(UiNameSpace,src,UiNameSpace.LocalFuncTable)
+        b = cache.load(UiNameSpace,src,UiNameSpace.LocalFuncTable)
+        a['render.xres'].setValue(1024)
+        a.set('light.key.gain',UiNameSpace.LocalFuncTable['Float'](value=2.0))
+        assert b['render.xres'].value == 640 and b['light.key.gain'].value == 0.75
+        print cache.stats()
+
+        copy = tmpDir/"copy.uins"
+        src.copy(copy)
+        c = cache.load(UiNameSpace,copy,UiNameSpace.LocalFuncTable)
+        assert c.dict == b.dict and cache.hits == 2
+        os.utime(src,(time.time()+10,time.time()+10))
+        cache.load(UiNameSpace,src,UiNameSpace.LocalFuncTable)
+        assert cache.hits == 3 and cache.hashed == 3
+
+        src.write_lines(["render.xres = Int(value=320)"],append=True)
+        d = cache.load(UiNameSpace,src,UiNameSpace.LocalFuncTable)
+        assert d['render.xres'].value == 320 and cache.misses == 2
+        print cache.stats()
+
+        # keyed by the functions a dict holds, not by the dict
+        funcs = dict(UiNameSpace.LocalFuncTable)
+        cache.load(UiNameSpace,src,funcs)
+        assert cache.hits == 4
+        funcs['Int'] = UiNameSpace.LocalFuncTable['Float']
+        assert cache.load(UiNameSpace,src,funcs)['render.xres'].NAME == 'Float' and cache.misses == 3
+        # the __builtins__ an eval() leaves behind does not keep it out of the cache
+        funcs = dict(UiNameSpace.LocalFuncTable)
+        eval("1",funcs)
+        cache.load(UiNameSpace,src,funcs)
+        assert '__builtins__' in funcs and cache.hits == 5 and cache.bypassed == 0
+        funcs['Junk'] = []
+        cache.load(UiNameSpace,src,funcs)
+        assert cache.hits == 5 and cache.misses == 3 and cache.bypassed == 1
+
+        cache = LoadCache(maxCopies=2)
+        copies = [cache.load(UiNameSpace,src,UiNameSpace.LocalFuncTable) for i in range(5)]
+        copies[0]['render.xres'].setValue(1)
+        assert [c['render.xres'].value for c in copies] == [1,320,320,320,320]
+
+        cache = LoadCache(onDisk=True)
+        e = cache.load(UiNameSpace,src,UiNameSpace.LocalFuncTable)
+        assert e.dict == d.dict and cache.diskHits == 1
+        print sorted([f.basename() for f in tmpDir.files(".*.nsnap")])
+        print cache.stats()
+
+        # load, change it every way there is, load again: still the file
+        assert UiNameSpace.loadCache is None
+        UiNameSpace.loadCache = LoadCache()
+        try:
+            for how in ['columns','view','hview','walk','setValue']:
+                f = UiNameSpace.load(src)
+                if how == 'columns':
+                    UiColumns(f)['Int'].values[0] = 1
+                elif how == 'view':
+                    f.view['render.xres'].setValue(1)
+                elif how == 'hview':
+                    f.hview['render']['xres'].setValue(1)
+                elif how == 'walk':
+                    dict(f.walk())['render.xres'].setValue(1)
+                else:
+                    f['render.xres'].setValue(1)
+                assert f['render.xres'].value == 1, how
+                assert UiNameSpace.load(src)['render.xres'].value == 320, how
+        finally:
+            UiNameSpace.loadCache = None
+        print "reloads pristine"
+    finally:
+        tmpDir.rmtree()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+
+"""
+An undo journal for namespace edits: each step keeps only (key, old, new)
+for the keys it changed, so undo() and redo() cost as much as the keys
+changed rather than a dupe() of the whole namespace per step.
+
+    journal = UndoJournal(uiNS)
+    journal.updateValue('light.key.gain',0.5)   # instead of uiNS.updateValue()
+    journal.set('render.xres',xresItem)         # instead of uiNS.set()
+    with journal.step():                        # several edits, one undo step
+        ...
+    journal.undo()
+    journal.redo()
+
+Edits of keys the last step already changed, each within 'coalesceTime'
+seconds of the one before, join that step, so a rubber slider drag is
+undone in one go.  endStep() closes the step early, eg. on mouse release.
+"""
+
+import time
+from   copy                import  copy
+from   collections         import  deque, OrderedDict
+from   contextlib          import  contextmanager
+
+VALUE, LEAF = 0, 1      # what a journal entry replaced: an item's value or the leaf itself
+
+_MISSING = object()
+
+
+class UndoJournal(object):
+    """
+    The last 'maxSteps' steps of edits made through it to namespace 'ns',
+    and at most 'maxEntries' (key, old, new) entries over all of them, the
+    oldest steps are forgotten first.  A step is an OrderedDict
+    {(key, kind): [old, new]}, the first old and the last new value of key,
+    undone in the reverse of the order the keys were first edited.
+    Edits made to 'ns' directly are not journaled.
+    """
+
+    def __init__(self,ns,maxSteps=200,maxEntries=100000,coalesceTime=0.5):
+        self.ns = ns
+        self.maxSteps = maxSteps
+        self.maxEntries = maxEntries
+        self.coalesceTime = coalesceTime
+        self.clock = time.time
+        self._undo = deque()        # steps, oldest first
+        self._redo = []             # steps undone, most recent last
+        self._entries = 0           # entries in _undo
+        self._open = None           # the step edits may still join
+        self._lastEdit = 0.0
+        self._stepDepth = 0
+
+    # --- edits ---------------------------------------------------------------
+
+    def updateValue(self,key,value):
+        "ns.updateValue(key,value), journaled"
+        old = self.ns.get(key).value
+        self._record(key,VALUE,copy(old) if isinstance(old,list) else old,value)
+        self.ns.updateValue(key,value)
+
+    def set(self,key,value):
+        "ns.set(key,value), journaled"
+        self._record(key,LEAF,self._leaf(key),value)
+        self.ns.set(key,value)
+
+    def delete(self,key):
+        "ns.delete(key), journaled"
+        self._record(key,LEAF,self._leaf(key),_MISSING)
+        self.ns.delete(key)
+
+    def _leaf(self,key):
+        return self.ns.get(key) if key in self.ns else _MISSING
+
+    def _record(self,key,kind,old,new):
+        now = self.clock()
+        step = self._open
+        if step is not None and not self._stepDepth:
+            if (key,kind) not in step or now - self._lastEdit > self.coalesceTime:
+                step = None
+        if step is None:
+            step = self._open = OrderedDict()
+            self._push(step)
+        self._lastEdit = now
+        entry = step.get((key,kind))
+        if entry is None:
+            step[(key,kind)] = [old,new]
+            self._entries += 1
+            self._trim()
+        else:
+            entry[1] = new
+
+    def _push(self,step):
+        self._redo = []
+        self._undo.append(step)
+        self._trim()
+
+    def _trim(self):
+        while len(self._undo) > self.maxSteps or (self._entries > self.maxEntries and len(self._undo) > 1):
+            old = self._undo.popleft()
+            self._entries -= len(old)
+            if old is self._open:
+                self._open = None
+
+    # --- steps ---------------------------------------------------------------
+
+    def beginStep(self):
+        "Make every edit until the matching endStep() a single step"
+        if not self._stepDepth:
+            self._open = OrderedDict()
+            self._push(self._open)
+        self._stepDepth += 1
+
+    def endStep(self):
+        "Close the step, later edits start a new one"
+        if self._stepDepth:
+            self._stepDepth -= 1
+            if self._stepDepth:
+                return
+        if self._open is not None and not self._open and self._undo and self._undo[-1] is self._open:
+            self._undo.pop()
+        self._open = None
+
+    @contextmanager
+    def step(self):
+        "with journal.step(): ... calls beginStep() and endStep() around the block"
+        self.beginStep()
+        try:
+            yield self
+        finally:
+            self.endStep()
+
+    # --- undo and redo -------------------------------------------------------
+
+    def canUndo(self):
+        return bool(self._undo)
+
+    def canRedo(self):
+        return bool(self._redo)
+
+    def undo(self):
+        "Put back the old values of the last step, False if there is none"
+        self._closeStep("undo")
+        if not self._undo:
+            return False
+        step = self._undo.pop()
+        self._entries -= len(step)
+        self._apply(reversed(step.items()),0)
+        self._redo.append(step)
+        return True
+
+    def redo(self):
+        "Make the last step undone again, False if there is none"
+        self._closeStep("redo")
+        if not self._redo:
+            return False
+        step = self._redo.pop()
+        self._apply(step.items(),1)
+        self._undo.append(step)
+        self._entries += len(step)
+        return True
+
+    def _closeStep(self,what):
+        "Close the step edits may still join, ValueError inside beginStep() ... endStep()"
+        if self._stepDepth:
+            raise ValueError("%s() inside a step" % what)
+        self.endStep()
+
+    def _apply(self,entries,which):
+        ns = self.ns
+        with ns.batch():
+            for (key,kind),entry in entries:
+                value = entry[which]
+                if kind == VALUE:
+                    ns.updateValue(key,copy(value) if isinstance(value,list) else value)
+                elif value is _MISSING:
+                    if key in ns:
+                        ns.delete(key)
+                else:
+                    ns.set(key,value)
+
+    def clear(self):
+        "Forget every step"
+        self._undo.clear()
+        self._redo = []
+        self._entries = 0
+        self._open = None
+        self._stepDepth = 0
+
+    def stats(self):
+        return dict(steps=len(self._undo),redoSteps=len(self._redo),entries=self._entries)
+
+
+# --- TEST ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    from   uinamespace         import  UiNameSpace
+
+    uiNS = UiNameSpace()
+    uiNS.parse("""
+    render.xres     = Int(value=640,min=1,max=4096)
+    render.order    = String(value='spiral',choices=['horizontal','spiral'])
+    light.key.gain  = Float(value=1.0,min=0.0)
+    light.key.color = Vector(value=[1.0,1.0,1.0])
+    """)
+    changed = []
+    uiNS.subscribe('',changed.append,prefix=True)
+    now = [0.0]
+    journal = UndoJournal(uiNS,coalesceTime=0.5)
+    journal.clock = lambda: now[0]
+
+    # a rubber slider drag: one step
+    for i in range(100):
+        now[0] += 0.02
+        journal.updateValue('light.key.gain',1.0 + i / 100.0)
+    now[0] += 1.0
+    journal.updateValue('render.xres',1024)
+    with journal.step():
+        journal.updateValue('light.key.color',[0.5,0.5,0.5])
+        journal.set('render.order',UiNameSpace.LocalFuncTable['String'](value='horizontal'))
+        journal.set('render.yres',UiNameSpace.LocalFuncTable['Int'](value=480))
+    print journal.stats()
+    assert journal.stats() == dict(steps=3,redoSteps=0,entries=5)
+
+    del changed[:]
+    assert journal.undo()
+    assert changed == [['light.key.color','render.order','render.yres']]
+    assert 'render.yres' not in uiNS and uiNS['render.order'].value == 'spiral'
+    assert uiNS['light.key.color'].value == [1.0,1.0,1.0]
+    assert journal.undo() and uiNS['render.xres'].value == 640
+    assert journal.undo() and uiNS['light.key.gain'].value == 1.0
+    assert not journal.undo()
+    assert journal.redo() and uiNS['light.key.gain'].value == 1.99
+    assert journal.redo() and journal.redo() and uiNS['render.yres'].value == 480
+    assert not journal.redo()
+
+    # a new edit drops what could be redone
+    journal.undo()
+    journal.delete('render.xres')
+    assert not journal.canRedo() and 'render.xres' not in uiNS
+    journal.undo()
+    assert uiNS['render.xres'].value == 1024
+
+    journal = UndoJournal(uiNS,maxSteps=10)
+    for i in range(50):
+        journal.endStep()
+        journal.updateValue('render.xres',i)
+    assert journal.stats()['steps'] == 10
+    while journal.undo():
+        pass
+    assert uiNS['render.xres'].value == 39
+
+    # undo inside a step is refused and leaves the step open
+    journal = UndoJournal(uiNS)
+    with journal.step():
+        journal.updateValue('render.xres',1)
+        try:
+            journal.undo()
+        except ValueError:
+            pass
+        else:
+            assert False, "undo() inside a step"
+        journal.updateValue('light.key.gain',3.0)
+    assert journal.stats() == dict(steps=1,redoSteps=0,entries=2)
+    assert journal.undo() and uiNS['render.xres'].value == 39
+    print "journal ok"
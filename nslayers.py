@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+"""
+Layered namespaces: a local, an inherited and a default namespace stacked
+so each key resolves to the value of the first layer that has it, with the
+rank it came from (the INHERITANCE_RANK of the edit widgets).
+
+    layers = LayeredNameSpace(local,inherited,defaults)
+    layers['light.key.gain']            # the winning value
+    layers.rank('light.key.gain')       # LOCAL, INHERIT or DEFAULT
+    layers.setRank('light.key.gain',INHERIT)
+"""
+
+from   copy                import  deepcopy
+from   namespace           import  NameSpace
+
+LOCAL, INHERIT, DEFAULT = 0, 1, 2
+RANK_NAMES = {LOCAL: "Local", INHERIT: "Inherit", DEFAULT: "Default"}
+
+_MISSING = object()
+
+
+class LayeredNameSpace(object):
+    """
+    Resolves dotted keys through 'layers', [local, inherited, default].
+    Each resolved (value, rank) is kept in '_resolved' until the layers say
+    (through NameSpace.subscribe()) that a leaf under that key changed, so a
+    lookup is one dictionary probe however many layers there are.
+    Keys set to DEFAULT with setRank() skip the inherited layer.
+    Like subscribe(), values changed in place are only seen if they are set
+    again or reported with updateValue().
+    """
+
+    def __init__(self,local=None,inherited=None,default=None):
+        given = [ns for ns in (local,inherited,default) if ns is not None]
+        cls = given[0].__class__ if given else NameSpace
+        self.layers = [ns if ns is not None else cls() for ns in (local,inherited,default)]
+        self._resolved = dict()     # key -> (value, rank)
+        self._pinned = set()        # keys resolved past the inherited layer
+        self._callbacks = []
+        for ns in self.layers:
+            callback = self._changed
+            ns.subscribe('',callback,prefix=True)
+            self._callbacks.append((ns,callback))
+
+    def close(self):
+        "Stop listening to the layers"
+        for ns,callback in self._callbacks:
+            ns.unsubscribe('',callback,prefix=True)
+        self._callbacks = []
+        self._resolved.clear()
+
+    @property
+    def local(self):
+        return self.layers[LOCAL]
+
+    def _changed(self,keys):
+        pop = self._resolved.pop
+        for key in keys:
+            pop(key,None)
+
+    def resolve(self,key):
+        "(value, rank) of the layer key resolves to, KeyError if no layer has it"
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
+        for rank,ns in enumerate(self.layers):
+            if rank == INHERIT and key in self._pinned:
+                continue
+            try:
+                value = ns.get(key)
+            except (KeyError,ValueError):
+                continue
+            if isinstance(value,NameSpace):
+                raise ValueError("'%s' is a namespace, layers resolve leaves" % key)
+            self._resolved[key] = resolved = (value,rank)
+            return resolved
+        raise KeyError, key
+
+    def get(self,key,default=_MISSING):
+        try:
+            return self.resolve(key)[0]
+        except KeyError:
+            if default is _MISSING:
+                raise
+            return default
+
+    __getitem__ = get
+
+    def rank(self,key):
+        "LOCAL, INHERIT or DEFAULT, the layer key resolves to"
+        return self.resolve(key)[1]
+
+    def __contains__(self,key):
+        try:
+            self.resolve(key)
+        except (KeyError,ValueError):
+            return False
+        return True
+
+    def keys(self):
+        "Every leaf key of any layer"
+        keys = set()
+        for ns in self.layers:
+            keys.update(ns.view)
+        return sorted(keys)
+
+    def resolveAll(self):
+        "{key: (value, rank)} for every key, worked out a layer at a time rather than a key at a time"
+        resolved = dict()
+        for rank in (DEFAULT,INHERIT,LOCAL):
+            ns = self.layers[rank]
+            ns = ns.dict if not ns._mayShare else dict([(k,ns.get(k)) for k in ns.view])
+            if rank == INHERIT and self._pinned:
+                ns = dict([(k,v) for k,v in ns.iteritems() if k not in self._pinned])
+            resolved.update(zip(ns.iterkeys(),zip(ns.itervalues(),[rank] * len(ns))))
+        self._resolved.update(resolved)
+        return resolved
+
+    def set(self,key,value,rank=LOCAL):
+        "Set key in the layer of 'rank'"
+        self.layers[rank].set(key,value)
+
+    def setRank(self,key,rank):
+        """
+        Make key resolve to 'rank': LOCAL gives the local layer a copy of the
+        value it resolves to now, INHERIT removes it from the local layer and
+        DEFAULT removes it there and skips the inherited layer for it
+        """
+        if rank not in RANK_NAMES:
+            raise ValueError("rank not in %s: '%s'" % (sorted(RANK_NAMES),rank))
+        if rank == LOCAL:
+            value, current = self.resolve(key)
+            if current != LOCAL:
+                self.local.set(key,deepcopy(value))
+            return
+        if key in self.local:
+            self.local.delete(key)
+        if rank == DEFAULT:
+            self._pinned.add(key)
+        else:
+            self._pinned.discard(key)
+        self._resolved.pop(key,None)
+
+
+# --- TEST ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    from   uinamespace         import  UiNameSpace
+
+    defaults = UiNameSpace()
+    defaults.parse("""
+    render.xres     = Int(value=640,min=1,max=4096)
+    render.yres     = Int(value=480,min=1,max=4096)
+    light.key.gain  = Float(value=1.0,min=0.0)
+    """)
+    inherited = UiNameSpace()
+    inherited.parse("""
+    render.xres     = Int(value=1024,min=1,max=4096)
+    light.key.gain  = Float(value=0.5,min=0.0)
+    """)
+    local = UiNameSpace()
+    local.parse("""
+    light.key.gain  = Float(value=0.75,min=0.0)
+    """)
+    layers = LayeredNameSpace(local,inherited,defaults)
+    for key in layers.keys():
+        print key, layers[key].value, RANK_NAMES[layers.rank(key)]
+    assert layers.resolveAll() == dict([(k,layers.resolve(k)) for k in layers.keys()])
+
+    inherited.set('render.yres',UiNameSpace.LocalFuncTable['Int'](value=720))
+    assert layers.rank('render.yres') == INHERIT and layers['render.yres'].value == 720
+    layers.setRank('light.key.gain',INHERIT)
+    assert layers['light.key.gain'].value == 0.5 and 'light.key.gain' not in local
+    layers.setRank('render.xres',DEFAULT)
+    assert layers['render.xres'].value == 640 and layers.rank('render.xres') == DEFAULT
+    layers.setRank('render.xres',LOCAL)
+    layers['render.xres'].setValue(2048)
+    assert local['render.xres'].value == 2048 and defaults['render.xres'].value == 640
+    with inherited.batch():
+        inherited.delete('render')
+    assert layers.rank('render.yres') == DEFAULT and layers['render.yres'].value == 480
+    for key in layers.keys():
+        print key, layers[key].value, RANK_NAMES[layers.rank(key)]
+    layers.close()
+    assert not [ns for ns in layers.layers if ns._watched]
+    print "layers ok"
@@ -0,0 +1,433 @@
+#!/usr/bin/env python
+
+"""
+Parser for the right hand sides of NameSpace text files (.ns and .uins).
+
+Replaces eval() with a small parser for the literal grammar the files use:
+
+    value :=  number | string | True | False | None
+           |  '(' [values] ')' | '[' [values] ']' | '{' [value ':' value, ...] '}'
+           |  Name '(' [values] [name=value, ...] ')'
+
+where Name has to be one of the callables in the function table passed in,
+eg. UiNameSpace.LocalFuncTable.  Values are built directly, no code is compiled
+or run, and errors are reported as a ParseError with a line and column.
+"""
+
+import re
+
+
+class ParseError(SyntaxError):
+    "A value could not be parsed, 'lineno' and 'offset' (column, 1 based) say where"
+    def __init__(self,msg,lineno=None,offset=None,text=None,filename=None):
+        SyntaxError.__init__(self,msg,(filename,lineno,offset,text))
+    def __str__(self):
+        where = []
+        if self.filename: where.append(str(self.filename))
+        if self.lineno:   where.append("line %d" % self.lineno)
+        if self.offset:   where.append("column %d" % self.offset)
+        if where:
+            return "%s (%s)" % (self.msg, ", ".join(where))
+        return self.msg
+
+
+_REAL   = r"(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+_NUMBER = r"[-+]?(?:0[xX][0-9a-fA-F]+|%s(?:[-+]%s[jJ])?)[lLjJ]?" % (_REAL,_REAL)   # 1+3j is one token
+_STRING = r"""[uUbB]?[rR]?(?:'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*")"""
+_TOKEN  = re.compile(r"\s*(%s|%s|[A-Za-z_]\w*|[()\[\]{},:=]|\S)" % (_NUMBER,_STRING))
+_STRINGTOKEN = re.compile(r"%s$" % _STRING)
+_UNCOMMENTED = re.compile(r"""[^'"#]*(?:%s[^'"#]*)*""" % _STRING)   # stops at a '#' outside strings
+
+_CONSTANTS = {'True': True, 'False': False, 'None': None}
+_NUMSTART  = frozenset('0123456789.-+')
+_NAMESTART = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_')
+
+# Frame kinds, and the token that closes each
+_TUPLE, _LIST, _DICT, _CALL = range(4)
+_OPEN   = {'(': _TUPLE, '[': _LIST, '{': _DICT}
+_CLOSER = {_TUPLE: ')', _LIST: ']', _DICT: '}', _CALL: ')'}
+
+
+class _Error(Exception):
+    "Internal: a message and the index of the offending token"
+    def __init__(self,msg,index):
+        Exception.__init__(self,msg)
+        self.index = index
+
+
+def _number(tok):
+    last = tok[-1]
+    if last in 'lL':
+        return long(tok[:-1],0)
+    if last in 'jJ':
+        return complex(tok)
+    if 'x' in tok or 'X' in tok:
+        return int(tok,16)
+    return _scalarNumber(tok)
+
+def _scalarNumber(tok):
+    "Plain int or float, a leading 0 making an int octal (may raise ValueError)"
+    if '.' in tok or 'e' in tok or 'E' in tok:
+        return float(tok)
+    return int(tok,0)
+
+def _string(tok):
+    quote = tok[-1]
+    prefix = tok[:tok.index(quote)].lower()
+    body = tok[len(prefix)+1:-1]
+    if 'r' in prefix:
+        return unicode(body) if 'u' in prefix else body
+    if 'u' in prefix:
+        return body.decode('unicode_escape')
+    if '\\' in body:
+        return body.decode('string_escape')
+    return body
+
+def _stripComment(text):
+    "'text' without a trailing '#' comment"
+    end = _UNCOMMENTED.match(text).end()
+    if end < len(text) and text[end] == '#':
+        return text[:end]
+    return text
+
+# Cheaper tokenizer for what repr() writes: single quoted strings without
+# escapes.  Anything it splits differently from _TOKEN fails to parse and is
+# retried with _TOKEN, so it never changes a result.
+_NOTFLAT   = re.compile(r"[^-+0-9.eE, ]")
+_FLATCLOSE = {'[': ']', '(': ')'}
+_FASTTOKEN = re.compile(r"[()\[\]{},:=]|'[^'\\\n]*'|[^()\[\]{},:=\s'\"]+|\S")
+
+
+def _parseTokens(toks,funcs):
+    """
+    Build the value a token list describes.  Brackets and calls push a frame
+    [kind, items, keywords, funcName, pendingKeyword, commas, openIndex];
+    dict frames keep their keys and values alternating in 'items'.
+    """
+    n = len(toks)
+    if n == 0:
+        raise _Error("missing value",0)
+    stack = []
+    frame = None
+    result = None
+    expectValue = True
+    i = 0
+    while i < n:
+        tok = toks[i]
+        c = tok[0]
+        if expectValue:
+            if c in _NUMSTART and (len(tok) > 1 or c not in '-+'):
+                try:
+                    value = _number(tok)
+                except ValueError:
+                    raise _Error("bad number '%s'" % tok,i)
+            elif c == "'" or c == '"':
+                if len(tok) < 2 or tok[-1] != c:
+                    raise _Error("unterminated string",i)
+                value = _string(tok)
+                while i+1 < n and _STRINGTOKEN.match(toks[i+1]):
+                    i += 1
+                    value += _string(toks[i])
+            elif c in _NAMESTART:
+                if tok in _CONSTANTS:
+                    value = _CONSTANTS[tok]
+                elif _STRINGTOKEN.match(tok):
+                    value = _string(tok)
+                    while i+1 < n and _STRINGTOKEN.match(toks[i+1]):
+                        i += 1
+                        value += _string(toks[i])
+                elif frame is not None and frame[0] == _CALL and i+1 < n and toks[i+1] == '=':
+                    if tok in frame[2]:
+                        raise _Error("keyword argument '%s' repeated" % tok,i)
+                    frame[4] = tok
+                    i += 2
+                    continue
+                elif tok in funcs:
+                    if i+1 >= n or toks[i+1] != '(':
+                        raise _Error("expected '(' after '%s'" % tok,i+1)
+                    stack.append(frame)
+                    frame = [_CALL,[],{},tok,None,0,i]
+                    i += 2
+                    continue
+                else:
+                    raise _Error("unknown name '%s'" % tok,i)
+            elif c in _OPEN and len(tok) == 1:
+                stack.append(frame)
+                frame = [_OPEN[c],[],None,None,None,0,i]
+                i += 1
+                continue
+            elif frame is not None and tok == _CLOSER[frame[0]] and frame[4] is None \
+                    and not (frame[0] == _DICT and len(frame[1]) % 2) \
+                    and (toks[i-1] == ',' or i-1 == frame[6] + (frame[0] == _CALL)):
+                # empty brackets, or a trailing comma
+                value = _close(frame,funcs)
+                frame = stack.pop()
+            else:
+                raise _Error("unexpected '%s'" % tok,i)
+        else:
+            if frame is None:
+                raise _Error("unexpected '%s' after value" % tok,i)
+            kind = frame[0]
+            keyRead = kind == _DICT and len(frame[1]) % 2 == 1
+            if keyRead:
+                if tok != ':':
+                    raise _Error("expected ':', got '%s'" % tok,i)
+                expectValue = True
+                i += 1
+                continue
+            if tok == ',':
+                frame[5] += 1
+                expectValue = True
+                i += 1
+                continue
+            if tok != _CLOSER[kind]:
+                raise _Error("expected ',' or '%s', got '%s'" % (_CLOSER[kind],tok),i)
+            value = _close(frame,funcs)
+            frame = stack.pop()
+        # hand the finished value to the enclosing frame
+        if frame is None:
+            result = value
+        elif frame[4] is not None:
+            frame[2][frame[4]] = value
+            frame[4] = None
+        elif frame[0] == _CALL and frame[2]:
+            raise _Error("positional argument after keyword arguments",i)
+        else:
+            frame[1].append(value)
+        expectValue = False
+        i += 1
+    if frame is not None:
+        raise _Error("'%s' is never closed" % toks[frame[6]+(frame[0] == _CALL)],frame[6]+(frame[0] == _CALL))
+    if expectValue:
+        raise _Error("value expected but the line ended",n)
+    return result
+
+def _close(frame,funcs):
+    kind, items, kw, func, key, commas, start = frame
+    if kind == _LIST:
+        return items
+    if kind == _TUPLE:
+        if len(items) == 1 and commas == 0:
+            return items[0]
+        return tuple(items)
+    if kind == _DICT:
+        try:
+            return dict(zip(items[0::2],items[1::2]))
+        except TypeError, desc:
+            raise _Error("bad dict key: %s" % desc,start)
+    try:
+        return funcs[func](*items,**kw)
+    except Exception, desc:
+        raise _Error("%s(...) failed: %s" % (func,desc),start)
+
+
+# A call whose arguments are all keyword=scalar or keyword=flat list, eg.
+#   Float(value=0.5, min=0, max=1, hint='gain')
+# String literals are swapped for \0 before matching so they can hold anything.
+_FLATARG  = r"\s*[A-Za-z_]\w*\s*=\s*(?:\[[^\[\](){}]*\]|\([^\[\](){}]*\)|[^\[\](){},=]+)\s*"
+_FLATARGS = re.compile(r"(?:%s,)*(?:%s)?,?\s*$" % (_FLATARG,_FLATARG))
+_KEYVALUE = re.compile(r"\s*([A-Za-z_]\w*)\s*=\s*(\[[^\[\]]*\]|\([^()]*\)|[^,]+)")
+
+def _flatScalar(text,strings):
+    text = text.strip()
+    if text == '\0':
+        return strings.pop()
+    if text in _CONSTANTS:
+        return _CONSTANTS[text]
+    return _scalarNumber(text)
+
+def _flatCall(s,funcs):
+    "Build a flat call without the general parser, None if 's' is not one"
+    p = s.find('(')
+    name = s[:p].rstrip()
+    if p < 0 or s[-1] != ')' or name not in funcs:
+        return None
+    pieces = s[p+1:-1].split("'")
+    if len(pieces) % 2 == 0:
+        return None
+    body = '\0'.join(pieces[0::2])
+    if not _FLATARGS.match(body):
+        return None
+    strings = pieces[-2::-2]    # reversed, so pop() takes them in order
+    kw = dict()
+    try:
+        for k,v in _KEYVALUE.findall(body):
+            if k in kw:
+                return None     # the general parser reports it
+            c = v[0]
+            if c == '[' or c == '(':
+                inner = v[1:-1].strip()
+                if inner.endswith(','):
+                    inner = inner[:-1]
+                items = [_flatScalar(x,strings) for x in inner.split(',')] if inner else []
+                if c == '(':
+                    if len(items) == 1 and not v[1:-1].strip().endswith(','):
+                        items = items[0]
+                    else:
+                        items = tuple(items)
+                kw[k] = items
+            else:
+                kw[k] = _flatScalar(v,strings)
+    except (ValueError,IndexError):
+        return None
+    try:
+        return funcs[name](**kw)
+    except Exception, desc:
+        raise _Error("%s(...) failed: %s" % (name,desc),0)
+
+
+def parseValue(text,funcs={},lineno=None,filename=None):
+    "Build the value written as 'text', calls may use the callables in 'funcs'"
+    if '#' in text:
+        text = _stripComment(text)
+    s = text.strip()
+    if s:
+        # Plain scalars and flat number lists are most of a typical file:
+        # build those without tokenizing
+        c = s[0]
+        if c in _NUMSTART:
+            try:
+                return _scalarNumber(s)
+            except ValueError:
+                pass
+        elif c == "'":
+            if s[-1] == "'" and len(s) > 1 and "'" not in s[1:-1] and '\\' not in s:
+                return s[1:-1]
+        elif c == '[' or c == '(':
+            inner = s[1:-1].strip()
+            if s[-1] == _FLATCLOSE[c] and inner and inner[-1] != ',' and not _NOTFLAT.search(inner):
+                try:
+                    items = [_scalarNumber(x) for x in inner.split(',')]
+                except ValueError:
+                    pass
+                else:
+                    if c == '[':
+                        return items
+                    if len(items) > 1:
+                        return tuple(items)
+        elif s in _CONSTANTS:
+            return _CONSTANTS[s]
+        elif c in _NAMESTART and '"' not in s and '\\' not in s:
+            try:
+                value = _flatCall(s,funcs)
+            except _Error, e:
+                raise _parseError(e,text,lineno,filename)
+            if value is not None:
+                return value
+    exact = '"' in s or '\\' in s
+    try:
+        if exact:
+            return _parseTokens(_TOKEN.findall(s),funcs)
+        return _parseTokens(_FASTTOKEN.findall(s),funcs)
+    except _Error, e:
+        if not exact:
+            try:
+                return _parseTokens(_TOKEN.findall(s),funcs)
+            except _Error, e:
+                pass
+        raise _parseError(e,text,lineno,filename)
+
+def _parseError(e,text,lineno,filename):
+    "The ParseError for _Error 'e', at the column of the token it names in 'text'"
+    column = len(text.rstrip()) + 1
+    for j,m in enumerate(_TOKEN.finditer(text)):
+        if j == e.index:
+            column = m.start(1) + 1
+            break
+    return ParseError(str(e),lineno,column,text,filename)
+
+def parseLines(lines,funcs={},filename=None,start=0):
+    """
+    Generate (key, value) for every 'key = value' line, skipping blank lines
+    and '#' comments.  Line numbers in errors count every line given, the
+    first being line start+1.
+    """
+    for lineno,line in enumerate(lines,start):
+        s = line.lstrip()
+        if not s or s[0] == '#':
+            continue
+        key, eq, rhs = s.partition('=')
+        if not eq:
+            raise ParseError("expected 'key = value'",lineno+1,len(line)-len(s)+1,line,filename)
+        try:
+            value = parseValue(rhs,funcs,lineno+1,filename)
+        except ParseError, e:
+            # columns count from the start of the whole line
+            raise ParseError(e.msg,lineno+1,e.offset+len(line)-len(rhs),line,filename)
+        yield key.rstrip(), value
+
+
+# a run of consecutive lines that start with the same top level name,
+# followed by the same '.' or '='
+_RUN = re.compile(r"^([ \t]*[^\s.=#][^.=\n]*)([.=])[^\n]*(?:\n\1\2[^\n]*)*",re.M)
+
+def _topName(name,sep):
+    "The first name splitKey() finds in the key of a line that starts 'name' + 'sep'"
+    name = name.lstrip()
+    if sep != '.':
+        name = name.rstrip()
+    return name
+
+def _strayLines(text,line):
+    "Runs for the lines in 'text', from line index 'line' on, that are not blank or comments"
+    runs = []
+    for i,s in enumerate(text.split('\n')):
+        key = s.lstrip()
+        if key and key[0] != '#':
+            # lines _RUN passes over: no '.' or '=', or nothing before them
+            name, sep, rest = key.partition('.')
+            if '=' in name:
+                name, sep, rest = key.partition('=')
+            runs.append((_topName(name,sep),line+i,[s]))
+    return runs
+
+def sectionRuns(text):
+    """
+    Split the text of a namespace file, without parsing it, into runs of
+    consecutive lines that share a top level name: [(name, start, lines)]
+    where 'start' is the index of the run's first line in the file.
+    Blank lines and comments are left out.
+    """
+    runs = []
+    line = 0        # the line 'end' is on
+    end = 0
+    for m in _RUN.finditer(text):
+        start = line + text.count('\n',end,m.start())
+        if start - line > 1 or m.start() - end > 1:
+            runs += _strayLines(text[end:m.start()],line)
+        lines = m.group().split('\n')
+        runs.append((_topName(*m.group(1,2)),start,lines))
+        line = start + len(lines) - 1
+        end = m.end()
+    return runs + _strayLines(text[end:],line)
+
+
+if __name__ == '__main__':
+
+    # parseValue() gives what eval() gave, or a ParseError where eval() raised
+    class Float(object):
+        def __init__(self,value=0.0,min=None,max=None,hint=''):
+            self.args = (value,min,max,hint)
+        def __eq__(self,other):
+            return type(other) is Float and self.args == other.args
+    funcs = {'Float': Float}
+    cases = [
+        "1", "-2.5", "1e3", "0x1f", "10L", "1+3j", "0", "00", "010", "-010", "010L", "010.5", "08",
+        "'a'", '"a\\tb"', "u'a'", "r'a\\n'", "'a' 'b'", "'a' \"b\" u'c'", "['a' 'b', 'c']",
+        "True", "None", "[1, 2, 3]", "(1,)", "()", "{'a': (1, 2)}", "[[1, 2], [3]]",
+        "1 # note", "[1,2] # c", "'#' # c", "\"a#b\"", "Float(value=1.0) # c", "Float(value=1.0, hint='#1')",
+        "Float(value=1, min=0, max=2, hint='gain')", "Float(1.0, hint='x')", "Float(value=[1, 2])",
+        "Float(value=1,value=2)", "Float(value=1, hint='a', value=2)", "Float(value=1, 2)",
+        "Float(nope=1)", "[1, 2", "1 2", "# only a comment",
+    ]
+    for text in cases:
+        try:
+            expected = eval(text,dict(funcs),{})
+        except Exception, e:
+            expected = ParseError
+        try:
+            value = parseValue(text,funcs)
+        except ParseError:
+            value = ParseError
+        assert value == expected and type(value) is type(expected), (text,value,expected)
+    print "%d values parsed as eval() does" % len(cases)
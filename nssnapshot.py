@@ -0,0 +1,402 @@
+#!/usr/bin/env python
+
+"""
+Binary snapshots of NameSpace and UiNameSpace, an alternative to the
+'name = repr(value)' text files that loads without parsing anything.
+
+    ns.writeSnapshot("render.nsnap")
+    ns = UiNameSpace.fromSnapshot("render.nsnap")
+
+    python nssnapshot.py render.uins render.nsnap     # convert text to snapshot
+    python nssnapshot.py render.nsnap render.uins     # and back
+    python nssnapshot.py                              # round trip tests
+
+Layout, all integers little endian:
+
+    header      'NSSNAP', format version (uint16), root record length (uint32)
+    root        marshal of (record, [(name, offset, length), ...])
+    sections    marshal of the record of each sub-namespace of the root,
+                at the offset (from the start of the file) the root lists
+
+A record is the marshal of
+
+    (names, values, uiNames, uiTypes, uiArgs, otherNames, otherValues, children)
+
+'names'/'values' hold the leaves marshal stores as they are, 'ui*' the UiItem
+leaves as their NAME and argument dict, 'other*' the rest as (tag, data)
+trees (see _encode): paths, and UiItems and containers holding them.
+'children' is the (name, record) of each sub-namespace.  Names are interned
+when written, so marshal stores each distinct one once.  Nothing is
+pickled, a value of any other type is refused with a SnapshotError.
+
+The file is read through a memory map and each section is a record of its
+own, so a reader can load a single section without touching the others.
+"""
+
+import gc
+import mmap
+import struct
+import marshal
+from   path                import  path as Path
+
+MAGIC = 'NSSNAP'
+VERSION = 1
+MARSHAL_VERSION = 2
+
+_HEADER = struct.Struct('<6sHI')
+
+
+class SnapshotError(ValueError):
+    "A file is not a snapshot or was written by a newer version of this module, or a value cannot be written to one"
+
+
+_PLAIN = frozenset([type(None),bool,int,long,float,complex,str,unicode])
+
+def _plain(v):
+    "True if marshal gives back exactly 'v', of the same types (a path is not plain, see _encode)"
+    t = v.__class__
+    if t in _PLAIN:
+        return True
+    if t is list or t is tuple:
+        for x in v:
+            if not _plain(x):
+                return False
+        return True
+    if t is dict:
+        for k,x in v.iteritems():
+            if not _plain(k) or not _plain(x):
+                return False
+        return True
+    if t is set or t is frozenset:
+        for x in v:
+            if not _plain(x):
+                return False
+        return True
+    return False
+
+def _isUiItem(v):
+    return hasattr(v,'NAME') and isinstance(getattr(v,'_args',None),dict)
+
+# tags of the (tag, data) pairs _encode() makes
+_VALUE, _PATH, _LIST, _TUPLE, _DICT, _SET, _FROZENSET, _UIITEM = range(8)
+
+def _encode(v):
+    "(tag, data) for 'v' that marshal can store, SnapshotError for a type snapshots do not hold"
+    t = v.__class__
+    if _plain(v):
+        return _VALUE, v
+    if t is Path:
+        return _PATH, unicode(v) if isinstance(v,unicode) else str(v)
+    if t is list:
+        return _LIST, [_encode(x) for x in v]
+    if t is tuple:
+        return _TUPLE, [_encode(x) for x in v]
+    if t is dict:
+        return _DICT, [(_encode(k),_encode(x)) for k,x in v.iteritems()]
+    if t is set:
+        return _SET, [_encode(x) for x in v]
+    if t is frozenset:
+        return _FROZENSET, [_encode(x) for x in v]
+    if _isUiItem(v):
+        return _UIITEM, (intern(v.NAME),_encode(v._args))
+    raise SnapshotError("cannot write a %s.%s to a snapshot: %r" % (t.__module__,t.__name__,v))
+
+def _decode(encoded,funcs):
+    tag, data = encoded
+    if tag == _VALUE:
+        return data
+    if tag == _PATH:
+        return Path(data)
+    if tag == _LIST:
+        return [_decode(x,funcs) for x in data]
+    if tag == _TUPLE:
+        return tuple([_decode(x,funcs) for x in data])
+    if tag == _DICT:
+        return dict([(_decode(k,funcs),_decode(x,funcs)) for k,x in data])
+    if tag == _SET:
+        return set([_decode(x,funcs) for x in data])
+    if tag == _FROZENSET:
+        return frozenset([_decode(x,funcs) for x in data])
+    if tag == _UIITEM:
+        name, args = data
+        try:
+            return funcs[name](_decode(args,funcs))
+        except KeyError, desc:
+            raise SnapshotError("no function for UiItem type %s" % desc)
+    raise SnapshotError("unknown value tag %r" % (tag,))
+
+
+# --- writing -----------------------------------------------------------------
+
+def encodeRecord(names,values,children):
+    """
+    The record tuple for one namespace: 'names' and 'values' are its leaves,
+    'children' a list of (name, (names, values, children)) for its sub-namespaces
+    """
+    plainNames, plainValues = [], []
+    uiNames, uiTypes, uiArgs = [], [], []
+    otherNames, otherValues = [], []
+    for name,v in zip(names,values):
+        name = intern(str(name))
+        if _plain(v):
+            plainNames.append(name)
+            plainValues.append(v)
+        elif _isUiItem(v) and _plain(v._args):
+            uiNames.append(name)
+            uiTypes.append(intern(v.NAME))
+            uiArgs.append(v._args)
+        else:
+            otherValues.append(_encode(v))
+            otherNames.append(name)
+    return (plainNames, plainValues, uiNames, uiTypes, uiArgs, otherNames, otherValues,
+            [(intern(str(name)),encodeRecord(*child)) for name,child in children])
+
+def writeRecords(f,names,values,children):
+    """
+    Write a snapshot of the namespace with leaves 'names'/'values' and
+    sub-namespaces 'children' (see encodeRecord) to the open file 'f'.
+    Returns the number of bytes written.
+    """
+    blobs = [marshal.dumps(encodeRecord(childNames,childValues,grandChildren),MARSHAL_VERSION)
+             for name,(childNames,childValues,grandChildren) in children]
+    # the root's length depends on the offsets it lists, which depend on its
+    # length; marshal writes ints at a fixed width so the second try fits
+    rootRecord = encodeRecord(names,values,[])
+    offset = 0
+    for i in range(2):
+        directory = []
+        o = _HEADER.size + offset
+        for (name,child),blob in zip(children,blobs):
+            directory.append((intern(str(name)),o,len(blob)))
+            o += len(blob)
+        root = marshal.dumps((rootRecord,directory),MARSHAL_VERSION)
+        offset = len(root)
+    f.write(_HEADER.pack(MAGIC,VERSION,len(root)))
+    f.write(root)
+    for blob in blobs:
+        f.write(blob)
+    return _HEADER.size + len(root) + sum([len(b) for b in blobs])
+
+
+# --- reading -----------------------------------------------------------------
+
+def decodeRecord(record,funcs={}):
+    """
+    (names, values, children) from a record, UiItems are rebuilt with the
+    callables in 'funcs' (eg. UiNameSpace.LocalFuncTable) by their NAME
+    """
+    names, values, uiNames, uiTypes, uiArgs, otherNames, otherValues, children = record
+    if uiNames:
+        try:
+            values = values + [funcs[t](a) for t,a in zip(uiTypes,uiArgs)]
+        except KeyError, desc:
+            raise SnapshotError("no function for UiItem type %s" % desc)
+        names = names + uiNames
+    if otherNames:
+        values = values + [_decode(v,funcs) for v in otherValues]
+        names = names + otherNames
+    return names, values, [(name,decodeRecord(child,funcs)) for name,child in children]
+
+
+class Snapshot(object):
+    """
+    An open snapshot file.  'root' is the record of the top namespace and
+    'sections' maps the name of each sub-namespace of it to where its record is.
+    """
+
+    def __init__(self,file):
+        self.file = file
+        f = open(file,'rb')
+        try:
+            try:
+                self._map = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+            except (ValueError,EnvironmentError), desc:
+                raise SnapshotError("%s: cannot map, %s" % (file,desc))
+        finally:
+            f.close()
+        if len(self._map) < _HEADER.size or self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise SnapshotError("%s: not a snapshot" % file)
+        magic, version, rootLength = _HEADER.unpack_from(self._map)
+        if version > VERSION:
+            self._map.close()
+            raise SnapshotError("%s: snapshot version %d, can only read up to %d" % (file,version,VERSION))
+        self.version = version
+        self.root, directory = marshal.loads(buffer(self._map,_HEADER.size,rootLength))
+        self.sections = dict([(name,(offset,length)) for name,offset,length in directory])
+        self.order = [name for name,offset,length in directory]
+
+    def section(self,name):
+        "The record of sub-namespace 'name' of the root"
+        offset, length = self.sections[name]
+        return marshal.loads(buffer(self._map,offset,length))
+
+    def records(self):
+        "The root record with every section record filled in as its children"
+        root = list(self.root)
+        root[-1] = root[-1] + [(name,self.section(name)) for name in self.order]
+        return tuple(root)
+
+    def close(self):
+        self._map.close()
+
+
+def readRecords(file,funcs={}):
+    "(names, values, children) of the namespace in snapshot 'file', see decodeRecord"
+    snap = Snapshot(file)
+    # nothing built here can be garbage yet, don't let the collector keep looking
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return decodeRecord(snap.records(),funcs)
+    finally:
+        if enabled:
+            gc.enable()
+        snap.close()
+
+
+# --- conversion --------------------------------------------------------------
+
+def isSnapshot(file):
+    f = open(file,'rb')
+    try:
+        return f.read(len(MAGIC)) == MAGIC
+    finally:
+        f.close()
+
+def convert(src,dst):
+    """
+    Convert between the text format and snapshots, whichever 'src' is
+    'dst' becomes the other.  Files with UiItems (.uins) load as UiNameSpace.
+    """
+    from uinamespace import UiNameSpace
+    if isSnapshot(src):
+        ns = UiNameSpace.fromSnapshot(src)
+        return ns.write(dst)
+    ns = UiNameSpace.load(src)
+    return ns.writeSnapshot(dst)
+
+
+# --- TEST ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    import sys
+    import tempfile
+    from   path                import  path as Path
+    from   namespace           import  NameSpace
+    from   uinamespace         import  UiNameSpace
+    # the classes fromSnapshot raises, not this script's copies of them
+    from   nssnapshot          import  SnapshotError
+
+    if len(sys.argv) == 3:
+        convert(sys.argv[1],sys.argv[2])
+        sys.exit(0)
+
+    def flat(ns):
+        # UiItem reprs follow their argument dict's order, so compare the dicts
+        return sorted([(k,type(v),repr(sorted(v._args.items())) if _isUiItem(v) else repr(v))
+                       for k,v in ns.walk()])
+
+    def same(a,b):
+        return flat(a) == flat(b)
+
+    tmpDir = Path(tempfile.mkdtemp())
+    try:
+        ns = NameSpace()
+        ns.parse("""
+        aperature.185     = 20.95
+        camera.persp      = 'perspective'
+        camera.clip       = (0.1, 10000.0)
+        object.truck      = 0.0
+        object.globalMtx  = [1, 0, 0, 0,  0, 1, 0, 0,  0, 0, 1, 0,  0, 0, 0, 1]
+        object.deep.er.x  = 3L
+        render.flags      = {'a': 1, 'b': [True, None]}
+        render.name       = u'caf\\xe9'
+        top               = 1
+        """)
+        ns.set('material.path',Path('/imd/dept/surfacing/materials/Global_default.mtl'))
+        snap = tmpDir/"ns.nsnap"
+        nBytes = ns.writeSnapshot(snap)
+        back = NameSpace.fromSnapshot(snap)
+        assert same(ns,back), (ns.dict,back.dict)
+        assert back.dict == ns.dict and back.hdict == ns.hdict
+        assert isinstance(back['material.path'],Path)
+        assert back['object.deep']['er.x'] == 3L
+        back.set('object.deep.er.y',4)
+        assert back['object.deep.er.y'] == 4 and back['object']['deep.er.y'] == 4
+        print "NameSpace round trip ok (%d bytes)" % nBytes
+
+        # anything but plain values and UiItems is written explicitly, or refused
+        ns.set('material.search',(Path('/usr/tmp'),['/tmp',Path('/var/tmp')]))
+        ns.set('material.tags',{Path('/x'): set([1,2]), 'y': frozenset(['a'])})
+        ns.writeSnapshot(snap)
+        back = NameSpace.fromSnapshot(snap)
+        assert same(ns,back) and back['material.tags'] == ns['material.tags']
+        assert [type(p) for p in [back['material.search'][0]] + back['material.search'][1]] == [Path,str,Path]
+        class Opaque(object):
+            pass
+        ns.set('material.opaque',Opaque())
+        try:
+            ns.writeSnapshot(tmpDir/"opaque.nsnap")
+        except SnapshotError, desc:
+            assert not (tmpDir/"opaque.nsnap").exists()
+            print "refused:", str(desc).split(':')[0]
+        else:
+            raise AssertionError("an Opaque was written")
+        ns.delete('material.opaque')
+
+        uns = UiNameSpace()
+        uns.parse("""
+        junk.floo        = Float(value=1.1)
+        junk.bar         = Int(value=1,min=0,max=100,default=50,choices=[10,25,50,99])
+        render.xres      = Int(value=640,min=1,max=4096,choices=[640,1024,2048])
+        render.order     = String(value="spiral",choices=['horizontal', 'vertical', 'spiral'])
+        light.key.gain   = Float(value=0.75,map="log",min=0.0,hintmax=10.0)
+        material.difftex = File(value='/usr/tmp/foo.mtl',default='output.mtl',extensions=['mtl','mbws'],dirs=['/usr/tmp/','/tmp'])
+        camera.position  = Vector(value=(0,0,-100),rubber=True)
+        goop.date        = Date(value="20110430")
+        """)
+        uns.set('material.lib',UiNameSpace.LocalFuncTable['File'](value=Path('/usr/tmp/lib.mtl')))
+        uns.writeSnapshot(tmpDir/"direct.nsnap")
+        back = UiNameSpace.fromSnapshot(tmpDir/"direct.nsnap")
+        assert isinstance(back,UiNameSpace) and same(uns,back)
+        assert back['render.xres']['choices'] == [640,1024,2048]
+        assert isinstance(back['material.lib'].value,Path)
+        uns.delete('material.lib')
+        print "UiNameSpace round trip ok"
+
+        # the text format rounds floats with %g, so compare with what it loads as
+        uns.write(tmpDir/"uns.uins")
+        convert(tmpDir/"uns.uins",tmpDir/"uns.nsnap")
+        back = UiNameSpace.fromSnapshot(tmpDir/"uns.nsnap")
+        assert same(UiNameSpace.load(tmpDir/"uns.uins"),back)
+        convert(tmpDir/"uns.nsnap",tmpDir/"back.uins")
+        assert same(UiNameSpace.load(tmpDir/"uns.uins"),UiNameSpace.load(tmpDir/"back.uins"))
+        print "UiNameSpace text -> snapshot -> text ok"
+
+        snap = Snapshot(tmpDir/"uns.nsnap")
+        assert sorted(snap.sections.keys()) == sorted(uns._data.keys())
+        names, values, children = decodeRecord(snap.section('render'),UiNameSpace.LocalFuncTable)
+        assert sorted(names) == ['order','xres'] and children == []
+        snap.close()
+        print "single section ok"
+
+        bad = tmpDir/"bad.nsnap"
+        data = (tmpDir/"uns.nsnap").bytes()
+        bad.write_bytes(data[:6] + struct.pack('<H',VERSION+1) + data[8:])
+        try:
+            UiNameSpace.fromSnapshot(bad)
+        except SnapshotError, desc:
+            print "newer version refused:", desc
+        else:
+            raise AssertionError("newer version was read")
+        bad.write_bytes("x = 1\n")
+        try:
+            NameSpace.fromSnapshot(bad)
+        except SnapshotError, desc:
+            print "text refused:", desc
+        else:
+            raise AssertionError("text was read as a snapshot")
+    finally:
+        tmpDir.rmtree()
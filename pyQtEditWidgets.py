@@ -3,13 +3,16 @@
 import sys
 import os
 import re
-from collections import defaultdict
+import time
+import heapq
+from collections import defaultdict, OrderedDict
 
 try:
     import pyCrashCatcher
 except ImportError:
     pass
 
+import sip
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 
@@ -136,6 +139,78 @@ def getTagIcon(tag):
     return iconDirectory[tag]
 
 
+class RecentValueScheduler(QObject):
+
+    """
+    Saves the values edit widgets propose (proposeSaveCandidate()) as recent
+    values once they stay for DELAY seconds, for all widgets on one QTimer.
+    Pending widgets are kept in a heap by deadline, a proposal that replaces
+    an earlier one leaves the old heap entry behind to be skipped.  Each time
+    the timer fires every widget due within TICK seconds is saved.
+    """
+
+    DELAY = 2.0
+    TICK  = 0.05
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self,parent=None):
+        super(RecentValueScheduler,self).__init__(parent)
+        self._heap = []                 # (deadline, widget id)
+        self._pending = dict()          # widget id -> (deadline, widget, value)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._due = None                # when the timer fires
+        self.connect(self._timer,SIGNAL("timeout()"),self._saveDue)
+
+    def propose(self,widget,value):
+        if value is None:
+            return self.cancel(widget)
+        deadline = time.time() + self.DELAY
+        self._pending[id(widget)] = (deadline,widget,value)
+        heapq.heappush(self._heap,(deadline,id(widget)))
+        self._schedule()
+
+    def cancel(self,widget):
+        self._pending.pop(id(widget),None)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _schedule(self):
+        while self._heap and self._pending.get(self._heap[0][1],(None,))[0] != self._heap[0][0]:
+            heapq.heappop(self._heap)   # replaced or cancelled
+        if not self._heap:
+            self._timer.stop()
+            self._due = None
+            return
+        deadline = self._heap[0][0]
+        if self._due is None or deadline < self._due:
+            self._due = deadline
+            self._timer.start(max(0,int((deadline - time.time()) * 1000.0)))
+
+    def _saveDue(self):
+        self._due = None
+        horizon = time.time() + self.TICK
+        heap, pending = self._heap, self._pending
+        while heap and heap[0][0] <= horizon:
+            deadline, key = heapq.heappop(heap)
+            entry = pending.get(key)
+            if entry is None or entry[0] != deadline:
+                continue
+            del pending[key]
+            widget, value = entry[1], entry[2]
+            if not sip.isdeleted(widget):
+                widget.saveRecentValue(value)
+        self._schedule()
+
+
 class BaseEditWidget(QWidget):
 
     """
@@ -190,27 +265,22 @@ class BaseEditWidget(QWidget):
 
         # Enabled
         self.groupEnabled = True
+        self._editWidgetsSet = False     # _editWidgets not set enabled or disabled yet
 
-        # Stack of the most recent values
-        self._recent    = list()
-        self._saveTimer = QTimer()
-        self._saveTimer.setSingleShot(True)
-        self._proposedValue = None
-
-        self.connect(self._saveTimer,SIGNAL("timeout()"),self._saveRecentTimerCB)
+        # The most recent values, oldest first, as keys (see _recentKey)
+        self._recent    = OrderedDict()
 
     def setEditEnabled(self,bool):
+        self._setEditWidgetsEnabled(bool)
+        self.nameL.setFont(nameFont(bool))
+
+    def _setEditWidgetsEnabled(self,bool):
+        if bool == self.groupEnabled and self._editWidgetsSet:
+            return
         self.groupEnabled = bool
+        self._editWidgetsSet = True
         for w in self._editWidgets:
             w.setEnabled(bool)
-        font = QFont()
-        if bool:
-            font.setWeight(99)
-            font.setBold(True)
-        else:
-            font.setWeight(0)
-            font.setBold(False)
-        self.nameL.setFont(font)
 
     def setName(self,name,iconType=''):
         "Set the name in the label and optionally set an icon type"
@@ -224,35 +294,47 @@ class BaseEditWidget(QWidget):
     def getName(self):
         return str(self.nameL.text())
 
+    MAX_RECENT = 16     # recent values kept, the first saved are dropped first
+
+    @staticmethod
+    def _recentKey(value):
+        return tuple(value) if isinstance(value,list) else value
+
     def saveRecentValue(self,value):
-        if value not in self._recent:
-            #print "SAVED VALUE",value,self._recent
-            self._recent.append(value)
-        #else:
-        #    print "SAVED (already had that.)"
+        "Add value after the others unless it is already there, where it stays"
+        key = self._recentKey(value)
+        if key in self._recent:
+            return
+        if len(self._recent) >= self.MAX_RECENT:
+            self._recent.popitem(last=False)
+        self._recent[key] = value
 
     def recentValue(self):
         if len(self._recent):
-            return self._recent[-1]
+            return next(reversed(self._recent.values()))
         else:
             return None
 
     def recentValues(self,maxValues=0):
-        if maxValues and maxValues < len(self._recent):
-            return self._recent[:maxValues]
+        values = self._recent.values()
+        if maxValues and maxValues < len(values):
+            return values[:maxValues]
         else:
-            return self._recent
+            return values
 
     def clearRecentValues(self):
-        self._recent = list()
-
-    def _saveRecentTimerCB(self):
-        if self._proposedValue != None:
-            self.saveRecentValue(self._proposedValue)
+        self._recent = OrderedDict()
 
     def proposeSaveCandidate(self,value):
-        self._proposedValue = value
-        self._saveTimer.start(2000)
+        "Save value as a recent value if it is not replaced within RecentValueScheduler.DELAY seconds"
+        RecentValueScheduler.instance().propose(self,value)
+
+    def reset(self):
+        "Forget what was set for the last item shown, for reuse by EditWidgetPool"
+        RecentValueScheduler.instance().cancel(self)
+        self.clearRecentValues()
+        self.setSource('')
+        self.setEditEnabled(True)
 
 # --- Widgets without inheritance ---
 
@@ -329,6 +411,36 @@ class DirComboBox(QComboBox):
 
 INHERITANCE_RANK = {0: "Local", 1: "Inherit", 2: "Default"}
 
+_nameFonts = dict()     # edit enabled -> QFont of the name label
+_rankStyles = dict()    # rank -> (icon pixmap, QFont of the name label)
+
+def nameFont(enabled):
+    "The shared name label font of BaseEditWidget.setEditEnabled()"
+    font = _nameFonts.get(enabled)
+    if font is None:
+        font = _nameFonts[enabled] = QFont()
+        font.setWeight(99 if enabled else 0)
+        font.setBold(enabled)
+    return font
+
+def rankStyle(rank):
+    "The shared (pixmap, font) InheritControlWidget shows for rank, made on first use"
+    style = _rankStyles.get(rank)
+    if style is None:
+        font = QFont()
+        if rank == 0:
+            font.setPointSize(12)
+            font.setWeight(99)
+            font.setBold(True)
+        else:
+            font.setPointSize(10)
+            font.setWeight(0)
+            font.setBold(False)
+            font.setItalic(rank == 2)
+        icon = ("ParamLocal","ParamInherit","ParamDefault")[rank]
+        style = _rankStyles[rank] = (getTagIcon(icon).pixmap(24,24),font)
+    return style
+
 
 class InheritControlWidget(BaseEditWidget):
 
@@ -340,6 +452,7 @@ class InheritControlWidget(BaseEditWidget):
         self.connect(self,SIGNAL("customContextMenuRequested (const QPoint&)"),self.contextMenuCB)
         self._defaultValues = []
         self._deleteAllowed = False
+        self._rank = None
 
     def addDefaultValue(self,v):
         self._defaultValues.append(v)
@@ -399,35 +512,43 @@ class InheritControlWidget(BaseEditWidget):
     def mouseDoubleClickEvent(self, event):
         self.setInheritanceRank(0)
 
+    def reset(self):
+        super(InheritControlWidget,self).reset()
+        self._defaultValues = []
+        self._rank = None
+        self.setInheritanceRank(0)
+
 
     def setInheritanceRank(self,rank):
         assert rank in INHERITANCE_RANK, "rank not in %s: '%s'" % (repr(INHERITANCE_RANK.keys()),rank)
-        iconLocal     = getTagIcon("ParamLocal").pixmap(24,24)
-        iconInherited = getTagIcon("ParamInherit").pixmap(24,24)
-        iconDefault   = getTagIcon("ParamDefault").pixmap(24,24)
-        font = QFont()
-        #font.setLetterSpacing(QFont.PercentageSpacing,90.0)
-        #font.setFixedPitch(False)
-        if rank == 0: 
-            self.setEditEnabled(True)
-            self.iconL.setPixmap(iconLocal)
-            font.setPointSize(12)
-            font.setWeight(99)
-            font.setBold(True)
-        elif rank == 1: 
-            self.setEditEnabled(False)
-            self.iconL.setPixmap(iconInherited)
-            font.setPointSize(10)
-            font.setWeight(0)
-            font.setBold(False)
-        elif rank == 2: 
-            self.setEditEnabled(False)
-            self.iconL.setPixmap(iconDefault)
-            font.setPointSize(10)
-            font.setWeight(0)
-            font.setBold(False)
-            font.setItalic(True)
+        # setEditEnabled() may have changed both since, so always re-apply them
+        self._setEditWidgetsEnabled(rank == 0)
+        pixmap, font = rankStyle(rank)
+        self.iconL.setPixmap(pixmap)
         self.nameL.setFont(font)
+        self._rank = rank
+
+    def inheritanceRank(self):
+        return self._rank
+
+
+def setInheritanceRanks(ranks):
+    """
+    Apply {widget: rank} in one pass, with the windows they are in not
+    painted until all are done
+    """
+    windows = dict()
+    for widget in ranks:
+        window = widget.window()
+        if id(window) not in windows and window.updatesEnabled():
+            windows[id(window)] = window
+            window.setUpdatesEnabled(False)
+    try:
+        for widget,rank in ranks.iteritems():
+            widget.setInheritanceRank(rank)
+    finally:
+        for window in windows.itervalues():
+            window.setUpdatesEnabled(True)
 
 
 class SwitchEditWidget(InheritControlWidget):
@@ -861,6 +982,108 @@ class RibAttrEditWidget(StringEditWidget):
         super(RibAttrEditWidget,self).__init__(parent)
         self.setAllowDelete(True)
 
+
+class EditWidgetPool(object):
+
+    """
+    Edit widgets put aside by release() to be given out again by acquire(),
+    by class and 'shape' (eg. shapeOf(item)), so switching to a namespace
+    of the same schema rebinds the widgets it had instead of making new ones.
+    bind() makes the signal connections of a widget and release() undoes
+    exactly those, so a reused widget reports only to its new owner.
+    At most 'maxPerKey' widgets of a kind are kept, the others are deleted
+    along with the widgets listed in their '_poolParts' (eg. the labels of
+    a row).  Widgets made elsewhere are pooled once adopt()ed, as
+    WidgetSetToolBox does with the rows of its WidgetSets.
+    """
+
+    SIGNALS = dict(valueChanged="valueChanged(QVariant)",inheritanceChanged="inheritanceChanged(int)",delete="delete()")
+
+    def __init__(self,maxPerKey=256):
+        self.maxPerKey = maxPerKey
+        self._free = defaultdict(list)     # (class, shape) -> widgets not in use
+        self.made = self.reused = 0
+
+    @staticmethod
+    def shapeOf(item):
+        "What a widget for UiItem 'item' depends on besides its value"
+        return (item.NAME,) + tuple([tuple(item[k]) if k == 'choices' else item[k] for k in ('min','max','choices','map','rubber') if k in item])
+
+    def acquire(self,cls,shape=None,parent=None):
+        "A widget of class 'cls' made before for 'shape' if one is free, a new one otherwise"
+        widget = self.reuse(cls,shape,parent)
+        if widget is None:
+            widget = self.adopt(cls(parent),cls,shape)
+        return widget
+
+    def reuse(self,cls,shape=None,parent=None):
+        "A widget released for class 'cls' and 'shape', None if none is free"
+        free = self._free.get((cls,shape))
+        while free:
+            widget = free.pop()
+            if sip.isdeleted(widget):
+                continue
+            self.reused += 1
+            if parent is not None:
+                widget.setParent(parent)
+            return widget
+        return None
+
+    def adopt(self,widget,cls,shape=None):
+        "Let widget, made for 'cls' and 'shape', be release()d into the pool"
+        self.made += 1
+        widget._poolKey = (cls,shape)
+        widget._poolConnections = []
+        widget._poolParts = []
+        return widget
+
+    def bind(self,widget,name,value,rank=0,iconType='',**callbacks):
+        """
+        Show name, value and inheritance rank in widget and connect callbacks
+        by signal name, eg. valueChanged=changeCB, see SIGNALS.  A value of
+        None leaves the value the widget shows.
+        """
+        widget.reset()
+        widget.setName(name,iconType)
+        if value is not None:
+            widget.setValue(value)
+        if rank:
+            widget.setInheritanceRank(rank)
+        for signalName,callback in callbacks.items():
+            signal = SIGNAL(self.SIGNALS[signalName])
+            widget.connect(widget,signal,callback)
+            widget._poolConnections.append((signal,callback))
+        return widget
+
+    def release(self,widget):
+        "Disconnect what bind() connected and put widget aside, hidden and without a parent"
+        for signal,callback in widget._poolConnections:
+            widget.disconnect(widget,signal,callback)
+        widget._poolConnections = []
+        free = self._free[widget._poolKey]
+        if len(free) >= self.maxPerKey:
+            self._discard(widget)
+            return
+        widget.hide()
+        widget.setParent(None)
+        free.append(widget)
+
+    def _discard(self,widget):
+        "Delete widget and its _poolParts"
+        for w in [widget] + [w for w in widget._poolParts if w is not widget]:
+            if not sip.isdeleted(w):
+                w.deleteLater()
+
+    def clear(self):
+        "Delete every widget put aside"
+        for free in self._free.values():
+            for widget in free:
+                self._discard(widget)
+        self._free.clear()
+
+    def stats(self):
+        return dict(made=self.made,reused=self.reused,free=sum([len(f) for f in self._free.values()]))
+
 # ------------------------------------------------------------------
 
 class PolishingSlider(QSlider):
@@ -914,6 +1137,7 @@ class WidgetSet(QWidget):
         self.layout().addLayout(self.gridLayout)
         self.layout().addStretch()
         self.rowIndex = 0
+        self.lastSection = None # name of the last separator added, if nothing came after it but its rows
         self._rowLabel = dict()
         self._rowWidget = dict()
         self.floatValidator = QDoubleValidator(-1e38,1e38,4,self)
@@ -924,6 +1148,54 @@ class WidgetSet(QWidget):
     def getRowWidget(self,index):
         return self._rowWidget.get(index,None)
 
+    def _rowParts(self,index):
+        "[(widget, column, rowSpan, columnSpan, alignment)] of row 'index' of the grid"
+        parts = []
+        for cell in range(self.gridLayout.columnCount()):
+            layoutItem = self.gridLayout.itemAtPosition(index,cell)
+            w = layoutItem.widget() if layoutItem is not None else None
+            if w is not None and w not in [part[0] for part in parts]:
+                row, column, rowSpan, columnSpan = self.gridLayout.getItemPosition(self.gridLayout.indexOf(w))
+                parts.append((w,column,rowSpan,columnSpan,layoutItem.alignment()))
+        return parts
+
+    def takeRows(self):
+        """
+        Empty the set: [(parts, label, widget)] of every row but the
+        separators, which are deleted, out of the grid and hidden until
+        given back to putRow()
+        """
+        rows = []
+        for index in range(self.rowIndex):
+            parts = self._rowParts(index)
+            for part in parts:
+                self.gridLayout.removeWidget(part[0])
+                if index in self._rowWidget:
+                    part[0].hide()
+                    part[0].setParent(None)
+                else:
+                    part[0].deleteLater()
+            if index in self._rowWidget:
+                rows.append((parts,self._rowLabel.get(index),self._rowWidget[index]))
+        self.rowIndex = 0
+        self.lastSection = None
+        self._rowLabel.clear()
+        self._rowWidget.clear()
+        return rows
+
+    def putRow(self,row):
+        "Add a row taken out by takeRows() after the last one, its index"
+        parts, labelW, widget = row
+        for w,column,rowSpan,columnSpan,alignment in parts:
+            self.gridLayout.addWidget(w,self.rowIndex,column,rowSpan,columnSpan,alignment)
+            w.show()
+        if labelW is not None:
+            self._rowLabel[self.rowIndex] = labelW
+        self._rowWidget[self.rowIndex] = widget
+        index = self.rowIndex
+        self.rowIndex += 1
+        return index
+
     def addSlider(self,name,callback,initValue=None,loValue=0.0,hiValue=1.0,log=False,format="%g",rubber=False):
         if initValue == None: initValue = hiValue
         def cb0(valI):
@@ -1335,6 +1607,7 @@ class WidgetSet(QWidget):
         return index
 
     def addSeparator(self,name=''):
+        self.lastSection = name or None
         if name:
             labelW = QLabel(self)
             self._rowLabel[self.rowIndex] = labelW
@@ -1353,52 +1626,94 @@ class WidgetSet(QWidget):
         return index
 
 
+def uiItemEditorKind(item):
+    "The kind of editor made for UiItem 'item', by WidgetSetToolBox.addUiItem() and UiItemDelegate, None if none"
+    if item.NAME == "Float":
+        if "min" in item and "max" in item:
+            return "slider"
+        elif "choices" in item:
+            return "floatCombo"
+        return "floatEdit"
+    elif item.NAME == "String":
+        return "combo" if "choices" in item else "lineEdit"
+    elif item.NAME == "Int":
+        return "intCombo" if "choices" in item else "integer"
+    elif item.NAME == "File":
+        return "fileCombo" if "choices" in item else "file"
+    elif item.NAME == "Boolean":
+        return "checkbox"
+    elif item.NAME == "Vector":
+        return "vector"
+    elif item.NAME == "Date":
+        return "date"
+    return None
+
+
+class WidgetIndex(dict):
+
+    """paramName -> widget, a widget of a tab not made yet is made when asked for by key"""
+
+    def __init__(self,toolBox):
+        super(WidgetIndex,self).__init__()
+        self.toolBox = toolBox
+
+    def __missing__(self,paramName):
+        if self.toolBox.buildTab(paramName.split('.')[0]) and dict.__contains__(self,paramName):
+            return dict.__getitem__(self,paramName)
+        raise KeyError(paramName)
+
+
 class WidgetSetToolBox(QToolBox):
     
-    """A tool box with a tab for each widget set"""
+    """
+    A tool box with a tab for each widget set.  The rows of a cleared tab
+    are kept in 'widgetPool' (an EditWidgetPool, which can be shared
+    between tool boxes) for rows of the same kind and shape added later.
+    """
     
-    def __init__(self,parent):
+    def __init__(self,parent,widgetPool=None):
         super(WidgetSetToolBox,self).__init__(parent)
-        self.widgetIndex = dict() # maps paramName to values
+        self.widgetPool = widgetPool if widgetPool is not None else EditWidgetPool()
+        self.widgetIndex = WidgetIndex(self) # maps paramName to values
         self.widgetSet = dict() # maps section names to a widgetSet
+        self._editedParam = None # the param whose widget is being edited
+        self._unbuilt = dict() # maps tab names to (uiNameSpace, callbackFunc) of tabs not shown yet
+        self._shown = dict() # maps paramName to the value its widget shows
+        self._following = None # (uiNameSpace, callback) subscribed to, see _follow()
+        self.connect(self,SIGNAL("currentChanged(int)"),self._tabShown)
 
     def minimumSizeHint(self):
         return QSize(360, 120)
 
     def addUiItem(self,ws,name,item,callback):
+        kind = uiItemEditorKind(item)
         index = None
-        if item.NAME == "Float":
-            if "min" in item and "max" in item:
-                isLog = "map" in item and item['map'] == 'log'
-                isRubber = 'rubber' in item and item['rubber'] == True
-                index = ws.addSlider(name,callback,initValue=item.value,loValue=item['min'],hiValue=item['max'],log=isLog,format="%7.3f",rubber=isRubber)
-            elif "choices" in item:
-                index = ws.addFloatCombo(name,callback,item['choices'],item.value)
-            else:
-                index = ws.addFloatEdit(name,callback,item.value)
-        elif item.NAME == "String":
-            if "choices" in item:
-                index = ws.addCombo(name,callback,item['choices'],item.value)
-            else:
-                index = ws.addLineEdit(name,callback,item.value)
-        elif item.NAME == "Int":
-            if "choices" in item:
-                index = ws.addIntegerCombo(name,callback,item['choices'],item.value)
-            else:
-                index = ws.addInteger(name,callback,item.value)
-        elif item.NAME == "File":
-            if "choices" in item:
-                index = ws.addFileCombo(name,callback,item['choices'],item.value)
-            else:
-                index = ws.addFileChooser(name,callback,item.value)
-        elif item.NAME == "Boolean":
+        if kind == "slider":
+            isLog = "map" in item and item['map'] == 'log'
+            isRubber = 'rubber' in item and item['rubber'] == True
+            index = ws.addSlider(name,callback,initValue=item.value,loValue=item['min'],hiValue=item['max'],log=isLog,format="%7.3f",rubber=isRubber)
+        elif kind == "floatCombo":
+            index = ws.addFloatCombo(name,callback,item['choices'],item.value)
+        elif kind == "floatEdit":
+            index = ws.addFloatEdit(name,callback,item.value)
+        elif kind == "combo":
+            index = ws.addCombo(name,callback,item['choices'],item.value)
+        elif kind == "lineEdit":
+            index = ws.addLineEdit(name,callback,item.value)
+        elif kind == "intCombo":
+            index = ws.addIntegerCombo(name,callback,item['choices'],item.value)
+        elif kind == "integer":
+            index = ws.addInteger(name,callback,item.value)
+        elif kind == "fileCombo":
+            index = ws.addFileCombo(name,callback,item['choices'],item.value)
+        elif kind == "file":
+            index = ws.addFileChooser(name,callback,item.value)
+        elif kind == "checkbox":
             index = ws.addCheckbox(name,callback,item.value)
-        elif item.NAME == "Vector":
+        elif kind == "vector":
             index = ws.addVectorEdit(name,callback,item.value)
-        elif item.NAME == "Date":
+        elif kind == "date":
             index = ws.addDateEdit(name,callback,item.value)
-        else:
-            pass
         if index == None:
             print "HUH",name,item
             return None
@@ -1408,30 +1723,151 @@ class WidgetSetToolBox(QToolBox):
         return ws.getRowWidget(index)
 
     def addUiNameSpace(self,uiNameSpace,callbackFunc):
+        """
+        Add a tab for each top level namespace of uiNameSpace.  Only the tab
+        shown is filled in, the rows of the others are made the first time
+        they are shown (or asked for through widgetIndex).
+        """
         assert isinstance(uiNameSpace,utils.UiNameSpace), "expecting UiNameSpace, got '%s'" % repr(uiNameSpace)
-        for tabName in uiNameSpace.hdict.keys():
-            ns = uiNameSpace[tabName]
-            ws = self.getWidgetSet(tabName)
-            if isinstance(ns,utils.UiNameSpace):
-                for sectionName in ns.hdict.keys():
-                    ns2 = ns[sectionName]
-                    if isinstance(ns2,utils.UiNameSpace):
-                        ws.addSeparator(sectionName)
-                        for pName, p in ns2.items():
-                            paramName = ".".join([tabName,sectionName,pName])
-                            cb = lambda v,n=paramName: callbackFunc(n,v)
-                            valueW = self.addUiItem(ws,"    "+pName,p,cb)
-                            self.widgetIndex[paramName] = valueW
-                            valueW.nameSpaceItem = p
-                    else:
-                        paramName = ".".join([tabName,sectionName])
-                        cb = lambda v,n=paramName: callbackFunc(n,v)
-                        valueW = self.addUiItem(ws,sectionName,ns2,cb)
-                        self.widgetIndex[paramName] = valueW
-                        valueW.nameSpaceItem = ns2
-            else:
+        for tabName in uiNameSpace.hview:
+            if not isinstance(uiNameSpace[tabName],utils.UiNameSpace):
                 raise Exception("bad %s"%tabName)
-                #addItem(ws,tabName,ns)
+            self.clearWidgetSet(tabName)
+            self.getWidgetSet(tabName)
+            self._unbuilt[tabName] = (uiNameSpace,callbackFunc)
+        self._tabShown(self.currentIndex())
+        # from now on only the widgets of parameters that change are updated
+        self._follow(uiNameSpace)
+
+    def _follow(self,uiNameSpace):
+        "Show the changes of uiNameSpace, and no longer those of the namespace followed before"
+        if self._following is not None:
+            if self._following[0] is uiNameSpace:
+                return
+            self.unfollow()
+        callback = lambda paramNames,ns=uiNameSpace: self.updateParams(ns,paramNames)
+        uiNameSpace.subscribe('',callback,prefix=True)
+        self._following = (uiNameSpace,callback)
+
+    def unfollow(self):
+        "Stop following the namespace"
+        if self._following is not None:
+            uiNameSpace, callback = self._following
+            uiNameSpace.unsubscribe('',callback,prefix=True)
+            self._following = None
+
+    def _tabShown(self,index):
+        if index >= 0:
+            self.buildTab(str(self.itemText(index)))
+
+    def buildTab(self,tabName):
+        "Make the rows of tab 'tabName' if they are not made yet, False if there is no such tab to make"
+        if tabName not in self._unbuilt:
+            return False
+        uiNameSpace, callbackFunc = self._unbuilt.pop(tabName)
+        if tabName not in uiNameSpace:
+            return False
+        ns = uiNameSpace[tabName]
+        rows = []
+        for sectionName in ns.hview:
+            ns2 = ns[sectionName]
+            if isinstance(ns2,utils.UiNameSpace):
+                rows.extend([(sectionName,pName,p) for pName, p in ns2.items()])
+            else:
+                rows.append((sectionName,None,ns2))
+        self._addRows(self.getWidgetSet(tabName),tabName,rows,callbackFunc)
+        return True
+
+    def _addRows(self,ws,tabName,rows,callbackFunc):
+        """
+        Add [(sectionName, pName or None for an item right in the tab, UiItem)] to ws, with a separator where the section changes.
+        A row of the same kind and shape put aside by clearWidgetSet() is shown again rather than a new one made.
+        """
+        for sectionName, pName, item in rows:
+            if pName is None:
+                paramName = ".".join([tabName,sectionName])
+                label = sectionName
+                ws.lastSection = None
+            else:
+                paramName = ".".join([tabName,sectionName,pName])
+                label = "    "+pName
+                if ws.lastSection != sectionName:
+                    ws.addSeparator(sectionName)
+            shape = (uiItemEditorKind(item),) + EditWidgetPool.shapeOf(item)
+            pooled = self.widgetPool.reuse(WidgetSet,shape)
+            if pooled is not None:
+                pooled._rowTarget[:] = [callbackFunc,paramName]
+                index = ws.putRow(pooled._poolRow)
+                labelW = ws.getRowLabel(index)
+                if labelW is not None:
+                    labelW.setText(label)
+                    labelW.setToolTip(item['hint'].replace(';','\n') if 'hint' in item else '')
+                valueW = ws.getRowWidget(index)
+                self.widgetIndex[paramName] = valueW
+                valueW.nameSpaceItem = item
+                self._showValue(paramName,item.value)
+                continue
+            target = [callbackFunc,paramName]     # what the row reports to, changed when it is reused
+            cb = lambda v,target=target: self._widgetEdited(target[0],target[1],v)
+            valueW = self.addUiItem(ws,label,item,cb)
+            if valueW is None:
+                continue
+            anchor = self.widgetPool.adopt(getattr(valueW,'slider',valueW),WidgetSet,shape)
+            anchor._rowTarget = target
+            self.widgetIndex[paramName] = valueW
+            valueW.nameSpaceItem = item
+            self._shown[paramName] = _shownValue(item.value)
+
+    def clearWidgetSet(self,tabName):
+        "Take every row out of tab 'tabName', its widgets are put aside in widgetPool"
+        ws = self.widgetSet.get(tabName)
+        if ws is None:
+            return
+        self._unbuilt.pop(tabName,None)
+        for row in ws.takeRows():
+            parts, labelW, widget = row
+            anchor = getattr(widget,'slider',widget)
+            anchor._poolRow = row
+            anchor._poolParts = [part[0] for part in parts]
+            self.widgetPool.release(anchor)
+        prefix = tabName + '.'
+        for paramName in [p for p in dict.keys(self.widgetIndex) if p.startswith(prefix)]:
+            dict.__delitem__(self.widgetIndex,paramName)
+            self._shown.pop(paramName,None)
+
+    def _widgetEdited(self,callbackFunc,paramName,value):
+        self._editedParam = paramName
+        self._shown[paramName] = _shownValue(value)
+        try:
+            callbackFunc(paramName,value)
+        finally:
+            self._editedParam = None
+
+    def _showValue(self,paramName,value):
+        "Set the widget of paramName to value without it reporting the change"
+        widget = self.widgetIndex[paramName]
+        quiet = [getattr(widget,'slider',widget)]
+        if isinstance(quiet[0],QWidget):
+            quiet.extend(quiet[0].findChildren(QWidget))
+        blocked = [w.blockSignals(True) for w in quiet]
+        try:
+            widget.setValue(value)
+        finally:
+            for w,old in zip(quiet,blocked):
+                w.blockSignals(old)
+        self._shown[paramName] = _shownValue(value)
+
+    def updateParams(self,uiNameSpace,paramNames):
+        "Show the current values of 'paramNames' of uiNameSpace in their widgets"
+        for paramName in paramNames:
+            if paramName == self._editedParam:
+                continue    # don't echo an edit back into the widget being typed in
+            if paramName in self.widgetIndex and paramName in uiNameSpace:
+                v = uiNameSpace.get(paramName)
+                if isinstance(v,utils.UiItem):
+                    self.widgetIndex[paramName].nameSpaceItem = v
+                    v = v.value
+                self._showValue(paramName,v)
             
     def updateParam(self,paramName):
         v = self.widgetIndex[paramName].nameSpaceItem.value
@@ -1446,44 +1882,466 @@ class WidgetSetToolBox(QToolBox):
         return self.widgetSet[tabName]
 
     def updateUiNameSpace(self,uiNameSpace,callbackFunc):
-        uiNameSpace.write("updateUiNameSpace.uins")
-        #from pprint import pprint
-        #print "BEFORE:--------------------"
-        #pprint(self.widgetIndex)
-        #print "--------------------:BEFORE"
-        for paramName in uiNameSpace.dict.keys():
-            if paramName in self.widgetIndex:
-                v = uiNameSpace.get(paramName).value
-                print "XXX self.widgetIndex[%s].setValue(uiNameSpace.get(%s).value) = %s" % (paramName,paramName,v)
-                self.widgetIndex[paramName].setValue(v)
+        """
+        Make the widgets show uiNameSpace: rows whose value differs from the
+        one shown are set (quietly, see _showValue()), rows it has and the
+        tool box does not are added, nothing is painted until done.
+        Tabs not shown yet are only pointed at uiNameSpace.  Its changes are
+        shown from then on, those of the namespace shown before no longer.
+        """
+        widgets = self.widgetIndex
+        self.setUpdatesEnabled(False)
+        try:
+            for tabName in list(uiNameSpace.hview):
+                tab = uiNameSpace.get(tabName)
+                if not isinstance(tab,utils.UiNameSpace):
+                    continue
+                if tabName in self._unbuilt or tabName not in self.widgetSet:
+                    # made from this namespace when it is first shown
+                    self.getWidgetSet(tabName)
+                    self._unbuilt[tabName] = (uiNameSpace,callbackFunc)
+                    continue
+                missing = []    # [(sectionName, pName or None, item)] in the order buildTab() makes them
+                for sectionName in list(tab.hview):
+                    section = tab.get(sectionName)
+                    pNames = list(section.hview) if isinstance(section,utils.UiNameSpace) else [None]
+                    for pName in pNames:
+                        paramName = ".".join([tabName,sectionName,pName] if pName is not None else [tabName,sectionName])
+                        item = uiNameSpace.get(paramName)   # owned, not shared with a dupe
+                        if not isinstance(item,utils.UiItem):
+                            continue
+                        widget = dict.get(widgets,paramName)
+                        if widget is None:
+                            missing.append((sectionName,pName,item))
+                            continue
+                        widget.nameSpaceItem = item
+                        value = item.value
+                        if self._shown.get(paramName,_NOT_SHOWN) != value:
+                            self._showValue(paramName,value)
+                if missing:
+                    self._addRows(self.widgetSet[tabName],tabName,missing,callbackFunc)
+        finally:
+            self.setUpdatesEnabled(True)
+        self._tabShown(self.currentIndex())
+        self._follow(uiNameSpace)
+
+
+_NOT_SHOWN = object()
+
+def _shownValue(value):
+    "What WidgetSetToolBox remembers as shown, a copy of a list so changes to it in place are seen"
+    return list(value) if isinstance(value,list) else value
+
+
+class _ModelNode(object):
+
+    """A row of UiNameSpaceModel: 'key' is the dotted path, 'names' the child names of a namespace once asked for"""
+
+    __slots__ = ('parent','row','key','name','names')
+
+    def __init__(self,parent,row,key,name):
+        self.parent = parent
+        self.row = row
+        self.key = key
+        self.name = name
+        self.names = None
+
+
+class UiNameSpaceModel(QAbstractItemModel):
+
+    """
+    A tree model of a UiNameSpace, a row per sub-namespace and UiItem with
+    the name in column 0 and the value in column 1.  Rows are made as the
+    view asks for them and hold only their key, values are read from the
+    namespace when shown.  Edits go through callbackFunc(paramName,value),
+    uiNameSpace.updateValue by default; changes to the namespace are shown
+    through its subscribe().
+    """
+
+    COLUMNS = ("Parameter","Value")
+
+    def __init__(self,uiNameSpace,callbackFunc=None,parent=None):
+        super(UiNameSpaceModel,self).__init__(parent)
+        self.uiNameSpace = uiNameSpace
+        self.callbackFunc = callbackFunc or uiNameSpace.updateValue
+        self._root = _ModelNode(None,0,'','')
+        self._nodes = {'': self._root}  # key -> node, keeps the nodes Qt points at alive
+        self._callback = self._changed
+        uiNameSpace.subscribe('',self._callback,prefix=True)
+
+    def close(self):
+        "Stop following the namespace"
+        self.uiNameSpace.unsubscribe('',self._callback,prefix=True)
+
+    def _children(self,node):
+        if node.names is None:
+            ns = self.uiNameSpace[node.key] if node.key else self.uiNameSpace
+            node.names = list(ns) if isinstance(ns,utils.UiNameSpace) else []
+        return node.names
+
+    def _child(self,node,row):
+        name = self._children(node)[row]
+        key = node.key + '.' + name if node.key else name
+        child = self._nodes.get(key)
+        if child is None:
+            child = self._nodes[key] = _ModelNode(node,row,key,name)
+        return child
+
+    def _node(self,index):
+        return index.internalPointer() if index.isValid() else self._root
+
+    def item(self,index):
+        "The UiItem (or namespace) of the row of index"
+        node = self._node(index)
+        return self.uiNameSpace.get(node.key) if node.key else self.uiNameSpace
+
+    def paramName(self,index):
+        return self._node(index).key
+
+    def indexOf(self,paramName,column=0):
+        "The index of paramName, an invalid one if its row is not made yet"
+        node = self._nodes.get(paramName)
+        if node is None or node is self._root:
+            return QModelIndex()
+        return self.createIndex(node.row,column,node)
+
+    # --- QAbstractItemModel --------------------------------------------------
+
+    def index(self,row,column,parent=QModelIndex()):
+        node = self._node(parent)
+        if row < 0 or column < 0 or column >= len(self.COLUMNS) or row >= len(self._children(node)):
+            return QModelIndex()
+        return self.createIndex(row,column,self._child(node,row))
+
+    def parent(self,index):
+        if not index.isValid():
+            return QModelIndex()
+        node = index.internalPointer().parent
+        if node is None or node is self._root:
+            return QModelIndex()
+        return self.createIndex(node.row,0,node)
+
+    def rowCount(self,parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self._children(self._node(parent)))
+
+    def columnCount(self,parent=QModelIndex()):
+        return len(self.COLUMNS)
+
+    def hasChildren(self,parent=QModelIndex()):
+        if parent.column() > 0:
+            return False
+        node = self._node(parent)
+        if node.names is not None:
+            return bool(node.names)
+        return not node.key or isinstance(self.uiNameSpace.get(node.key),utils.UiNameSpace)
+
+    def headerData(self,section,orientation,role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return QVariant(self.COLUMNS[section])
+        return QVariant()
+
+    def flags(self,index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() == 1 and isinstance(self.item(index),utils.UiItem):
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self,index,role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        node = index.internalPointer()
+        if index.column() == 0:
+            if role == Qt.DisplayRole:
+                return QVariant(node.name)
+            return QVariant()
+        item = self.uiNameSpace.get(node.key)
+        if not isinstance(item,utils.UiItem):
+            return QVariant()
+        if role == Qt.DisplayRole:
+            return QVariant(self.valueText(item))
+        if role == Qt.EditRole:
+            return QVariant(item.value)
+        if role == Qt.ToolTipRole and 'hint' in item:
+            return QVariant(item['hint'].replace(';','\n'))
+        return QVariant()
+
+    @staticmethod
+    def valueText(item):
+        v = item.value
+        if item.NAME == "Float":
+            return "%g" % v
+        if item.NAME == "Vector":
+            return " ".join(["%6.3f" % x for x in v])
+        return str(v)
+
+    def setData(self,index,value,role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        if isinstance(value,QVariant):
+            value = value.toPyObject()
+        self.setValue(index,value)
+        return True
+
+    def setValue(self,index,value):
+        "Give the UiItem of index 'value' through callbackFunc"
+        self.callbackFunc(self.paramName(index),value)
+
+    # --- namespace changes ---------------------------------------------------
+
+    def _changed(self,keys):
+        for key in keys:
+            node = self._nodes.get(key)
+            if node is None:
+                if self._added(key):
+                    return self._reset()
                 continue
-            #print " NOT FOUND ",paramName
-            for tabName in uiNameSpace.hdict.keys():
-                ns = uiNameSpace[tabName]
-                ws = self.getWidgetSet(tabName)
-                if isinstance(ns,utils.UiNameSpace):
-                    for sectionName in ns.hdict.keys():
-                        ns2 = ns[sectionName]
-                        if isinstance(ns2,utils.UiNameSpace):
-                            ws.addSeparator(sectionName)
-                            for pName, p in ns2.items():
-                                paramName = ".".join([tabName,sectionName,pName])
-                                cb = lambda v,n=paramName: callbackFunc(n,v)
-                                valueW = self.addUiItem(ws,"    "+pName,p,cb)
-                                self.widgetIndex[paramName] = valueW
-                                valueW.nameSpaceItem = p
-                        else:
-                            paramName = ".".join([tabName,sectionName])
-                            cb = lambda v,n=paramName: callbackFunc(n,v)
-                            valueW = self.addUiItem(ws,sectionName,ns2,cb)
-                            self.widgetIndex[paramName] = valueW
-                            valueW.nameSpaceItem = ns2
-                else:
-                    raise Exception("bad %s"%tabName)
-        #print "AFTER:--------------------"
-        #pprint(self.widgetIndex)
-        #print "--------------------:AFTER"
-                
+            if key not in self.uiNameSpace:
+                return self._reset()
+            index = self.createIndex(node.row,1,node)
+            self.emit(SIGNAL("dataChanged(QModelIndex,QModelIndex)"),index,index)
+
+    def _added(self,key):
+        "True if key is new below a row whose children are made"
+        names = key.split('.')
+        for i in range(len(names)-1,-1,-1):
+            parent = self._nodes.get('.'.join(names[:i]))
+            if parent is not None:
+                return parent.names is not None and names[i] not in parent.names
+        return False
+
+    def _reset(self):
+        self.beginResetModel()
+        self._root.names = None
+        self._nodes = {'': self._root}
+        self.endResetModel()
+
+
+class UiItemDelegate(QStyledItemDelegate):
+
+    """
+    Editors for the value column of a UiNameSpaceModel, of the kind
+    uiItemEditorKind() gives, like the rows WidgetSetToolBox.addUiItem() makes.
+    Each editor gets setValue(v) and getValue(), every change is committed.
+    """
+
+    def __init__(self,parent=None):
+        super(UiItemDelegate,self).__init__(parent)
+        self.floatValidator = QDoubleValidator(-1e38,1e38,4,self)
+
+    def createEditor(self,parent,option,index):
+        item = index.model().item(index)
+        kind = uiItemEditorKind(item) if isinstance(item,utils.UiItem) else None
+        if kind is None:
+            return None
+        editor = getattr(self,"_" + kind)(parent,item)
+        editor._updating = False
+        editor.setAutoFillBackground(True)
+        return editor
+
+    def _commit(self,editor):
+        if not editor._updating:
+            self.emit(SIGNAL("commitData(QWidget*)"),editor)
+
+    def setEditorData(self,editor,index):
+        value = index.model().item(index).value
+        try:
+            if editor.getValue() == value:
+                return
+        except (ValueError,TypeError):
+            pass
+        editor._updating = True
+        try:
+            editor.setValue(value)
+        finally:
+            editor._updating = False
+
+    def setModelData(self,editor,model,index):
+        try:
+            value = editor.getValue()
+        except (ValueError,TypeError):
+            return      # not a value yet, eg. a float being typed
+        model.setValue(index,value)
+
+    def updateEditorGeometry(self,editor,option,index):
+        editor.setGeometry(option.rect)
+
+    # --- editors, one per kind -----------------------------------------------
+
+    def _slider(self,parent,item):
+        sliderW = PolishingSlider(parent)
+        sliderW.setFloatRange(item['min'],item['max'],"map" in item and item['map'] == 'log')
+        sliderW.setValue = lambda v: QSlider.setValue(sliderW,sliderW.fToI(v))
+        sliderW.getValue = lambda: sliderW.iToF(sliderW.sliderPosition())
+        if 'rubber' in item and item['rubber'] == True:
+            sliderW.setMouseMoveCallback(self._commit)
+        sliderW.setMouseReleaseCallback(self._commit)
+        return sliderW
+
+    def _comboBox(self,parent,choices,cast):
+        comboW = QComboBox(parent)
+        comboW.addItems([c if cast is str else "%g" % c if cast is float else str(c) for c in choices])
+        comboW.setValue = lambda v: comboW.setCurrentIndex(comboW.findText(QString(v if cast is str else "%g" % v if cast is float else str(v))))
+        comboW.getValue = lambda: cast(str(comboW.currentText()))
+        self.connect(comboW,SIGNAL("currentIndexChanged(int)"),lambda i: self._commit(comboW))
+        return comboW
+
+    def _floatCombo(self,parent,item):
+        return self._comboBox(parent,item['choices'],float)
+
+    def _combo(self,parent,item):
+        return self._comboBox(parent,item['choices'],str)
+
+    def _intCombo(self,parent,item):
+        return self._comboBox(parent,item['choices'],int)
+
+    def _fileCombo(self,parent,item):
+        return self._comboBox(parent,item['choices'],str)
+
+    def _lineEdit(self,parent,item,cast=str,fmt="%s",owner=None):
+        lineeditW = QLineEdit(parent)
+        lineeditW.setValue = lambda v: lineeditW.setText(fmt % v)
+        lineeditW.getValue = lambda: cast(str(lineeditW.text()))
+        owner = owner if owner is not None else lineeditW
+        self.connect(lineeditW,SIGNAL("textChanged(const QString&)"),lambda s: self._commit(owner))
+        return lineeditW
+
+    def _floatEdit(self,parent,item):
+        lineeditW = self._lineEdit(parent,item,float,"%g")
+        lineeditW.setValidator(self.floatValidator)
+        return lineeditW
+
+    def _integer(self,parent,item):
+        spinW = QSpinBox(parent)
+        spinW.setMinimum(0)
+        spinW.setMaximum(9999)
+        spinW.getValue = spinW.value
+        self.connect(spinW,SIGNAL("valueChanged(int)"),lambda i: self._commit(spinW))
+        return spinW
+
+    def _file(self,parent,item):
+        mainW = QWidget(parent)
+        layout = QHBoxLayout()
+        layout.setContentsMargins(0,0,0,0)
+        mainW.setLayout(layout)
+        lineeditW = self._lineEdit(mainW,item,owner=mainW)
+        def requestCB():
+            s = str(lineeditW.text()).strip()
+            directory = Path(s).dirname() if s else os.getcwd()
+            filename = QFileDialog.getOpenFileName(None,QString("Choose file"),QString(directory))
+            if filename:
+                lineeditW.setText(filename)
+        browseB = QToolButton(mainW)
+        browseB.setIcon(getTagIcon('open'))
+        browseB.setToolTip("Browse for file")
+        browseB.setAutoRaise(True)
+        self.connect(browseB,SIGNAL("clicked()"),requestCB)
+        layout.addWidget(browseB)
+        layout.addWidget(lineeditW)
+        mainW.setValue = lineeditW.setValue
+        mainW.getValue = lineeditW.getValue
+        return mainW
+
+    def _checkbox(self,parent,item):
+        checkW = QCheckBox(parent)
+        checkW.setValue = lambda v: checkW.setCheckState((Qt.Unchecked,Qt.Checked)[v!=False])
+        checkW.getValue = lambda: checkW.checkState() == Qt.Checked
+        self.connect(checkW,SIGNAL("stateChanged(int)"),lambda i: self._commit(checkW))
+        return checkW
+
+    def _vector(self,parent,item,fmt="%6.3f"):
+        mainW = QWidget(parent)
+        layout = QHBoxLayout()
+        layout.setContentsMargins(0,0,0,0)
+        mainW.setLayout(layout)
+        edits = [QLineEdit(mainW) for i in range(3)]
+        for editW in edits:
+            editW.setValidator(self.floatValidator)
+            layout.addWidget(editW)
+            self.connect(editW,SIGNAL("textChanged(const QString&)"),lambda s: self._commit(mainW))
+        def setValue(v):
+            for editW,x in zip(edits,v):
+                editW.setText(fmt % x)
+        mainW.setValue = setValue
+        mainW.getValue = lambda: [float(str(editW.text())) for editW in edits]
+        return mainW
+
+    def _date(self,parent,item):
+        dateeditW = QDateEdit(parent)
+        dateeditW.setCalendarPopup(True)
+        dateeditW.setDisplayFormat("yyyyMMdd")
+        dateeditW.setValue = lambda v: dateeditW.setDateTime(dateeditW.dateTimeFromText(v))
+        dateeditW.getValue = lambda: str(dateeditW.date().toString("yyyyMMdd"))
+        self.connect(dateeditW,SIGNAL("dateChanged(const QDate&)"),lambda d: self._commit(dateeditW))
+        return dateeditW
+
+
+class UiNameSpaceView(QTreeView):
+
+    """
+    A tree view of a UiNameSpace for schemas too big for WidgetSetToolBox:
+    editors are open only on the value cells of the rows in sight, they are
+    opened and closed as the view scrolls, expands or changes size.
+    """
+
+    def __init__(self,uiNameSpace,callbackFunc=None,parent=None):
+        super(UiNameSpaceView,self).__init__(parent)
+        self.setUniformRowHeights(True)
+        self.setAlternatingRowColors(True)
+        self.setModel(UiNameSpaceModel(uiNameSpace,callbackFunc,self))
+        self.setItemDelegateForColumn(1,UiItemDelegate(self))
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self._editors = dict()     # paramName -> QPersistentModelIndex of the open editors
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self.connect(self._timer,SIGNAL("timeout()"),self.updateEditors)
+        for signal in ("expanded(QModelIndex)","collapsed(QModelIndex)"):
+            self.connect(self,SIGNAL(signal),self._scheduleEditors)
+        self.connect(self.verticalScrollBar(),SIGNAL("valueChanged(int)"),self._scheduleEditors)
+        self.connect(self.model(),SIGNAL("modelReset()"),self._modelReset)
+
+    def _scheduleEditors(self,*args):
+        self._timer.start(0)
+
+    def _modelReset(self):
+        self._editors.clear()    # the reset closed them
+        self._scheduleEditors()
+
+    def resizeEvent(self,event):
+        QTreeView.resizeEvent(self,event)
+        self._scheduleEditors()
+
+    def showEvent(self,event):
+        QTreeView.showEvent(self,event)
+        self._scheduleEditors()
+
+    def visibleValueIndexes(self):
+        "{paramName: value column index} of the UiItem rows in sight"
+        model = self.model()
+        visible = dict()
+        height = self.viewport().height()
+        index = self.indexAt(QPoint(1,1))
+        while index.isValid() and self.visualRect(index).top() < height:
+            valueIndex = index.sibling(index.row(),1)
+            if model.flags(valueIndex) & Qt.ItemIsEditable:
+                visible[model.paramName(valueIndex)] = valueIndex
+            index = self.indexBelow(index)
+        return visible
+
+    def updateEditors(self):
+        "Open editors on the rows in sight, close the others"
+        visible = self.visibleValueIndexes()
+        for paramName in [k for k in self._editors if k not in visible]:
+            index = self._editors.pop(paramName)
+            if index.isValid():
+                self.closePersistentEditor(QModelIndex(index))
+        for paramName,index in visible.iteritems():
+            if paramName not in self._editors:
+                self.openPersistentEditor(index)
+                self._editors[paramName] = QPersistentModelIndex(index)
 
 
 # ---------------------------------------------------------------------------
@@ -1691,6 +2549,11 @@ if __name__ == "__main__":
             self.widgetSet2DW.setFeatures(self.widgetSet2DW.features() ^ QDockWidget.DockWidgetClosable)
             self.addDockWidget(Qt.RightDockWidgetArea, self.widgetSet2DW)
             
+            self.viewDW = QDockWidget("All render parameters", self)
+            self.viewDW.setWidget(UiNameSpaceView(self.variables))
+            self.viewDW.setAllowedAreas(Qt.AllDockWidgetAreas)
+            self.addDockWidget(Qt.RightDockWidgetArea, self.viewDW)
+
             treeW = QTreeWidget()
             self.setCentralWidget(treeW)
             treeW.setColumnCount(1)
@@ -1740,6 +2603,7 @@ if __name__ == "__main__":
             self.shaderWidget = QWidget()
             treeW.setItemWidget(child,0,self.shaderWidget)
 
+            self.editWidgetPool = EditWidgetPool()
             self.widgets = [None] * NWIDGETS
             for i in range(NWIDGETS):
                 child = QTreeWidgetItem()
@@ -1757,17 +2621,13 @@ if __name__ == "__main__":
                     W = StringEditWidget
                 else:
                     W = FloatEditWidget
-                editWidget = W()
-                self.widgets[i] = editWidget
-                editWidget.setName(name)
                 rank = randint(0,2)
                 if i < 3: rank = i
-                editWidget.setInheritanceRank(rank)
+                editWidget = self.editWidgetPool.acquire(W)
+                self.editWidgetPool.bind(editWidget,name,None,rank,valueChanged=self.changeCB,inheritanceChanged=self.inheritCB)
+                self.widgets[i] = editWidget
                 treeW.setItemWidget(child,0,editWidget)
 
-                self.connect(editWidget,SIGNAL("valueChanged(QVariant)"),self.changeCB)
-                self.connect(editWidget,SIGNAL("inheritanceChanged(int)"),self.inheritCB)
-
         def quitCB(self):
             uins = Path("/usr/tmp/variables.uins")
             self.variables.write(uins)
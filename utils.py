@@ -1,8 +1,131 @@
 #!/usr/bin/env python
 
+import sys
+import array
+import marshal
+import nssnapshot
+import multiprocessing
 from   copy                import  deepcopy
 from   path                import  path as Path
-from   namespace           import  NameSpace
+from   namespace           import  NameSpace, NameSpaceDelta
+from   nscache             import  LoadCache
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from cgkit.cgtypes import vec3
+except ImportError:
+    class vec3(tuple):
+        "The (x, y, z) of a Vector as a plain tuple where there is no cgkit"
+        __slots__ = ()
+        def __new__(cls,x,y,z):
+            return tuple.__new__(cls,(x,y,z))
+
+
+# the argument names most UiItems have, kept in slots rather than a dict
+_FIELDS = ('value','default','min','max','choices','hint')
+_SLOTS = dict([(name,'_' + name) for name in _FIELDS])
+_ARGSLOTS = [_SLOTS[name] for name in _FIELDS if name != 'value']
+_UNSET = object()
+# the value of an item whose value is kept in a UiColumn, see UiColumns
+_INCOLUMN = object()
+
+_NUMBERS = frozenset([int,long,float,bool])
+# the types each coerce() converts with a plain float(), int() or bool()
+_FLOATABLE = frozenset([float,int,bool])
+_INTABLE = frozenset([int,float])
+_BOOLABLE = frozenset([int,bool])
+# ints below this in size are exact as doubles, UiInt columns go through numpy when they all are
+_EXACTFLOAT = 2 ** 53
+
+# --- shared metadata ---------------------------------------------------------
+
+class _FrozenList(tuple):
+    "A list argument of UiItems (eg. choices) as one tuple shared by every item that has it"
+    __slots__ = ()
+    def __repr__(self):
+        return repr(list(self))
+
+class _CowList(list):
+    "A list handed out for a _FrozenList argument, changing it gives its item a copy of its own"
+    __slots__ = ('_item','_key')
+    def __init__(self,item,key,frozen):
+        list.__init__(self,frozen)
+        self._item = item
+        self._key = key
+    def _own(self):
+        if self._item is not None:
+            self._item._setArg(self._key,self)
+            self._item = None
+
+def _cowMethod(op):
+    def method(self,*args):
+        self._own()
+        return op(self,*args)
+    return method
+
+for _name in ('append','extend','insert','pop','remove','reverse','sort','__setitem__','__delitem__',
+              '__setslice__','__delslice__','__iadd__','__imul__'):
+    setattr(_CowList,_name,_cowMethod(getattr(list,_name)))
+
+# (type, value, element types) -> the one shared copy
+_shared = dict()
+_SHARED_MAX = 100000
+
+def _share(v):
+    """
+    The shared copy of argument v: strings are interned, lists become a
+    _FrozenList, anything unhashable stays as it is
+    """
+    t = v.__class__
+    if t is str:
+        return intern(v)
+    if t is list:
+        v = _FrozenList(v)
+    elif t is not tuple and t is not unicode:
+        return v
+    try:
+        # 1 == 1.0 == True, keep [1, 2] and [1.0, 2.0], ((1,),) and ((1.0,),) apart
+        key = (t,v,_elementTypes(v)) if t is not unicode else (t,v)
+        shared = _shared.get(key)
+    except TypeError:
+        return list(v) if t is list else v
+    if shared is None:
+        if len(_shared) >= _SHARED_MAX:
+            _shared.clear()
+        _shared[key] = shared = v
+    return shared
+
+def _elementTypes(v):
+    "The types of the elements of tuple v, those of nested tuples as (type, their element types)"
+    return tuple([(x.__class__,_elementTypes(x)) if isinstance(x,tuple) else x.__class__ for x in v])
+
+def _shareArgs(args):
+    "The shared copy of a dict of the rarer arguments, never changed in place"
+    args = dict([(k,_share(v)) for k,v in args.iteritems()])
+    try:
+        key = ('args',tuple(sorted([(k,type(v),v,_elementTypes(v) if isinstance(v,tuple) else None)
+                                    for k,v in args.iteritems()])))
+        shared = _shared.get(key)
+    except TypeError:
+        return args
+    if shared is None:
+        if len(_shared) >= _SHARED_MAX:
+            _shared.clear()
+        _shared[key] = shared = args
+    return shared
+
+def _plainArg(v):
+    return list(v) if v.__class__ is _FrozenList or v.__class__ is _CowList else v
+
+def _sameArg(a,b):
+    return a is b or _plainArg(a) == _plainArg(b)
+
+# arguments copies of an item can share, the rest are deep copied
+_SHAREABLE = frozenset([type(None),bool,int,long,float,complex,str,unicode,tuple,_FrozenList,type(_UNSET)])
 
 
 class UiItem(object):
@@ -10,10 +133,51 @@ class UiItem(object):
     Base class for UiNameSpace data
     Used as values of NameSpace members that have metadata that helps build UIs
     Subclassed for use in storing and presenting in a UI types such as float, int, filepath etc.
+    The common arguments (see _FIELDS) live in slots, any others in the '_more' dict.
+    Arguments other than value are shared with every item that has the same
+    (see _share()), lists as tuples that item[key] hands out as lists of
+    their own when they are changed.
+    Items of a UiColumns keep their value in its arrays, '_store' is (column, slot).
     """
     NAME = "ERROR" # must be implemented in subclass
+    __slots__ = tuple([_SLOTS[name] for name in _FIELDS]) + ('_more','_store')
     def __init__(self,kv={},**kw):
-        self._args = dict(kv.items()+kw.items())
+        self._setArgs(dict(kv,**kw))
+    def _setArgs(self,args):
+        self._value    = args.pop('value',_UNSET)
+        self._default  = _share(args.pop('default',_UNSET))
+        self._min      = _share(args.pop('min',_UNSET))
+        self._max      = _share(args.pop('max',_UNSET))
+        self._choices  = _share(args.pop('choices',_UNSET))
+        self._hint     = _share(args.pop('hint',_UNSET))
+        self._more     = _shareArgs(args) if args else None
+        self._store    = None
+    def _setArg(self,key,value):
+        "Change one argument of this item alone"
+        slot = _SLOTS.get(key)
+        if slot is None:
+            more = dict(self._more or ())
+            more[key] = value
+            self._more = more
+        elif key == 'value':
+            self.setValue(value)
+        else:
+            setattr(self,slot,value)
+    @property
+    def _args(self):
+        "The arguments as one new dict"
+        args = dict([(k,_plainArg(v)) for k,v in (self._more or {}).iteritems()])
+        for name in _FIELDS:
+            v = getattr(self,_SLOTS[name])
+            if v is not _UNSET:
+                args[name] = _plainArg(v)
+        if self._value is _INCOLUMN:
+            args['value'] = self.value
+        return args
+    def __getstate__(self):
+        return self._args
+    def __setstate__(self,state):
+        self._setArgs(dict(state))
     def __repr__(self):
         def _niceRepr(v):
             return "%g" % v if isinstance(v,float) else repr(v)
@@ -23,21 +187,136 @@ class UiItem(object):
             vr = "value=%s" % repr(self.value)
         s = "%s(%s)" % (self.NAME, ", ".join([vr]+["%s=%s" % (n,_niceRepr(v)) for n,v in self._args.items() if n != 'value']))
         return s
+    def __deepcopy__(self,memo):
+        item = self.__class__.__new__(self.__class__)
+        v = self.value if self._value is _INCOLUMN else self._value
+        item._value = v if v.__class__ in _SHAREABLE and v.__class__ is not tuple else deepcopy(v,memo)
+        for slot in _ARGSLOTS:
+            v = getattr(self,slot)
+            setattr(item,slot,v if v.__class__ in _SHAREABLE else deepcopy(v,memo))
+        more = self._more
+        if more is not None and not set(map(type,more.itervalues())) <= _SHAREABLE:
+            more = deepcopy(more,memo)
+        item._more = more
+        item._store = None
+        return item
+    def __eq__(self,other):
+        if self.__class__ is not other.__class__:
+            return False
+        if self is other:
+            return True
+        if not _sameArg(self.value if self._value is _INCOLUMN else self._value,
+                        other.value if other._value is _INCOLUMN else other._value):
+            return False
+        for slot in _ARGSLOTS:
+            if not _sameArg(getattr(self,slot),getattr(other,slot)):
+                return False
+        a, b = self._more or {}, other._more or {}
+        return a is b or (len(a) == len(b) and not [k for k in a if k not in b or not _sameArg(a[k],b[k])])
+    def __ne__(self,other):
+        return not self.__eq__(other)
+    __hash__ = None     # equal by value, and the value changes
     def __contains__(self,key):
-        return key in self._args
+        slot = _SLOTS.get(key)
+        if slot is not None:
+            return getattr(self,slot) is not _UNSET
+        return self._more is not None and key in self._more
     def __getitem__(self,key):
-        return self._args[key]
+        slot = _SLOTS.get(key)
+        if slot is not None:
+            v = getattr(self,slot)
+            if v is _UNSET:
+                raise KeyError, key
+            if v is _INCOLUMN:
+                return self.value
+        elif self._more is None:
+            raise KeyError, key
+        else:
+            v = self._more[key]
+        if v.__class__ is _FrozenList:
+            return _CowList(self,key,v)
+        return v
     def setValue(self,value):
-        self._args['value'] = value
+        if self._value is _INCOLUMN:
+            column, slot = self._store
+            if column.fits(value):
+                column.set(slot,value)
+                return
+            column.release(slot)
+        self._value = value
     @property
     def value(self):
-        if 'value' not in self._args:
+        v = self._value
+        if v is _INCOLUMN:
+            column, slot = self._store
+            return column.get(slot)
+        if v is _UNSET:
             raise KeyError("UiItem subclass '%s' has no value() method" % self.__class__.__name__)
-        return self._args['value']
+        return v
+    @classmethod
+    def coerceColumn(cls,values,items=None):
+        """
+        (coerced, errors) for a whole column of values, as coerce() would give
+        them one at a time.  Nothing is raised: errors[i] is True where
+        values[i] cannot be coerced (coerced[i] is then what force=True gives)
+        or, when 'items' lists the UiItems the values are for, where it is
+        below their min, above their max or not one of their choices.
+        """
+        values = list(values)
+        coerced, errors = cls._coerceColumn(values)
+        if items is not None:
+            errors = _checkColumn(coerced,errors,list(items))
+        return coerced, errors
+    @classmethod
+    def _coerceColumn(cls,values):
+        "coerceColumn() a value at a time, subclasses take shortcuts for the common types"
+        coerce = cls.__new__(cls).coerce
+        coerced, errors = [], []
+        for v in values:
+            try:
+                coerced.append(coerce(v))
+                errors.append(False)
+                continue
+            except Exception:
+                pass
+            # not even force=True copes with some (eg. int(nan)), those are kept as they are
+            try:
+                coerced.append(coerce(v,True))
+            except Exception:
+                coerced.append(v)
+            errors.append(True)
+        return coerced, errors
+
+
+def _checkColumn(values,errors,items):
+    "errors with the values outside their item's min, max or choices added"
+    mins = [item._min for item in items]
+    maxs = [item._max for item in items]
+    lo = [i for i,m in enumerate(mins) if m is not _UNSET]
+    hi = [i for i,m in enumerate(maxs) if m is not _UNSET]
+    if (numpy is not None and (lo or hi) and set(map(type,values)) <= _NUMBERS
+            and set(map(type,[mins[i] for i in lo] + [maxs[i] for i in hi])) <= _NUMBERS):
+        # every comparison in one go
+        v = numpy.asarray(values,float)
+        bad = numpy.asarray(errors,bool)
+        bad |= v < numpy.asarray([m if m is not _UNSET else -numpy.inf for m in mins],float)
+        bad |= v > numpy.asarray([m if m is not _UNSET else numpy.inf for m in maxs],float)
+        errors = bad.tolist()
+    else:
+        errors = list(errors)
+        for i in lo:
+            errors[i] = errors[i] or values[i] < mins[i]
+        for i in hi:
+            errors[i] = errors[i] or values[i] > maxs[i]
+    for i,item in enumerate(items):
+        if item._choices is not _UNSET and not errors[i]:
+            errors[i] = values[i] not in item._choices
+    return errors
 
 
 class UiFloat(UiItem):
     NAME = 'Float'
+    __slots__ = ()
     def valid(self,value):
         return isinstance(value,float)
     def coerce(self,value,force=False):
@@ -59,9 +338,17 @@ class UiFloat(UiItem):
             else:
                 raise ValueError("cannot coerce '%s' to Float" % value)
         return coercedValue
+    @classmethod
+    def _coerceColumn(cls,values):
+        if set(map(type,values)) <= _FLOATABLE:
+            if numpy is not None:
+                return numpy.asarray(values,dtype=float).tolist(), [False] * len(values)
+            return map(float,values), [False] * len(values)
+        return super(UiFloat,cls)._coerceColumn(values)
 
 class UiVector(UiItem):
     NAME = 'Vector'
+    __slots__ = ()
     def valid(self,value):
         return ( isinstance(value,(tuple,list)) and isinstance(value[0],float) ) or ( isinstance(value,vec3) )
     def coerce(self,value,force=False):
@@ -96,6 +383,7 @@ class UiVector(UiItem):
 
 class UiInt(UiItem):
     NAME = 'Int'
+    __slots__ = ()
     def valid(self,value):
         return isinstance(value,int)
     def coerce(self,value,force=False):
@@ -117,9 +405,23 @@ class UiInt(UiItem):
             else:
                 raise ValueError("cannot coerce '%s' to Int" % value)
         return coercedValue
+    @classmethod
+    def _coerceColumn(cls,values):
+        if set(map(type,values)) <= _INTABLE:
+            if numpy is not None:
+                a = numpy.asarray(values,dtype=float)
+                # all of them exact as doubles, astype() then truncates as int() does
+                if not len(a) or (numpy.isfinite(a).all() and numpy.abs(a).max() < _EXACTFLOAT):
+                    return a.astype(numpy.int64).tolist(), [False] * len(values)
+            try:
+                return map(int,values), [False] * len(values)
+            except (ValueError,OverflowError):
+                pass  # nan or inf among them
+        return super(UiInt,cls)._coerceColumn(values)
 
 class UiString(UiItem):
     NAME = 'String'
+    __slots__ = ()
     def valid(self,value):
         return isinstance(value,(unicode,str))
     def coerce(self,value,force=False):
@@ -139,6 +441,7 @@ class UiString(UiItem):
 
 class UiBoolean(UiItem):
     NAME = 'Boolean'
+    __slots__ = ()
     def valid(self,value):
         return value in (False,True)
     def coerce(self,value,force=False):
@@ -154,9 +457,20 @@ class UiBoolean(UiItem):
             else:
                 raise ValueError("cannot coerce '%s' to Boolean" % value)
         return coercedValue
+    @classmethod
+    def _coerceColumn(cls,values):
+        if set(map(type,values)) <= _BOOLABLE:
+            if numpy is not None:
+                try:
+                    return (numpy.asarray(values,dtype=float) != 0).tolist(), [False] * len(values)
+                except OverflowError:
+                    pass
+            return map(bool,values), [False] * len(values)
+        return super(UiBoolean,cls)._coerceColumn(values)
 
 class UiFile(UiItem):
     NAME = 'File'
+    __slots__ = ()
     def valid(self,value):
         return isinstance(value,(Path,unicode,str))
     def coerce(self,value,force=False):
@@ -174,6 +488,7 @@ class UiFile(UiItem):
 
 class UiDate(UiItem):
     NAME = 'Date'
+    __slots__ = ()
     def valid(self,value):
         return isinstance(value,(unicode,str))
     def coerce(self,value,force=False):
@@ -223,12 +538,474 @@ class UiNameSpace(NameSpace):
             raise Exception("Cannot get value of key '%s' since it is not a uiItem, it's a '%s'" % (key,type(uiItem)))
         return uiItem.value()
 
+    def coerceMany(self,keys,values):
+        """
+        (coerced, errors) for new values of the UiItems at keys, the values
+        for each type of UiItem coerced and checked as one column, see
+        UiItem.coerceColumn().  Keys that are not UiItems are errors.
+        """
+        values = list(values)
+        items = self.getMany(keys)
+        columns = dict()
+        for i,item in enumerate(items):
+            columns.setdefault(item.__class__,[]).append(i)
+        coerced, errors = list(values), [True] * len(values)
+        for cls,column in columns.iteritems():
+            if not issubclass(cls,UiItem):
+                continue
+            c, e = cls.coerceColumn(map(values.__getitem__,column),map(items.__getitem__,column))
+            for i,v,bad in zip(column,c,e):
+                coerced[i] = v
+                errors[i] = bad
+        return coerced, errors
+
+    def compileSchema(self):
+        "A UiSchema of the UiItems in this namespace, to validate values against later"
+        return UiSchema(self)
+
+    # parsed files shared between load()s, eg. UiNameSpace.loadCache = LoadCache(),
+    # None (the default) to read the file every time
+    loadCache = None
+
     @staticmethod
-    def load(filePath):
+    def load(filePath,lazy=False):
+        if UiNameSpace.loadCache is not None and not lazy:
+            return UiNameSpace.loadCache.load(UiNameSpace,filePath,UiNameSpace.LocalFuncTable)
         uiNS = UiNameSpace()
-        uiNS.read(filePath, UiNameSpace.LocalFuncTable)
+        uiNS.read(filePath, UiNameSpace.LocalFuncTable, lazy)
         return uiNS
 
+    @staticmethod
+    def loadMany(filePaths,workers=None,progress=None):
+        """
+        Generate (filePath, UiNameSpace) for every file, in the order they are
+        parsed, on a pool of 'workers' processes (one per cpu by default,
+        a single worker loads them here with load()).
+        Workers send back marshalled snapshot records (see nssnapshot) rather
+        than pickled items.  progress(done,total,filePath) is called as each
+        file arrives.  A file that does not parse is read again here, so its
+        error is raised as load() would raise it.
+        """
+        filePaths = list(filePaths)
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        workers = min(workers,len(filePaths))
+        if workers <= 1:
+            for done,filePath in enumerate(filePaths):
+                uiNS = UiNameSpace.load(filePath)
+                if progress is not None:
+                    progress(done+1,len(filePaths),filePath)
+                yield filePath, uiNS
+            return
+        pool = multiprocessing.Pool(workers)
+        try:
+            for done,(filePath,data) in enumerate(pool.imap_unordered(_loadRecord,filePaths)):
+                if data is None:
+                    uiNS = UiNameSpace()
+                    uiNS.read(filePath, UiNameSpace.LocalFuncTable)
+                else:
+                    record = nssnapshot.decodeRecord(marshal.loads(data),UiNameSpace.LocalFuncTable)
+                    uiNS = UiNameSpace._fromRecord(record)
+                if progress is not None:
+                    progress(done+1,len(filePaths),filePath)
+                yield filePath, uiNS
+        finally:
+            pool.terminate()
+
+
+def _loadRecord(filePath):
+    "UiNameSpace.loadMany() worker: (filePath, marshalled record) or (filePath, None) if it does not parse"
+    try:
+        uiNS = UiNameSpace()
+        uiNS.read(filePath, UiNameSpace.LocalFuncTable)
+        names, values, children = uiNS._record()
+    except Exception:
+        return filePath, None
+    return filePath, marshal.dumps(nssnapshot.encodeRecord(names,values,children),nssnapshot.MARSHAL_VERSION)
+
+
+class UiColumn(object):
+    """
+    The values of the items of one UiItem type in a single typed array:
+    'values' holds the value of items[i] at slot i, a numpy array when there
+    is numpy (N x 3 for vectors) and an array.array otherwise (3 entries a
+    slot for vectors).  'values' is the storage itself, changes made to it in
+    place are what the items' value gives.
+    Defaults and bounds are gathered from the items once, on first use.
+    """
+
+    def __init__(self,name,items):
+        self.typecode, self.width, self.cast, accept = _COLUMNTYPES[name]
+        self.name = name
+        self.items = list(items)
+        self.released = 0
+        self._fields = dict()
+        if self.width == 1:
+            flat = [item._value for item in self.items]
+        else:
+            flat = []
+            for item in self.items:
+                flat.extend(item._value)
+        if numpy is not None:
+            self.values = numpy.array(flat,dtype=self.typecode)
+            if self.width > 1:
+                self.values.shape = (len(self.items),self.width)
+        else:
+            self.values = array.array(self.typecode,flat)
+        for slot,item in enumerate(self.items):
+            item._store = (self,slot)
+            item._value = _INCOLUMN
+
+    def __len__(self):
+        return len(self.items)
+
+    def fits(self,value):
+        "True if value can be stored in this column as it is"
+        return _fits(self.name,value)
+
+    def get(self,slot):
+        if self.width == 1:
+            return self.cast(self.values[slot])
+        if numpy is not None:
+            return tuple(self.values[slot].tolist())
+        return tuple(self.values[slot*self.width:(slot+1)*self.width])
+
+    def set(self,slot,value):
+        if self.width == 1 or numpy is not None:
+            self.values[slot] = value
+        else:
+            self.values[slot*self.width:(slot+1)*self.width] = array.array(self.typecode,value)
+
+    def release(self,slot):
+        "Give items[slot] its value back and stop keeping it here"
+        item = self.items[slot]
+        if item is not None:
+            item._value = self.get(slot)
+            item._store = None
+            self.items[slot] = None
+            self.released += 1
+
+    def tolist(self):
+        "Every slot's value as a list, released slots included"
+        if self.width == 1:
+            return self.values.tolist()
+        if numpy is not None:
+            return map(tuple,self.values.tolist())
+        flat = self.values.tolist()
+        return zip(*[flat[i::self.width] for i in range(self.width)])
+
+    def field(self,name):
+        "(slots, values) of the items whose argument 'name' (eg. 'default') this column can hold"
+        try:
+            return self._fields[name]
+        except KeyError:
+            pass
+        slots, values = [], []
+        for slot,item in enumerate(self.items):
+            if item is None or name not in item:
+                continue
+            v = item[name]
+            if self.width == 1 and v.__class__ in _NUMBERS and v.__class__ is not bool:
+                if self.cast(v) != v:
+                    continue
+                v = self.cast(v)
+            elif not self.fits(v):
+                continue
+            slots.append(slot)
+            values.append(v)
+        if numpy is not None:
+            slots = numpy.array(slots,dtype=int)
+            values = numpy.array(values,dtype=self.typecode)
+        self._fields[name] = slots, values
+        return slots, values
+
+    def bounds(self,name,missing):
+        "The 'min' or 'max' of every slot, 'missing' where an item has none"
+        key = (name,missing)
+        try:
+            return self._fields[key]
+        except KeyError:
+            pass
+        slots, values = self.field(name)
+        if numpy is not None:
+            bounds = numpy.empty(len(self.items),dtype=self.typecode)
+            bounds.fill(missing)
+            bounds[slots] = values
+        else:
+            bounds = [missing] * len(self.items)
+            for slot,v in zip(slots,values):
+                bounds[slot] = v
+        self._fields[key] = bounds
+        return bounds
+
+    def resetToDefaults(self):
+        "Set every item that has a default to it"
+        slots, values = self.field('default')
+        if not len(slots):
+            return
+        if numpy is not None:
+            self.values[slots] = values
+        elif self.width == 1 and len(slots) == len(self.items):
+            self.values[:] = array.array(self.typecode,values)
+        else:
+            for slot,v in zip(slots,values):
+                self.set(slot,v)
+
+    def clamp(self):
+        "Bring every value into its item's min/max"
+        if self.width > 1:
+            return
+        lowest, highest = _COLUMNLIMITS[self.typecode]
+        if numpy is not None:
+            numpy.maximum(self.values,self.bounds('min',lowest),self.values)
+            numpy.minimum(self.values,self.bounds('max',highest),self.values)
+        else:
+            clamped = map(max,self.values,self.bounds('min',lowest))
+            self.values[:] = array.array(self.typecode,map(min,clamped,self.bounds('max',highest)))
+
+
+# UiItem NAME -> (array type, values per slot, python type of a value, types stored as they are)
+_COLUMNTYPES = {
+    'Float'       : ('d', 1, float, frozenset([float])),
+    'Int'         : ('l', 1, int,   frozenset([int])),
+    'Vector'      : ('d', 3, float, frozenset([float,int])),
+}
+
+# array type -> values below and above anything clamp() is given
+_COLUMNLIMITS = {
+    'd'           : (float('-inf'), float('inf')),
+    'l'           : (-sys.maxint - 1, sys.maxint),
+}
+
+def _fits(name,value):
+    "True if 'value' can go in the column for UiItems called 'name' and come back equal"
+    typecode, width, cast, accept = _COLUMNTYPES[name]
+    if width == 1:
+        return value.__class__ in accept
+    return (isinstance(value,(tuple,list)) and len(value) == width
+            and set(map(type,value)) <= accept)
+
+
+class UiColumns(object):
+    """
+    Columnar storage for the Float, Int and Vector items of a UiNameSpace:
+    their values move into one UiColumn per type and the items read and write
+    them there, so whole columns can be read, written, reset or clamped in a
+    few array operations instead of a call per item.
+
+        columns = UiColumns(uns)
+        floats = columns['Float'].values       # the storage, not a copy
+        floats *= 2.0                          # (with numpy) every Float doubled
+        columns.clamp()
+        columns.detach()                       # values back in the items
+
+    Items whose value does not fit their column as it is (an Int holding a
+    float, say) stay as they are, and an item given such a value later leaves
+    its column.  Vectors come back as tuples of floats.  Items added to the
+    namespace afterwards are not in a column.
+    """
+
+    def __init__(self,uiNameSpace):
+        byName = dict()
+        for key,item in uiNameSpace.walk():
+            if isinstance(item,UiItem) and item.NAME in _COLUMNTYPES and item._store is None:
+                byName.setdefault(item.NAME,[]).append((key,item))
+        self.columns = dict()
+        self.keys = dict()
+        for name,entries in byName.iteritems():
+            entries = [(key,item) for key,item in entries if _fits(name,item._value)]
+            self.keys[name] = [key for key,item in entries]
+            self.columns[name] = UiColumn(name,[item for key,item in entries])
+
+    def __getitem__(self,name):
+        return self.columns[name]
+
+    def __contains__(self,name):
+        return name in self.columns
+
+    def export(self,name):
+        "{key: value} of the items in column 'name'"
+        column = self.columns[name]
+        if not column.released:
+            return dict(zip(self.keys[name],column.tolist()))
+        return dict([(key,v) for key,v,item in zip(self.keys[name],column.tolist(),column.items)
+                     if item is not None])
+
+    def resetToDefaults(self):
+        for column in self.columns.itervalues():
+            column.resetToDefaults()
+
+    def clamp(self):
+        for column in self.columns.itervalues():
+            column.clamp()
+
+    def detach(self):
+        "Give every item its value back, the columns are empty afterwards"
+        for column in self.columns.itervalues():
+            for slot in range(len(column)):
+                column.release(slot)
+
+
+def _isVector(v):
+    try:
+        return len(v) == 3 and set(map(type,v)) <= _NUMBERS
+    except TypeError:
+        return False
+
+# UiItem NAME -> the type test of its valid(), quicker than calling it
+_TYPECHECKS = {
+    'Float'       : lambda v: isinstance(v,float),
+    'Int'         : lambda v: isinstance(v,int),
+    'String'      : lambda v: isinstance(v,(unicode,str)),
+    'Boolean'     : lambda v: v in (False,True),
+    'File'        : lambda v: isinstance(v,(Path,unicode,str)),
+    'Date'        : lambda v: isinstance(v,(unicode,str)),
+    'Vector'      : _isVector,
+}
+
+def _validator(name,typeOk,lo,hi,choices):
+    """
+    check(value), None for a good value and what is wrong with it otherwise,
+    with only the tests the item's metadata calls for
+    """
+    wrong = "expected %s" % name
+    if lo is _UNSET and hi is _UNSET and choices is _UNSET:
+        def check(v):
+            if not typeOk(v):
+                return wrong
+    elif lo is not _UNSET and hi is not _UNSET and choices is _UNSET:
+        def check(v):
+            if not typeOk(v):
+                return wrong
+            if not lo <= v <= hi:
+                return "%r outside [%r, %r]" % (v,lo,hi)
+    elif lo is _UNSET and hi is _UNSET:
+        def check(v):
+            if not typeOk(v):
+                return wrong
+            if v not in choices:
+                return "%r not one of %r" % (v,choices)
+    else:
+        def check(v):
+            if not typeOk(v):
+                return wrong
+            if lo is not _UNSET and v < lo:
+                return "%r below min %r" % (v,lo)
+            if hi is not _UNSET and v > hi:
+                return "%r above max %r" % (v,hi)
+            if choices is not _UNSET and v not in choices:
+                return "%r not one of %r" % (v,choices)
+    return check
+
+
+class UiSchema(object):
+    """
+    A validator for each UiItem of a namespace, made once from the item's
+    type, min, max and choices (see UiNameSpace.compileSchema()).  Items with
+    the same metadata share one.  validate() checks a whole namespace, a
+    NameSpaceDelta or a mapping of new values in one pass and reports every
+    problem rather than stopping at the first.
+    """
+
+    def __init__(self,uiNameSpace):
+        self.validators = dict()    # key -> check(value)
+        self.names = dict()         # key -> UiItem NAME
+        shared = dict()
+        for key,item in uiNameSpace.dict.iteritems():
+            if not isinstance(item,UiItem):
+                continue
+            lo, hi, choices = item._min, item._max, item._choices
+            try:
+                signature = (item.__class__,lo,hi,tuple(choices) if isinstance(choices,list) else choices)
+                check = shared.get(signature)
+            except TypeError:
+                signature, check = None, None
+            if check is None:
+                typeOk = _TYPECHECKS.get(item.NAME) or getattr(item,'valid',None) or (lambda v: True)
+                check = _validator(item.NAME,typeOk,lo,hi,choices)
+                if signature is not None:
+                    shared[signature] = check
+            self.validators[key] = check
+            self.names[key] = item.NAME
+
+    def __len__(self):
+        return len(self.validators)
+
+    def __contains__(self,key):
+        return key in self.validators
+
+    def check(self,key,value):
+        "What is wrong with value (a UiItem or a plain value) for key, None if nothing"
+        check = self.validators.get(key)
+        if check is None:
+            return "not in the schema"
+        if isinstance(value,UiItem):
+            if value.NAME != self.names[key]:
+                return "%s item, expected %s" % (value.NAME,self.names[key])
+            try:
+                value = value.value
+            except KeyError:
+                return "no value"
+        return check(value)
+
+    def validate(self,values,complete=None):
+        """
+        [(key, problem)] sorted by key for everything wrong in 'values', a
+        namespace, a NameSpaceDelta or a mapping of dotted keys to UiItems or
+        plain values.  With 'complete' set (the default for namespaces) the
+        keys of the schema that 'values' does not have are reported too, for
+        a delta it reports removing keys of the schema.
+        """
+        removed = []
+        if isinstance(values,NameSpaceDelta):
+            items = []
+            for key,value in values.added.items() + values.changed.items():
+                if isinstance(value,NameSpace):
+                    items.extend([(key + '.' + k,v) for k,v in value.dict.iteritems()])
+                else:
+                    items.append((key,value))
+            removed = values.removed
+            complete = False
+        elif isinstance(values,NameSpace):
+            items = values.dict.iteritems()
+            if complete is None:
+                complete = True
+        else:
+            items = values.iteritems() if hasattr(values,'iteritems') else values.items()
+        validators, names = self.validators, self.names
+        problems = []
+        seen = 0
+        for key,value in items:
+            check = validators.get(key)
+            if check is None:
+                problems.append((key,"not in the schema"))
+                continue
+            seen += 1
+            if value.__class__ in _PLAINVALUES:
+                problem = check(value)
+            elif isinstance(value,UiItem) and value.NAME == names[key] and value._value.__class__ in _PLAINVALUES:
+                problem = check(value._value)
+            else:
+                problem = self.check(key,value)
+            if problem is not None:
+                problems.append((key,problem))
+        if complete and seen < len(validators):
+            present = values.view if isinstance(values,NameSpace) else values
+            problems.extend([(key,"missing") for key in validators if key not in present])
+        if removed:
+            removed = set(removed)
+            for key in validators:
+                head = key
+                while head and head not in removed:
+                    head = head.rpartition('.')[0]
+                if head:
+                    problems.append((key,"removed"))
+        problems.sort()
+        return problems
+
+# values checked as they are, anything else goes through UiSchema.check()
+_PLAINVALUES = frozenset([float,int,long,bool,str,unicode,tuple])
+
 
 # --- TEST ----------------------------------------------------------------------
 
@@ -252,3 +1029,57 @@ if __name__ == '__main__':
     uns2 = UiNameSpace.load("test.ns")
     uns2['myspace'].dump("hello")
 
+    print uns.coerceMany(['junk.floo','junk.bar','render.xres','junk.bar'],['2.5',25,800,'x'])
+
+    columns = UiColumns(uns)
+    columns.clamp()
+    print columns.export('Float'), columns.export('Int')
+    columns.detach()
+
+    # numpy, when there is numpy, and the plain python backend give the same
+    results = []
+    installed = numpy
+    for numpy in [None] + ([installed] if installed is not None else []):
+        Float, Int, Boolean = UiFloat, UiInt, UiBoolean
+        got = [Float.coerceColumn([1,2.5,True,0]),
+               Int.coerceColumn([3,-2.7,2.7,0.0]),
+               Int.coerceColumn([2**60,1.5]),
+               Boolean.coerceColumn([0,3,True,False,-1]),
+               Float.coerceColumn(['2.5','x',1]),
+               Int.coerceColumn([]),
+               Float.coerceColumn([0.5,2.0,-1.0],[Float(value=0.0,min=0.0,max=1.0)] * 3)]
+        assert got[2][0] == [2**60,1] and type(got[1][0][1]) is int and type(got[3][0][0]) is bool
+        inf = float('inf')
+        odd = UiNameSpace()
+        odd.parse("a.i = Int(value=1)\na.v = Vector(value=(1.0,2.0,3.0))")
+        nan = odd.coerceMany(['a.i','a.i'],[float('nan'),3])
+        assert nan[0][1] == 3 and nan[1] == [True,False]
+        got.append([odd.coerceMany(['a.v'],[(1,2,3)]),odd.coerceMany(['a.i','a.i'],[inf,-inf])])
+        assert tuple(got[-1][0][0][0]) == (1,2,3) and got[-1][0][1] == [False]
+        assert got[-1][1] == ([inf,-inf],[True,True])
+        cols = UiNameSpace()
+        cols.parse("""
+        a.f = Float(value=5.0,min=0.0,max=1.0,default=0.5)
+        a.g = Float(value=-1.0,min=0.0)
+        a.i = Int(value=7,max=4,default=2)
+        a.v = Vector(value=(1.0,2.0,3.0))
+        """)
+        columns = UiColumns(cols)
+        columns.clamp()
+        got.append((columns.export('Float'),columns.export('Int'),columns.export('Vector')))
+        assert got[-1][:2] == ({'a.f': 1.0, 'a.g': 0.0},{'a.i': 4})
+        columns.resetToDefaults()
+        cols['a.v'].setValue((4.0,5.0,6.0))
+        got.append((cols['a.f'].value,cols['a.g'].value,cols['a.i'].value,cols['a.v'].value))
+        assert got[-1] == (0.5,0.0,2,(4.0,5.0,6.0))
+        columns.detach()
+        results.append(got)
+    assert results[0] == results[-1], results
+    nested = [Float(value=0.0,choices=[(1,)],steps=((1,),)), Float(value=0.0,choices=[(1.0,)],steps=((1.0,),))]
+    assert [type(item['choices'][0][0]) for item in nested] == [int,float]
+    assert [type(item['steps'][0][0]) for item in nested] == [int,float]
+    print "coercion and columns ok, numpy %s" % ("too" if len(results) > 1 else "not installed")
+
+    schema = uns.compileSchema()
+    uns['render.xres'].setValue(8000)
+    print schema.validate(uns)